@@ -0,0 +1,116 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Optional
+
+# Content-addressed record of assets already sent to a remote service:
+# SHA-256 -> Drive file / Shopify image. It lives outside the quarterly source
+# folders so identical PDFs and cover images are reused across markets and
+# quarters instead of being transferred again. Entries are scoped (Drive
+# credentials, store URL), evicted least-recently-used beyond max_entries, and
+# re-validated by the caller once they are older than VALIDATE_AFTER.
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'shopify_product_pipeline', 'asset_cache.db')
+DEFAULT_MAX_ENTRIES = 100000
+VALIDATE_AFTER = 7 * 24 * 60 * 60
+
+DRIVE_FILE = 'drive_file'
+SHOPIFY_IMAGE = 'shopify_image'
+
+class AssetCache:
+    def __init__(self, db_path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS assets ("
+            " kind TEXT NOT NULL,"
+            " scope TEXT NOT NULL,"
+            " content_hash TEXT NOT NULL,"
+            " remote_id TEXT,"
+            " url TEXT NOT NULL,"
+            " size INTEGER,"
+            " validated_at REAL NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (kind, scope, content_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS assets_last_used ON assets (last_used)")
+        self._conn.commit()
+
+    def get(self, kind: str, scope: str, content_hash: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT remote_id, url, size, validated_at FROM assets WHERE kind = ? AND scope = ? AND content_hash = ?",
+                (kind, scope, content_hash)
+            ).fetchone()
+            if not row:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE assets SET last_used = ? WHERE kind = ? AND scope = ? AND content_hash = ?",
+                (time.time(), kind, scope, content_hash)
+            )
+            self._conn.commit()
+        return {'remote_id': row[0], 'url': row[1], 'size': row[2], 'stale': time.time() - row[3] > VALIDATE_AFTER}
+
+    def put(self, kind: str, scope: str, content_hash: str, url: str, remote_id: Optional[str] = None, size: Optional[int] = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO assets (kind, scope, content_hash, remote_id, url, size, validated_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, scope, content_hash, remote_id, url, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def validated(self, kind: str, scope: str, content_hash: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE assets SET validated_at = ? WHERE kind = ? AND scope = ? AND content_hash = ?",
+                (time.time(), kind, scope, content_hash)
+            )
+            self._conn.commit()
+
+    def invalidate(self, kind: str, scope: str, content_hash: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM assets WHERE kind = ? AND scope = ? AND content_hash = ?", (kind, scope, content_hash))
+            self._conn.commit()
+        logging.info(f"Dropped stale {kind} cache entry for {content_hash[:12]}")
+
+    def _evict(self):
+        # Forgets the least recently used mappings; the remote assets are left alone
+        count = self._conn.execute("SELECT COUNT(*) FROM assets").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM assets WHERE rowid IN (SELECT rowid FROM assets ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM assets").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+        logging.info(f"Asset cache: {self.hits} hits, {self.misses} misses")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_asset_cache(db_path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES) -> AssetCache:
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    cache = AssetCache(db_path, max_entries)
+    logging.info(f"Using asset cache: {cache.db_path} ({len(cache)} entries)")
+    return cache
@@ -0,0 +1,543 @@
+import time
+import random
+import logging
+import argparse
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from http_session import configure_pool, get_session, close_sessions
+from shopify_client import ShopifyClient, LeakyBucket, get_client
+import os
+import json
+import resource
+import tempfile
+import shutil
+import signal
+import contextlib
+import threading
+import tracemalloc
+import main as pipeline
+from metrics import metrics
+from simulator import FakeShopifyServer, FakeDriveServer, FakeWebhookServer
+from google_drive import DriveUploader
+from journal import RunJournal
+from shopify import create_product, build_product_data
+from shopify_bulk import create_products_bulk
+from file_operations import pdf_title, send_csv_to_webhook
+from ledger import ProductLedger
+import webhook as delivery
+from lifecycle import run_lifecycle
+from pathlib import Path
+from image_index import ImageIndex, clean_string
+
+def bench_scheduler(args):
+    # Fires the same burst of product creations at a bucket-enforcing fake store,
+    # once with raw requests.post and once through the ShopifyClient scheduler.
+    product_data = {"product": {"title": "Benchmark product", "status": "draft"}}
+
+    def raw_create(store_url):
+        response = requests.post(f"{store_url}/admin/api/2024-01/products.json", json=product_data)
+        return response.status_code == 201
+
+    def scheduled_create(client):
+        return client.post("products.json", json=product_data).status_code == 201
+
+    for label in ("raw", "scheduled"):
+        with FakeShopifyServer(capacity=args.bucket_size, leak_rate=args.leak_rate) as server:
+            client = ShopifyClient(server.store_url, "benchmark-token", bucket=LeakyBucket(args.bucket_size, args.leak_rate))
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                if label == "raw":
+                    results = list(executor.map(lambda _: raw_create(server.store_url), range(args.requests)))
+                else:
+                    results = list(executor.map(lambda _: scheduled_create(client), range(args.requests)))
+            elapsed = time.perf_counter() - start
+            ideal = max(0.0, (args.requests - args.bucket_size) / args.leak_rate)
+            print(f"{label:>9}: {sum(results)}/{args.requests} created in {elapsed:.2f}s "
+                  f"({sum(results) / elapsed:.1f} req/s, ideal {ideal:.2f}s), "
+                  f"{server.stats['throttled']} throttled responses")
+
+def bench_pooling(args):
+    # Requests/sec against a local stand-in store with a fresh connection per
+    # call (module-level requests.put) versus the shared keep-alive session.
+    with FakeShopifyServer(capacity=10 ** 9, leak_rate=10 ** 9) as server:
+        product = server.handle("POST", "/admin/api/2024-01/products.json", {"product": {"title": "Benchmark"}})[1]["product"]
+        url = f"{server.store_url}/admin/api/2024-01/products/{product['id']}.json"
+        payload = {"product": {"id": product["id"], "status": "active"}}
+        configure_pool(args.workers)
+
+        for label, send in (("fresh", lambda: requests.put(url, json=payload)),
+                            ("pooled", lambda: get_session(url).put(url, json=payload))):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                results = list(executor.map(lambda _: send().status_code == 200, range(args.requests)))
+            elapsed = time.perf_counter() - start
+            print(f"{label:>6}: {sum(results)}/{args.requests} in {elapsed:.2f}s ({args.requests / elapsed:.1f} req/s)")
+        close_sessions()
+
+def linear_image_match(cleaned_title, image_files):
+    # The original nested scan, kept as the reference the index must agree with
+    for image_path in image_files:
+        cleaned_image_name = clean_string(image_path.stem)
+        if cleaned_title in cleaned_image_name or cleaned_image_name in cleaned_title:
+            return image_path
+    return None
+
+def synthetic_titles(count, rng):
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9))) for _ in range(3000)]
+    kinds = ["Office", "Industrial", "Retail", "Multifamily"]
+    return [f"{rng.choice(words).title()} {rng.choice(words).title()} {rng.choice(kinds)} Market Report {i}" for i in range(count)]
+
+def bench_image_index(args):
+    rng = random.Random(args.seed)
+    titles = synthetic_titles(args.pdfs, rng)
+    # Roughly half the images belong to a PDF (with extra words around the title), the rest are noise
+    image_files = []
+    for i in range(args.images):
+        if i % 2 == 0:
+            image_files.append(Path(f"images/Cover - {rng.choice(titles)} - Q3.jpg"))
+        else:
+            image_files.append(Path(f"images/{' '.join(synthetic_titles(1, rng)[0].split()[:3])} {i}.jpeg"))
+    rng.shuffle(image_files)
+    cleaned_titles = [clean_string(title) for title in titles]
+
+    start = time.perf_counter()
+    index = ImageIndex(image_files)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = [index.find(title) for title in cleaned_titles]
+    index_time = time.perf_counter() - start
+
+    sample = rng.sample(range(len(cleaned_titles)), min(args.sample, len(cleaned_titles)))
+    start = time.perf_counter()
+    linear = {i: linear_image_match(cleaned_titles[i], image_files) for i in sample}
+    linear_time = (time.perf_counter() - start) / len(sample) * len(cleaned_titles)
+
+    mismatches = sum(1 for i in sample if linear[i] != indexed[i])
+    matched = sum(1 for match in indexed if match)
+    print(f"{args.pdfs} PDFs x {args.images} images, {matched} matched")
+    print(f"  index build: {build_time:.2f}s, lookups: {index_time:.2f}s ({index_time / len(titles) * 1e6:.0f} us/PDF)")
+    print(f"  linear scan: {linear_time:.1f}s (extrapolated from {len(sample)} PDFs)")
+    print(f"  mismatches vs linear scan on sample: {mismatches}")
+
+def bench_drive(args):
+    # Uploads a synthetic PDF corpus to the fake Drive endpoint, serially and
+    # with N concurrent uploads, with some chunk PUTs failing mid-upload.
+    with tempfile.TemporaryDirectory() as corpus:
+        files = {}
+        for i in range(args.files):
+            path = os.path.join(corpus, f"market-{i}.pdf")
+            with open(path, "wb") as f:
+                f.write(os.urandom(args.size_kb * 1024))
+            files[i] = path
+
+        for workers in sorted({1, args.workers}):
+            with FakeDriveServer(chunk_error_rate=args.error_rate, latency=args.latency) as server:
+                uploader = DriveUploader(server.service, workers=workers, chunk_size=args.chunk_kb * 1024, max_retries=10)
+                start = time.perf_counter()
+                links = uploader.upload_all(files)
+                elapsed = time.perf_counter() - start
+                print(f"{workers:>3} worker(s): {len(links)}/{args.files} uploaded and shared in {elapsed:.2f}s "
+                      f"({server.stats['bytes'] / elapsed / 1024 / 1024:.1f} MiB/s), {server.stats['chunk_errors']} failed chunks "
+                      f"resumed, {server.stats['batches']} permission batch(es)")
+
+def bench_bulk(args):
+    # Round trips needed to create N products one REST POST at a time versus
+    # one staged bulk mutation, against the fake store's mock GraphQL endpoint.
+    config = {"Description": "Benchmark", "Price": "10.00", "CompareToPrice": "20.00",
+              "Collections": [], "SearchEngineDescription": "Benchmark"}
+    with tempfile.TemporaryDirectory() as corpus:
+        pdf_files = []
+        for i in range(args.products):
+            path = Path(corpus) / f"2024-3-Market {i}.pdf"
+            path.write_bytes(f"%PDF-1.4 market {i}".encode())
+            pdf_files.append(path)
+
+        with FakeShopifyServer(capacity=10 ** 9, leak_rate=10 ** 9, bulk_delay=args.bulk_delay) as server:
+            start = time.perf_counter()
+            for pdf_file in pdf_files:
+                create_product(server.store_url, build_product_data(pdf_title(pdf_file), config), "benchmark-token")
+            elapsed = time.perf_counter() - start
+            print(f"  rest: {args.products} products in {elapsed:.2f}s, {server.stats['requests']} requests")
+
+        with FakeShopifyServer(capacity=10 ** 9, leak_rate=10 ** 9, bulk_delay=args.bulk_delay) as server:
+            journal = RunJournal(os.path.join(corpus, "journal.db"))
+            start = time.perf_counter()
+            created = create_products_bulk(pdf_files, server.store_url, "benchmark-token", config, journal, poll_interval=0.1)
+            elapsed = time.perf_counter() - start
+            journal.close()
+            print(f"  bulk: {len(created)} products in {elapsed:.2f}s, {server.stats['requests']} requests")
+
+def bench_lifecycle(args):
+    # Activating a run's products with sequential PUTs versus the concurrent
+    # lifecycle engine, both under the fake store's bucket and per-call latency.
+    for workers in sorted({1, args.workers}):
+        with FakeShopifyServer(capacity=args.bucket_size, leak_rate=args.leak_rate, latency=args.latency) as server:
+            product_ids = [server.create_product_graphql({"title": f"Market {i}"})["product"]["id"] for i in range(args.products)]
+            product_ids = [int(gid.rsplit("/", 1)[-1]) for gid in product_ids]
+            get_client(server.store_url, "benchmark-token").bucket = LeakyBucket(args.bucket_size, args.leak_rate)
+            start = time.perf_counter()
+            results = run_lifecycle("activate", server.store_url, "benchmark-token", product_ids, workers)
+            elapsed = time.perf_counter() - start
+            activated = sum(1 for result in results if result["Result"] == "ok")
+            print(f"{workers:>3} worker(s): {activated}/{args.products} activated in {elapsed:.2f}s, "
+                  f"{server.stats['throttled']} throttled responses")
+
+def generate_corpus(source_folder, pdfs, pdf_kb, image_kb, image_share, seed, year="2024", quarter="3", duplicate_share=0.0):
+    # A source folder as main.py expects it: "<year>-<quarter>-<title>.pdf"
+    # files, cover images for a share of them and a config.json.
+    # duplicate_share of the PDFs and images are byte copies of earlier ones.
+    rng = random.Random(seed)
+    image_folder = Path(source_folder) / "images"
+    image_folder.mkdir(parents=True, exist_ok=True)
+    pdf_bodies, image_bodies = [], []
+    for title in synthetic_titles(pdfs, rng):
+        if pdf_bodies and rng.random() < duplicate_share:
+            pdf_body = rng.choice(pdf_bodies)
+        else:
+            pdf_body = b"%PDF-1.4\n" + rng.randbytes(pdf_kb * 1024)
+            pdf_bodies.append(pdf_body)
+        (Path(source_folder) / f"{year}-{quarter}-{title}.pdf").write_bytes(pdf_body)
+        if rng.random() < image_share:
+            if image_bodies and rng.random() < duplicate_share:
+                image_body = rng.choice(image_bodies)
+            else:
+                image_body = b"\xff\xd8\xff\xe0" + rng.randbytes(image_kb * 1024)
+                image_bodies.append(image_body)
+            (image_folder / f"{title}.jpg").write_bytes(image_body)
+    config = {"Description": "Benchmark", "Price": "10.00", "CompareToPrice": "20.00",
+              "Collections": [], "SearchEngineDescription": "Benchmark"}
+    with open(Path(source_folder) / "config.json", "w") as f:
+        json.dump(config, f)
+
+def bench_pipeline(args):
+    # Runs main.py end to end (create, attach images, Drive upload, metafields,
+    # CSV export, webhook, activation) against the local Shopify, Drive and
+    # webhook stand-ins, once per worker count, on a fresh synthetic corpus.
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as source_folder:
+            generate_corpus(source_folder, args.pdfs, args.pdf_kb, args.image_kb, args.image_share, args.seed,
+                            duplicate_share=args.duplicate_share)
+            with FakeShopifyServer(capacity=args.bucket_size, leak_rate=args.leak_rate, latency=args.latency, error_rate=args.error_rate) as shop, \
+                    FakeDriveServer(chunk_error_rate=args.error_rate, latency=args.latency) as drive, \
+                    FakeWebhookServer(latency=args.latency) as webhook:
+                get_client(shop.store_url, "benchmark-token").bucket = LeakyBucket(args.bucket_size, args.leak_rate)
+                argv = ["--source_folder", source_folder, "--store_url", shop.store_url, "--access_token", "benchmark-token",
+                        "--credentials_path", "unused.json", "--year", "2024", "--quarter", "3",
+                        "--workers", str(workers), "--drive_chunk_mb", str(args.chunk_mb),
+                        "--asset_cache", "" if args.no_asset_cache else os.path.join(source_folder, "asset_cache.db")]
+                if args.bulk:
+                    argv.append("--bulk")
+
+                tracemalloc.start()
+                start = time.perf_counter()
+                pipeline.run(pipeline.parse_arguments(argv), action="activate", service_factory=drive.service, webhook_url=webhook.url)
+                elapsed = time.perf_counter() - start
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                summary = metrics.summary()
+                active = sum(1 for product in shop.products.values() if product.get("status") == "active")
+                print(f"{workers:>3} worker(s): {active}/{args.pdfs} products live in {elapsed:.2f}s "
+                      f"({active / elapsed:.1f} products/s), {len(shop.metafields)} download links set, peak traced memory {peak / 1024 / 1024:.1f} MiB")
+                print(f"     shopify: {shop.stats['requests']} requests ({shop.stats['bytes'] / 1024 / 1024:.1f} MiB), {shop.stats['throttled']} throttled, {shop.stats['errors']} failed; "
+                      f"drive: {drive.stats['bytes'] / 1024 / 1024:.1f} MiB, {drive.stats['chunk_errors']} failed chunks; "
+                      f"webhook: {len(webhook.deliveries)} deliveries")
+                print("     " + ", ".join(f"{stage} {described['total']:.2f}s" for stage, described in summary["stages"].items()))
+    # ru_maxrss is in KiB on Linux and covers the whole benchmark process
+    print(f"peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+
+def bench_watch(args):
+    # Drop-to-live latency in watch mode: PDFs are copied into the watched
+    # folder one at a time while main.py runs with --watch --action activate,
+    # and each is timed until its product is active on the fake store.
+    with tempfile.TemporaryDirectory() as source_folder, tempfile.TemporaryDirectory() as staging:
+        generate_corpus(staging, args.pdfs, args.pdf_kb, args.image_kb, 1.0, args.seed)
+        os.replace(os.path.join(staging, "config.json"), os.path.join(source_folder, "config.json"))
+        os.replace(os.path.join(staging, "images"), os.path.join(source_folder, "images"))
+        staged = sorted(Path(staging).glob("*.pdf"))
+
+        with FakeShopifyServer(capacity=args.bucket_size, leak_rate=args.leak_rate, latency=args.latency) as shop, \
+                FakeDriveServer(latency=args.latency) as drive, FakeWebhookServer(latency=args.latency) as webhook:
+            get_client(shop.store_url, "benchmark-token").bucket = LeakyBucket(args.bucket_size, args.leak_rate)
+            latencies = []
+
+            def drop_files():
+                for pdf_file in staged:
+                    title = pdf_title(pdf_file)
+                    # Keep the original mtime so the file counts as settled once it is in place
+                    stat = pdf_file.stat()
+                    target = os.path.join(source_folder, pdf_file.name)
+                    os.replace(pdf_file, target)
+                    os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10 ** 10))
+                    dropped = time.perf_counter()
+                    while not any(p.get("title") == title and p.get("status") == "active" for p in list(shop.products.values())):
+                        time.sleep(0.01)
+                    latencies.append(time.perf_counter() - dropped)
+                    time.sleep(args.interval)
+                os.kill(os.getpid(), signal.SIGTERM)
+
+            argv = ["--source_folder", source_folder, "--store_url", shop.store_url, "--access_token", "benchmark-token",
+                    "--credentials_path", "unused.json", "--year", "2024", "--quarter", "3", "--workers", str(args.workers),
+                    "--asset_cache", "", "--watch", "--action", "activate", "--poll_interval", str(args.poll_interval)]
+            threading.Thread(target=drop_files, daemon=True).start()
+            pipeline.run(pipeline.parse_arguments(argv), service_factory=drive.service, webhook_url=webhook.url)
+
+            latencies.sort()
+            print(f"{len(latencies)} PDFs dropped {args.interval}s apart, polling every {args.poll_interval}s: "
+                  f"drop-to-live p50 {latencies[len(latencies) // 2]:.2f}s, max {latencies[-1]:.2f}s; "
+                  f"{len(webhook.deliveries)} webhook deliveries")
+
+def bench_webhook(args):
+    # Delivering a large ledger: the whole CSV as one multipart upload versus
+    # gzipped NDJSON chunks, then an incremental delivery after a few rows
+    # changed, against a webhook that fails error_rate of the requests.
+    delivery.BACKOFF_SECONDS = 0.01
+    with tempfile.TemporaryDirectory() as workdir, FakeWebhookServer(latency=args.latency, error_rate=args.error_rate, seed=args.seed) as hook:
+        ledger = ProductLedger(os.path.join(workdir, "product_ledger.db"))
+        for product_id in range(1, args.rows + 1):
+            ledger.upsert(product_id, f"/data/2024Q3/2024-3-Market {product_id}.pdf", f"https://drive.google.com/file/d/{product_id:033d}/view")
+        ledger.commit()
+        csv_file_path = os.path.join(workdir, "product_pdf_data.csv")
+        ledger.export_csv(csv_file_path)
+
+        def measure(label, send):
+            requests_before, bytes_before, rows_before = hook.stats["requests"], hook.stats["bytes"], hook.stats["rows"]
+            start = time.perf_counter()
+            send()
+            elapsed = time.perf_counter() - start
+            print(f"{label:>22}: {elapsed:.2f}s, {hook.stats['requests'] - requests_before} requests, "
+                  f"{(hook.stats['bytes'] - bytes_before) / 1024:.0f} KiB on the wire, {hook.stats['rows'] - rows_before} rows")
+
+        measure("full CSV", lambda: send_csv_to_webhook(csv_file_path, hook.url))
+        measure("NDJSON, first delivery", lambda: delivery.deliver_changes(ledger, hook.url, args.chunk_rows))
+        for product_id in random.Random(args.seed).sample(range(1, args.rows + 1), args.changed):
+            ledger.upsert(product_id, drive_url=f"https://drive.google.com/file/d/{product_id:033d}/v2")
+        ledger.commit()
+        measure(f"NDJSON, {args.changed} changed", lambda: delivery.deliver_changes(ledger, hook.url, args.chunk_rows))
+        measure("NDJSON, nothing changed", lambda: delivery.deliver_changes(ledger, hook.url, args.chunk_rows))
+        print(f"webhook: {hook.stats['errors']} injected failures, {hook.stats['duplicates']} duplicate chunks")
+        ledger.close()
+
+def bench_plan(args):
+    # Reruns against a store that already has the products: the same folder
+    # again (journal present), a fresh copy of the folder without its journal
+    # or ledger (another machine, lost state), with and without the planner,
+    # and next quarter's folder (same titles, new PDFs), which must not reuse
+    # this quarter's products. Counts the Shopify requests and products each
+    # run adds.
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = os.path.join(workdir, "corpus")
+        generate_corpus(corpus, args.pdfs, args.pdf_kb, args.image_kb, 1.0, args.seed)
+        next_quarter = os.path.join(workdir, "next-quarter")
+        shutil.copytree(corpus, next_quarter)
+        for pdf_file in Path(next_quarter).glob("2024-3-*.pdf"):
+            renamed = pdf_file.rename(pdf_file.with_name("2024-4-" + pdf_file.name[len("2024-3-"):]))
+            renamed.write_bytes(renamed.read_bytes() + b"\n% Q4\n")
+        cache_path = os.path.join(workdir, "asset_cache.db")
+        with FakeShopifyServer(capacity=args.bucket_size, leak_rate=args.leak_rate, latency=args.latency) as shop, \
+                FakeDriveServer(latency=args.latency) as drive, FakeWebhookServer(latency=args.latency) as webhook:
+            get_client(shop.store_url, "benchmark-token").bucket = LeakyBucket(args.bucket_size, args.leak_rate)
+
+            def run(label, folder, *extra):
+                if not os.path.exists(folder):
+                    shutil.copytree(corpus, folder)
+                requests_before, products_before = shop.stats["requests"], len(shop.products)
+                argv = ["--source_folder", folder, "--store_url", shop.store_url, "--access_token", "benchmark-token",
+                        "--credentials_path", "unused.json", "--year", "2024", "--quarter", "3", "--workers", str(args.workers),
+                        "--asset_cache", cache_path, "--action", "skip", *extra]
+                start = time.perf_counter()
+                pipeline.run(pipeline.parse_arguments(argv), service_factory=drive.service, webhook_url=webhook.url)
+                elapsed = time.perf_counter() - start
+                print(f"{label:>28}: {elapsed:.2f}s, {shop.stats['requests'] - requests_before} Shopify requests, "
+                      f"{len(shop.products) - products_before} products created, {len(shop.products)} in the store")
+
+            first = os.path.join(workdir, "first")
+            run("first run", first)
+            run("rerun, same folder", first)
+            run("fresh folder, --no_plan", os.path.join(workdir, "fresh-no-plan"), "--no_plan")
+            run("fresh folder, planned", os.path.join(workdir, "fresh-planned"))
+            run("next quarter, planned", next_quarter)
+
+def bench_startup(args):
+    # Interpreter start to exit for main.py --help, plain import of main.py,
+    # and the heavy modules an import leaves loaded, each in a fresh process.
+    import subprocess
+    import statistics
+    import sys
+    heavy = ("requests", "googleapiclient", "google.oauth2", "httplib2", "pandas", "PIL")
+    commands = {
+        "python (baseline)": [sys.executable, "-c", "pass"],
+        "import main": [sys.executable, "-c", "import main"],
+        "main.py --help": [sys.executable, "main.py", "--help"],
+        "first Drive service": [sys.executable, "-c", "import httplib2, google_drive; google_drive.build_drive_service(http=httplib2.Http())"],
+    }
+    for label, command in commands.items():
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            timings.append(time.perf_counter() - start)
+        print(f"{label:>20}: median {statistics.median(timings) * 1000:.0f} ms, min {min(timings) * 1000:.0f} ms over {args.runs} runs")
+    loaded = subprocess.run([sys.executable, "-c", f"import sys, main; print(' '.join(m for m in {heavy!r} if m in sys.modules))"],
+                            capture_output=True, text=True, check=True).stdout.strip()
+    print(f"heavy modules loaded by import main: {loaded or 'none'}")
+
+def bench_multistore(args):
+    # Publishing one corpus to N stores: one full main.py run per store (each
+    # with its own copy of the folder, as before --stores) versus a single
+    # --stores run that uploads to Drive once and fans out to every store.
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = os.path.join(workdir, "corpus")
+        generate_corpus(corpus, args.pdfs, args.pdf_kb, args.image_kb, 0.9, args.seed)
+
+        for label in ("per-store", "fan-out"):
+            with contextlib.ExitStack() as stack:
+                shops = [stack.enter_context(FakeShopifyServer(capacity=args.bucket_size, leak_rate=args.leak_rate, latency=args.latency))
+                         for _ in range(args.stores)]
+                drive = stack.enter_context(FakeDriveServer(latency=args.latency))
+                webhook = stack.enter_context(FakeWebhookServer(latency=args.latency))
+                for shop in shops:
+                    get_client(shop.store_url, "benchmark-token").bucket = LeakyBucket(args.bucket_size, args.leak_rate)
+                common = ["--credentials_path", "unused.json", "--year", "2024", "--quarter", "3",
+                          "--workers", str(args.workers), "--asset_cache", "", "--action", "activate"]
+
+                start = time.perf_counter()
+                if label == "per-store":
+                    for number, shop in enumerate(shops):
+                        source_folder = os.path.join(workdir, f"{label}-{number}")
+                        shutil.copytree(corpus, source_folder)
+                        argv = ["--source_folder", source_folder, "--store_url", shop.store_url, "--access_token", "benchmark-token"]
+                        pipeline.run(pipeline.parse_arguments(argv + common), service_factory=drive.service, webhook_url=webhook.url)
+                else:
+                    source_folder = os.path.join(workdir, label)
+                    shutil.copytree(corpus, source_folder)
+                    stores_path = os.path.join(workdir, "stores.json")
+                    with open(stores_path, "w") as f:
+                        json.dump([{"name": f"store{number}", "store_url": shop.store_url, "access_token": "benchmark-token"}
+                                   for number, shop in enumerate(shops)], f)
+                    argv = ["--source_folder", source_folder, "--stores", stores_path]
+                    pipeline.run(pipeline.parse_arguments(argv + common), service_factory=drive.service, webhook_url=webhook.url)
+                elapsed = time.perf_counter() - start
+
+                live = [sum(1 for product in shop.products.values() if product.get("status") == "active") for shop in shops]
+                print(f"{label:>9}: {sum(live)}/{args.pdfs * args.stores} products live across {args.stores} stores in {elapsed:.2f}s, "
+                      f"{drive.stats['bytes'] / 1024 / 1024:.1f} MiB uploaded to Drive")
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the Shopify product pipeline")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    scheduler = subparsers.add_parser("scheduler", help="Shopify rate-limit scheduler against a fake store")
+    scheduler.add_argument("--requests", type=int, default=200)
+    scheduler.add_argument("--workers", type=int, default=8)
+    scheduler.add_argument("--bucket_size", type=int, default=40)
+    scheduler.add_argument("--leak_rate", type=float, default=20.0)
+    scheduler.set_defaults(func=bench_scheduler)
+
+    pooling = subparsers.add_parser("pooling", help="Fresh connections vs pooled keep-alive sessions")
+    pooling.add_argument("--requests", type=int, default=2000)
+    pooling.add_argument("--workers", type=int, default=8)
+    pooling.set_defaults(func=bench_pooling)
+
+    image_index = subparsers.add_parser("image-index", help="Indexed image matching vs the nested linear scan")
+    image_index.add_argument("--pdfs", type=int, default=10000)
+    image_index.add_argument("--images", type=int, default=10000)
+    image_index.add_argument("--sample", type=int, default=50)
+    image_index.add_argument("--seed", type=int, default=7)
+    image_index.set_defaults(func=bench_image_index)
+
+    drive = subparsers.add_parser("drive", help="Concurrent resumable Drive uploads against a fake Drive endpoint")
+    drive.add_argument("--files", type=int, default=40)
+    drive.add_argument("--size_kb", type=int, default=1024)
+    drive.add_argument("--chunk_kb", type=int, default=256)
+    drive.add_argument("--workers", type=int, default=8)
+    drive.add_argument("--latency", type=float, default=0.02)
+    drive.add_argument("--error_rate", type=float, default=0.05)
+    drive.set_defaults(func=bench_drive)
+
+    bulk = subparsers.add_parser("bulk", help="Per-product REST creates vs one bulk mutation")
+    bulk.add_argument("--products", type=int, default=2000)
+    bulk.add_argument("--bulk_delay", type=float, default=0.5)
+    bulk.set_defaults(func=bench_bulk)
+
+    lifecycle = subparsers.add_parser("lifecycle", help="Sequential vs concurrent product activation")
+    lifecycle.add_argument("--products", type=int, default=300)
+    lifecycle.add_argument("--workers", type=int, default=8)
+    lifecycle.add_argument("--latency", type=float, default=0.1)
+    lifecycle.add_argument("--bucket_size", type=int, default=40)
+    lifecycle.add_argument("--leak_rate", type=float, default=40.0)
+    lifecycle.set_defaults(func=bench_lifecycle)
+
+    pipeline_parser = subparsers.add_parser("pipeline", help="Full main.py run against local Shopify, Drive and webhook servers")
+    pipeline_parser.add_argument("--pdfs", type=int, default=200)
+    pipeline_parser.add_argument("--pdf_kb", type=int, default=256)
+    pipeline_parser.add_argument("--image_kb", type=int, default=128)
+    pipeline_parser.add_argument("--image_share", type=float, default=0.9)
+    pipeline_parser.add_argument("--workers", type=int, nargs="+", default=[1, 8])
+    pipeline_parser.add_argument("--latency", type=float, default=0.02)
+    pipeline_parser.add_argument("--error_rate", type=float, default=0.0)
+    pipeline_parser.add_argument("--bucket_size", type=int, default=40)
+    pipeline_parser.add_argument("--leak_rate", type=float, default=40.0)
+    pipeline_parser.add_argument("--chunk_mb", type=int, default=1)
+    pipeline_parser.add_argument("--bulk", action="store_true")
+    pipeline_parser.add_argument("--duplicate_share", type=float, default=0.0)
+    pipeline_parser.add_argument("--no_asset_cache", action="store_true")
+    pipeline_parser.add_argument("--seed", type=int, default=7)
+    pipeline_parser.set_defaults(func=bench_pipeline)
+
+    watch = subparsers.add_parser("watch", help="Drop-to-live latency of main.py --watch")
+    watch.add_argument("--pdfs", type=int, default=20)
+    watch.add_argument("--pdf_kb", type=int, default=256)
+    watch.add_argument("--image_kb", type=int, default=128)
+    watch.add_argument("--interval", type=float, default=0.5)
+    watch.add_argument("--poll_interval", type=float, default=1.0)
+    watch.add_argument("--workers", type=int, default=4)
+    watch.add_argument("--latency", type=float, default=0.02)
+    watch.add_argument("--bucket_size", type=int, default=40)
+    watch.add_argument("--leak_rate", type=float, default=2.0)
+    watch.add_argument("--seed", type=int, default=7)
+    watch.set_defaults(func=bench_watch)
+
+    webhook = subparsers.add_parser("webhook", help="Full CSV upload vs incremental gzipped NDJSON webhook delivery")
+    webhook.add_argument("--rows", type=int, default=50000)
+    webhook.add_argument("--changed", type=int, default=200)
+    webhook.add_argument("--chunk_rows", type=int, default=5000)
+    webhook.add_argument("--latency", type=float, default=0.02)
+    webhook.add_argument("--error_rate", type=float, default=0.1)
+    webhook.add_argument("--seed", type=int, default=7)
+    webhook.set_defaults(func=bench_webhook)
+
+    plan = subparsers.add_parser("plan", help="Reruns and lost journals with and without the planner")
+    plan.add_argument("--pdfs", type=int, default=100)
+    plan.add_argument("--pdf_kb", type=int, default=64)
+    plan.add_argument("--image_kb", type=int, default=32)
+    plan.add_argument("--workers", type=int, default=4)
+    plan.add_argument("--latency", type=float, default=0.01)
+    plan.add_argument("--bucket_size", type=int, default=40)
+    plan.add_argument("--leak_rate", type=float, default=20.0)
+    plan.add_argument("--seed", type=int, default=7)
+    plan.set_defaults(func=bench_plan)
+
+    startup = subparsers.add_parser("startup", help="Process startup time of main.py and the modules it loads")
+    startup.add_argument("--runs", type=int, default=10)
+    startup.set_defaults(func=bench_startup)
+
+    multistore = subparsers.add_parser("multistore", help="One run per store vs a single --stores fan-out run")
+    multistore.add_argument("--stores", type=int, default=3)
+    multistore.add_argument("--pdfs", type=int, default=60)
+    multistore.add_argument("--pdf_kb", type=int, default=512)
+    multistore.add_argument("--image_kb", type=int, default=128)
+    multistore.add_argument("--workers", type=int, default=4)
+    multistore.add_argument("--latency", type=float, default=0.02)
+    multistore.add_argument("--bucket_size", type=int, default=40)
+    multistore.add_argument("--leak_rate", type=float, default=20.0)
+    multistore.add_argument("--seed", type=int, default=7)
+    multistore.set_defaults(func=bench_multistore)
+
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.ERROR)
+    args = parse_arguments()
+    args.func(args)
@@ -0,0 +1,108 @@
+import os
+import logging
+import threading
+from pathlib import Path
+from typing import Iterator, Optional
+from file_operations import file_sha256, connect_db
+from metrics import metrics
+
+# Walks the source folder lazily in a stable (sorted, depth-first) order so
+# workers can start on the first PDF while the rest of a large or
+# network-mounted tree is still being listed. Content hashes are cached in a
+# manifest keyed by path, size and mtime, so files unchanged since the last
+# run cost a single stat instead of a full read.
+
+MANIFEST_FILENAME = 'file_manifest.db'
+
+class FileManifest:
+    def __init__(self, db_path: str, batch_size: int = 200, read_only: bool = False):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.unchanged = 0
+        self.hashed = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._conn = connect_db(db_path, read_only)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " content_hash TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def content_hash(self, path: str, stat: os.stat_result) -> str:
+        # Reuses the recorded hash while size and mtime match, otherwise reads the file
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime_ns, content_hash FROM files WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            self.unchanged += 1
+            return row[2]
+
+        content_hash = file_sha256(path)
+        self.hashed += 1
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, content_hash)
+            )
+            self._pending += 1
+            if self._pending >= self.batch_size:
+                self._commit()
+        return content_hash
+
+    def _commit(self):
+        self._conn.commit()
+        self._pending = 0
+
+    def commit(self):
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_manifest(source_folder: str, read_only: bool = False) -> FileManifest:
+    manifest = FileManifest(os.path.join(source_folder, MANIFEST_FILENAME), read_only=read_only)
+    logging.info(f"Using file manifest: {manifest.db_path}")
+    return manifest
+
+def iter_files(folder: str, suffix: str) -> Iterator[os.DirEntry]:
+    # Entries are sorted per directory and subdirectories are entered where
+    # they sort, giving the same order on every run and every filesystem.
+    try:
+        with os.scandir(folder) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except OSError as e:
+        logging.error(f"Cannot list {folder}: {e}")
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from iter_files(entry.path, suffix)
+        elif entry.name.endswith(suffix) and entry.is_file():
+            yield entry
+
+def discover_pdfs(source_folder: str, manifest: FileManifest, limit: Optional[int] = None) -> Iterator[tuple]:
+    # Yields (pdf_path, content_hash) as files are found; limit takes the
+    # first N in the stable order, so --markets_to_process is repeatable.
+    found = 0
+    for entry in iter_files(source_folder, '.pdf'):
+        if limit is not None and found >= limit:
+            break
+        with metrics.timer('discovery'):
+            content_hash = manifest.content_hash(entry.path, entry.stat())
+        found += 1
+        yield Path(entry.path), content_hash
+    manifest.commit()
+    logging.info(f"Discovered {found} PDFs ({manifest.unchanged} unchanged since the last run, {manifest.hashed} hashed)")
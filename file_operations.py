@@ -1,39 +1,54 @@
 import logging
 import os
-import csv
-import pandas as pd
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Optional
+import time
+from http_session import get_session
+from metrics import metrics
 
-def generate_csv_header(csv_file_path):
-    if not os.path.exists(csv_file_path):
-        with open(csv_file_path, 'w', newline='') as csvfile:
-            fieldnames = ['Product ID', 'PDF Path', 'Drive URL']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
+def pdf_title(pdf_file) -> str:
+    # "<year>-<quarter>-<Market Title>.pdf" -> "<Market Title>"
+    return Path(pdf_file).stem.split('-', 2)[-1].strip()
 
-def insert_data_to_csv(csv_file_path, product_id, pdf_path):
-    try:
-        with open(csv_file_path, 'a', newline='') as csvfile:
-            fieldnames = ['Product ID', 'PDF Path', 'Drive URL']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writerow({'Product ID': product_id, 'PDF Path': pdf_path, 'Drive URL': ''})
-        logging.info(f"Inserted data into CSV: Product ID = {product_id}, PDF Path = {pdf_path}")
-    except Exception as e:
-        logging.error(f"Error inserting data into CSV: {e}")
+def store_filename(filename: str, store_name: Optional[str] = None) -> str:
+    # product_ledger.db -> product_ledger-<store>.db when publishing to several stores
+    if not store_name:
+        return filename
+    base, ext = os.path.splitext(filename)
+    return f"{base}-{store_name}{ext}"
 
-def update_csv_with_drive_url(csv_file_path, product_id, drive_url):
-    try:
-        df = pd.read_csv(csv_file_path)
-        df.loc[df['Product ID'] == product_id, 'Drive URL'] = drive_url
-        df.to_csv(csv_file_path, index=False)
-        logging.info(f"Updated CSV with Drive URL for Product ID = {product_id}")
-    except Exception as e:
-        logging.error(f"Error updating CSV with Drive URL: {e}")
+def file_sha256(file_path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def connect_db(db_path: str, read_only: bool = False) -> sqlite3.Connection:
+    # read_only works on a private in-memory copy of the file (empty if there
+    # is none), so nothing on disk is created, migrated or written
+    if not read_only:
+        return sqlite3.connect(db_path, check_same_thread=False)
+    conn = sqlite3.connect(':memory:', check_same_thread=False)
+    if os.path.exists(db_path):
+        # immutable=1 avoids creating -wal/-shm files; a leftover WAL needs a normal read
+        mode = 'ro' if os.path.exists(f"{db_path}-wal") else 'ro&immutable=1'
+        source = sqlite3.connect(f"{Path(db_path).absolute().as_uri()}?mode={mode}", uri=True)
+        try:
+            source.backup(conn)
+        finally:
+            source.close()
+    return conn
 
 def send_csv_to_webhook(csv_file_path, webhook_url):
     try:
         with open(csv_file_path, 'rb') as f:
             files = {'file': (os.path.basename(csv_file_path), f)}
-            response = requests.post(webhook_url, files=files)
+            start = time.perf_counter()
+            response = get_session(webhook_url).post(webhook_url, files=files)
+            metrics.observe_http("POST webhook", response.status_code, time.perf_counter() - start)
             if response.status_code == 200:
                 logging.info(f"Successfully sent CSV to webhook: {webhook_url}")
             else:
@@ -1,31 +1,304 @@
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Callable
+import functools
+import threading
+import json
 import logging
+import random
+import time
+import os
+from ledger import ProductLedger
+from journal import RunJournal, UPLOADED, METAFIELD_SET
+from metafields import set_download_links
+from file_operations import file_sha256
+from metrics import metrics
+from asset_cache import AssetCache, DRIVE_FILE
+
+# Resumable upload chunks must be a multiple of 256 KiB
+CHUNK_ALIGNMENT = 256 * 1024
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+# Drive accepts at most 100 calls per batch request
+PERMISSION_BATCH_SIZE = 100
+TRANSIENT_STATUSES = {408, 429, 500, 502, 503, 504}
+ANYONE_READER = {'type': 'anyone', 'role': 'reader'}
+
+# The Google client libraries take a large share of startup time, so they are
+# imported only once a run actually talks to Drive.
+
+@functools.lru_cache(maxsize=None)
+def drive_discovery_document() -> dict:
+    # The Drive v3 discovery document bundled with google-api-python-client,
+    # parsed once per process instead of being fetched or re-read per service
+    from googleapiclient.discovery_cache import get_static_doc
+    return json.loads(get_static_doc('drive', 'v3'))
+
+def build_drive_service(credentials=None, http=None):
+    from googleapiclient.discovery import build_from_document
+    return build_from_document(drive_discovery_document(), credentials=credentials, http=http)
+
+def load_drive_credentials(credentials_path: str):
+    from google.oauth2 import service_account
+    return service_account.Credentials.from_service_account_file(
+        credentials_path,
+        scopes=['https://www.googleapis.com/auth/drive.file']
+    )
 
 def setup_google_drive(credentials_path: str):
     logging.info(f"Setting up Google Drive client with credentials from: {credentials_path}")
     try:
-        credentials = service_account.Credentials.from_service_account_file(
-            credentials_path,
-            scopes=['https://www.googleapis.com/auth/drive.file']
-        )
-        service = build('drive', 'v3', credentials=credentials)
+        service = build_drive_service(load_drive_credentials(credentials_path))
         logging.info("Successfully set up Google Drive client")
         return service
     except Exception as e:
         logging.error(f"Failed to setup Google Drive client: {e}")
         raise
 
-def upload_to_drive(service, file_path: str, folder_id: Optional[str] = None) -> str:
+def drive_service_factory(credentials_path: str) -> Callable:
+    # Service objects wrap a non-thread-safe httplib2 connection, so concurrent
+    # uploads each build their own from the same credentials.
+    credentials = load_drive_credentials(credentials_path)
+    return lambda: build_drive_service(credentials)
+
+def align_chunk_size(chunk_size: int) -> int:
+    return max(CHUNK_ALIGNMENT, chunk_size // CHUNK_ALIGNMENT * CHUNK_ALIGNMENT)
+
+def is_transient_error(error: Exception) -> bool:
+    import httplib2
+    from googleapiclient.errors import HttpError
+    if isinstance(error, HttpError):
+        return error.resp.status in TRANSIENT_STATUSES
+    return isinstance(error, (OSError, httplib2.HttpLib2Error))
+
+def upload_file(service, file_path: str, folder_id: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE, max_retries: int = 5) -> dict:
+    # Sends the file in chunks. After a transient failure the next call to
+    # next_chunk() asks Drive how many bytes it acknowledged and resumes from
+    # that offset instead of starting over.
+    file_metadata = {'name': os.path.basename(file_path), 'parents': [folder_id] if folder_id else []}
+    from googleapiclient.http import MediaFileUpload
+    media = MediaFileUpload(file_path, mimetype='application/pdf', chunksize=align_chunk_size(chunk_size), resumable=True)
+    request = service.files().create(body=file_metadata, media_body=media, fields='id, webViewLink')
+
+    response = None
+    failures = 0
+    while response is None:
+        start = time.perf_counter()
+        try:
+            _, response = request.next_chunk()
+            metrics.observe_http("PUT drive upload chunk", 200, time.perf_counter() - start)
+            failures = 0
+        except Exception as e:
+            metrics.observe_http("PUT drive upload chunk", getattr(getattr(e, 'resp', None), 'status', 'error'), time.perf_counter() - start)
+            failures += 1
+            if not is_transient_error(e) or failures > max_retries:
+                raise
+            metrics.count_retry("PUT drive upload chunk")
+            delay = min(2 ** failures, 32) + random.random()
+            logging.warning(f"Transient error uploading {file_path} at byte {request.resumable_progress}: {e}. Resuming in {delay:.1f}s")
+            time.sleep(delay)
+    return response
+
+def upload_to_drive(service, file_path: str, folder_id: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
     logging.info(f"Uploading file to Google Drive: {file_path}")
     try:
-        file_metadata = {'name': os.path.basename(file_path), 'parents': [folder_id] if folder_id else []}
-        media = MediaFileUpload(file_path, mimetype='application/pdf', resumable=True)
-        file = service.files().create(body=file_metadata, media_body=media, fields='id, webViewLink').execute()
-        service.permissions().create(fileId=file['id'], body={'type': 'anyone', 'role': 'reader'}, fields='id').execute()
+        file = upload_file(service, file_path, folder_id, chunk_size)
+        service.permissions().create(fileId=file['id'], body=ANYONE_READER, fields='id').execute()
         logging.info(f"Successfully uploaded file. File ID: {file['id']}")
         return file['webViewLink']
     except Exception as e:
         logging.error(f"Failed to upload file to Google Drive: {e}")
         raise
+
+class DriveUploader:
+    def __init__(self, service_factory: Callable, workers: int = 4, chunk_size: int = DEFAULT_CHUNK_SIZE, max_retries: int = 5, folder_id: Optional[str] = None,
+                 cache: Optional[AssetCache] = None, scope: str = ''):
+        self.service_factory = service_factory
+        self.cache = cache
+        self.scope = scope
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        self.workers = max(1, workers)
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.folder_id = folder_id
+        self._local = threading.local()
+
+    def _service(self):
+        if not hasattr(self._local, 'service'):
+            self._local.service = self.service_factory()
+        return self._local.service
+
+    def _upload(self, file_path: str) -> Optional[dict]:
+        logging.info(f"Uploading file to Google Drive: {file_path}")
+        try:
+            with metrics.timer('drive_upload'):
+                file = upload_file(self._service(), file_path, self.folder_id, self.chunk_size, self.max_retries)
+            logging.info(f"Successfully uploaded file. File ID: {file['id']}")
+            return file
+        except Exception as e:
+            logging.error(f"Failed to upload file to Google Drive: {file_path}: {e}")
+            return None
+
+    def share(self, file_ids: list) -> set:
+        # Makes files readable by anyone with the link, PERMISSION_BATCH_SIZE per batch request
+        service = self._service()
+        shared = set()
+
+        def on_response(request_id, response, exception):
+            if exception is None:
+                shared.add(request_id)
+            else:
+                logging.error(f"Failed to share Drive file {request_id}: {exception}")
+
+        for start in range(0, len(file_ids), PERMISSION_BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=on_response)
+            for file_id in file_ids[start:start + PERMISSION_BATCH_SIZE]:
+                batch.add(service.permissions().create(fileId=file_id, body=ANYONE_READER, fields='id'), request_id=file_id)
+            started = time.perf_counter()
+            try:
+                batch.execute()
+                metrics.observe_http("POST drive permissions batch", 200, time.perf_counter() - started)
+            except Exception as e:
+                metrics.observe_http("POST drive permissions batch", 'error', time.perf_counter() - started)
+                logging.error(f"Permission batch request failed: {e}")
+        return shared
+
+    def cached_link(self, content_hash: str) -> Optional[str]:
+        # Entries past their validation age are checked with a metadata call
+        # before reuse; a trashed or deleted file is dropped and uploaded again.
+        cached = self.cache.get(DRIVE_FILE, self.scope, content_hash)
+        if not cached:
+            return None
+        if cached['stale']:
+            from googleapiclient.errors import HttpError
+            try:
+                file = self._service().files().get(fileId=cached['remote_id'], fields='id, trashed, webViewLink').execute()
+                if file.get('trashed'):
+                    self.cache.invalidate(DRIVE_FILE, self.scope, content_hash)
+                    return None
+                self.cache.validated(DRIVE_FILE, self.scope, content_hash)
+            except HttpError as e:
+                if e.resp.status == 404:
+                    self.cache.invalidate(DRIVE_FILE, self.scope, content_hash)
+                else:
+                    logging.warning(f"Could not validate cached Drive file {cached['remote_id']}: {e}")
+                return None
+        return cached['url']
+
+    def remember(self, content_hash: str, file: dict, file_path: str):
+        if self.cache is not None:
+            self.cache.put(DRIVE_FILE, self.scope, content_hash, file['webViewLink'], file['id'], os.path.getsize(file_path))
+
+    def upload_once(self, file_path: str, content_hash: str) -> Optional[dict]:
+        # For callers uploading one file at a time: every call for the same
+        # content during this uploader's life shares a single upload. A failed
+        # upload is forgotten so a later call can try again.
+        with self._in_flight_lock:
+            future = self._in_flight.get(content_hash)
+            owner = future is None
+            if owner:
+                future = self._in_flight[content_hash] = Future()
+        if not owner:
+            return future.result()
+        file = None
+        try:
+            file = self._upload(file_path)
+        finally:
+            if not file:
+                with self._in_flight_lock:
+                    self._in_flight.pop(content_hash, None)
+            future.set_result(file)
+        return file
+
+    def upload_all(self, files: dict, hashes: Optional[dict] = None) -> dict:
+        # files maps a caller key (e.g. product ID) to a PDF path. Returns key ->
+        # webViewLink for files that were both uploaded and shared. With a cache
+        # and content hashes, identical files are uploaded once and files
+        # already on Drive are not uploaded at all.
+        keys = list(files)
+        dedup = self.cache is not None and hashes is not None
+        groups = {}
+        for key in keys:
+            groups.setdefault(hashes[key] if dedup else key, []).append(key)
+
+        links = {}
+        to_upload = []
+        for group_key, members in groups.items():
+            link = self.cached_link(group_key) if dedup else None
+            if link:
+                links.update((key, link) for key in members)
+            else:
+                to_upload.append(group_key)
+        reused = len(links)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            uploaded = dict(zip(to_upload, executor.map(self._upload, [files[groups[group_key][0]] for group_key in to_upload])))
+        uploaded = {group_key: file for group_key, file in uploaded.items() if file}
+        shared = self.share([file['id'] for file in uploaded.values()])
+        for group_key, file in uploaded.items():
+            if file['id'] not in shared:
+                continue
+            links.update((key, file['webViewLink']) for key in groups[group_key])
+            if dedup:
+                self.remember(group_key, file, files[groups[group_key][0]])
+        logging.info(f"Uploaded {len(uploaded)}/{len(to_upload)} files to Google Drive, shared {len(shared)}, "
+                     f"reused {reused} existing")
+        return {key: links[key] for key in keys if key in links}
+
+def make_uploader(args, asset_cache: Optional[AssetCache] = None, service_factory: Optional[Callable] = None) -> DriveUploader:
+    # The run's uploader: --workers concurrent uploads of --drive_chunk_mb
+    # chunks, with the asset cache scoped to the Drive credentials
+    return DriveUploader(service_factory or drive_service_factory(args.credentials_path), args.workers, args.drive_chunk_mb * 1024 * 1024,
+                         cache=asset_cache, scope=os.path.abspath(args.credentials_path))
+
+def process_uploaded_files(ledger: ProductLedger, store_url: str, access_token: str, journal: RunJournal, uploader: DriveUploader,
+                           drive_urls: Optional[dict] = None):
+    # drive_urls maps product IDs to links already uploaded elsewhere (the
+    # shared multi-store upload). A Drive URL only goes into the ledger once
+    # the metafield holding it is confirmed, so the CSV never lists a link the
+    # store does not have; an upload whose metafield failed is found again
+    # through the asset cache.
+    pending = [row for row in ledger.rows() if not journal.completed(row['product_id'], METAFIELD_SET)]
+    logging.info(f"Processing uploaded files from ledger: {ledger.db_path} ({len(pending)} not yet linked)")
+
+    try:
+        drive_urls = dict(drive_urls or {})
+        to_upload = {row['product_id']: row['pdf_path'] for row in pending if not row['drive_url'] and row['product_id'] not in drive_urls}
+        if to_upload:
+            hashes = None
+            if uploader.cache is not None:
+                # A row whose PDF is missing (e.g. imported from an old CSV) is skipped, not the whole sweep
+                hashes = {}
+                for product_id, pdf_path in list(to_upload.items()):
+                    try:
+                        hashes[product_id] = journal.content_hash(product_id) or file_sha256(pdf_path)
+                    except Exception as e:
+                        logging.error(f"Error processing product {product_id}: cannot read {pdf_path}: {e}")
+                        del to_upload[product_id]
+            uploaded = uploader.upload_all(to_upload, hashes)
+            for product_id in uploaded:
+                journal.mark(product_id, UPLOADED)
+            drive_urls.update(uploaded)
+
+        links = {}
+        for row in pending:
+            file_url = row['drive_url'] or drive_urls.get(row['product_id'])
+            if not file_url:
+                logging.error(f"Error processing product {row['product_id']}: no Drive URL for {row['pdf_path']}")
+                continue
+            links[row['product_id']] = file_url
+
+        # Metafields go out in metafieldsSet batches; only confirmed writes are journalled
+        with metrics.timer('metafield_update'):
+            written = set_download_links(store_url, access_token, links) if links else set()
+        with metrics.timer('csv_write'):
+            for product_id, file_url in links.items():
+                if product_id in written:
+                    ledger.upsert(product_id, drive_url=file_url)
+                    journal.mark(product_id, METAFIELD_SET)
+            ledger.commit()
+        logging.info(f"Linked {len(written)}/{len(links)} products to their Drive files")
+
+        logging.info("Completed processing all files")
+    except Exception as e:
+        logging.error(f"Error in process_uploaded_files: {e}")
+        raise
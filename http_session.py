@@ -0,0 +1,52 @@
+import logging
+import threading
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    import requests
+
+# One keep-alive session per host, so every product reuses the same pooled
+# TCP/TLS connections to the store, Drive and the webhook instead of paying
+# a fresh handshake on each call.
+
+DEFAULT_POOL_SIZE = 10
+
+_pool_size = DEFAULT_POOL_SIZE
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def configure_pool(pool_size: int):
+    # Pool size should match the number of workers sharing a host; sessions
+    # created with the old size are closed and rebuilt on next use.
+    global _pool_size
+    pool_size = max(1, pool_size)
+    with _sessions_lock:
+        if pool_size == _pool_size:
+            return
+        _pool_size = pool_size
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+    logging.info(f"HTTP connection pool size set to {pool_size}")
+
+def get_session(url: str) -> "requests.Session":
+    # requests is imported on first use so --help and argument errors stay fast
+    import requests
+    from requests.adapters import HTTPAdapter
+    host = urlsplit(url).netloc
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+        return session
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,60 @@
+import re
+from pathlib import Path
+from typing import Optional
+
+NGRAM = 3
+
+def clean_string(input_string: str) -> str:
+    cleaned_string = input_string.lower()
+    cleaned_string = re.sub(r'\.jpe?g$', '', cleaned_string)
+    cleaned_string = re.sub(r'[^a-z0-9]', ' ', cleaned_string)
+    return ' '.join(cleaned_string.split())
+
+class ImageIndex:
+    # Finds the first image (in the given order) whose cleaned name contains the
+    # cleaned title or is contained in it, the same answer as scanning every
+    # image, without touching every image per PDF:
+    #   - names contained in the title: look up every substring of the title
+    #     in a name -> first position map
+    #   - names containing the title: verify only the images sharing the
+    #     title's rarest trigram
+    def __init__(self, image_files: list):
+        self.image_files = list(image_files)
+        self.names = [clean_string(image_path.stem) for image_path in self.image_files]
+        self.first_position = {}
+        self.ngrams = {}
+        for position, name in enumerate(self.names):
+            self.first_position.setdefault(name, position)
+            for gram in {name[i:i + NGRAM] for i in range(len(name) - NGRAM + 1)}:
+                self.ngrams.setdefault(gram, []).append(position)
+        self.name_lengths = sorted({len(name) for name in self.first_position})
+
+    def __len__(self):
+        return len(self.image_files)
+
+    def _first_name_in_title(self, cleaned_title: str) -> Optional[int]:
+        best = None
+        for length in self.name_lengths:
+            if length > len(cleaned_title):
+                break
+            for start in range(len(cleaned_title) - length + 1):
+                position = self.first_position.get(cleaned_title[start:start + length])
+                if position is not None and (best is None or position < best):
+                    best = position
+        return best
+
+    def _first_name_containing(self, cleaned_title: str) -> Optional[int]:
+        if len(cleaned_title) < NGRAM:
+            candidates = range(len(self.names))
+        else:
+            grams = {cleaned_title[i:i + NGRAM] for i in range(len(cleaned_title) - NGRAM + 1)}
+            postings = [self.ngrams.get(gram, []) for gram in grams]
+            candidates = min(postings, key=len)
+        for position in candidates:
+            if cleaned_title in self.names[position]:
+                return position
+        return None
+
+    def find(self, cleaned_title: str) -> Optional[Path]:
+        positions = [p for p in (self._first_name_in_title(cleaned_title), self._first_name_containing(cleaned_title)) if p is not None]
+        return self.image_files[min(positions)] if positions else None
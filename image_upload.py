@@ -0,0 +1,59 @@
+import os
+import json
+import base64
+import logging
+import threading
+from pathlib import Path
+from typing import Optional
+from file_operations import file_sha256
+
+# Base64 input is read in multiples of 3 bytes so every chunk encodes without padding
+READ_CHUNK_SIZE = 3 * 64 * 1024
+CACHE_DIRNAME = '.image_cache'
+DEFAULT_QUALITY = 85
+
+class Base64ImageBody:
+    # Streams {"image": {"filename": ..., "attachment": "<base64>"}} for a file
+    # without ever holding the whole encoded image in memory. The length is
+    # known up front so requests sends a Content-Length instead of chunking,
+    # and each iteration reopens the file so throttled requests can be retried.
+    def __init__(self, image_path: str, filename: Optional[str] = None):
+        self.image_path = image_path
+        filename = json.dumps(filename or os.path.basename(image_path))
+        self.prefix = f'{{"image": {{"filename": {filename}, "attachment": "'.encode()
+        self.suffix = b'"}}'
+        self.size = os.path.getsize(image_path)
+
+    def __len__(self):
+        return len(self.prefix) + 4 * ((self.size + 2) // 3) + len(self.suffix)
+
+    def __iter__(self):
+        yield self.prefix
+        with open(self.image_path, 'rb') as image_file:
+            for chunk in iter(lambda: image_file.read(READ_CHUNK_SIZE), b''):
+                yield base64.b64encode(chunk)
+        yield self.suffix
+
+def prepare_image(image_path: str, max_dimension: int, quality: int = DEFAULT_QUALITY) -> str:
+    # Downscales print-resolution images to max_dimension pixels on the long
+    # side and recompresses them. Results are cached next to the images, keyed
+    # by content hash and settings, so an image is only re-encoded once.
+    try:
+        from PIL import Image
+    except ImportError:
+        logging.warning("Pillow is not installed; uploading images without resizing")
+        return image_path
+
+    cache_dir = Path(image_path).parent / CACHE_DIRNAME
+    cached_path = cache_dir / f"{file_sha256(image_path)}-{max_dimension}-q{quality}.jpg"
+    if cached_path.exists():
+        return str(cached_path)
+
+    cache_dir.mkdir(exist_ok=True)
+    tmp_path = cache_dir / f"{cached_path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with Image.open(image_path) as image:
+        image.thumbnail((max_dimension, max_dimension))
+        image.convert('RGB').save(tmp_path, 'JPEG', quality=quality, optimize=True)
+    os.replace(tmp_path, cached_path)
+    logging.info(f"Resized {image_path} to {cached_path} ({os.path.getsize(image_path)} -> {os.path.getsize(cached_path)} bytes)")
+    return str(cached_path)
@@ -0,0 +1,135 @@
+import os
+import time
+import logging
+import threading
+from typing import Optional
+from file_operations import store_filename, connect_db
+
+# Records which stages each PDF has completed so a rerun after a crash only
+# resumes unfinished work instead of creating duplicate Shopify products.
+# PDFs are keyed by path plus content hash; a PDF whose content changed is
+# treated as new. Every record is committed immediately, since losing one
+# means repeating a remote call.
+
+JOURNAL_FILENAME = 'run_journal.db'
+
+CREATED = 'created'
+IMAGE_ATTACHED = 'image_attached'
+UPLOADED = 'uploaded'
+METAFIELD_SET = 'metafield_set'
+ACTIVATED = 'activated'
+ARCHIVED = 'archived'
+DELETED = 'deleted'
+# A product is in at most one of these at a time
+LIFECYCLE_STAGES = (ACTIVATED, ARCHIVED, DELETED)
+
+class RunJournal:
+    def __init__(self, db_path: str, read_only: bool = False):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = connect_db(db_path, read_only)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pdfs ("
+            " pdf_path TEXT NOT NULL,"
+            " content_hash TEXT NOT NULL,"
+            " product_id INTEGER NOT NULL,"
+            " PRIMARY KEY (pdf_path, content_hash))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS stages ("
+            " product_id INTEGER NOT NULL,"
+            " stage TEXT NOT NULL,"
+            " completed_at REAL NOT NULL,"
+            " PRIMARY KEY (product_id, stage))"
+        )
+        # content_hash() looks PDFs up by product
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pdfs_product ON pdfs (product_id)")
+        self._conn.commit()
+
+    def product_for(self, pdf_path: str, content_hash: str) -> Optional[int]:
+        # Products deleted from the store no longer count as created
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT product_id FROM pdfs WHERE pdf_path = ? AND content_hash = ? AND NOT EXISTS "
+                "(SELECT 1 FROM stages s WHERE s.product_id = pdfs.product_id AND s.stage = ?)",
+                (pdf_path, content_hash, DELETED)
+            ).fetchone()
+        return row[0] if row else None
+
+    def latest_product_for_path(self, pdf_path: str) -> Optional[int]:
+        # The product made from any earlier content of this PDF path
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT product_id FROM pdfs WHERE pdf_path = ? AND NOT EXISTS "
+                "(SELECT 1 FROM stages s WHERE s.product_id = pdfs.product_id AND s.stage = ?) ORDER BY rowid DESC LIMIT 1",
+                (pdf_path, DELETED)
+            ).fetchone()
+        return row[0] if row else None
+
+    def content_hash(self, product_id: int) -> Optional[str]:
+        with self._lock:
+            # The most recent content when a product's PDF has changed
+            row = self._conn.execute("SELECT content_hash FROM pdfs WHERE product_id = ? ORDER BY rowid DESC LIMIT 1", (int(product_id),)).fetchone()
+        return row[0] if row else None
+
+    def record_created(self, pdf_path: str, content_hash: str, product_id: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pdfs (pdf_path, content_hash, product_id) VALUES (?, ?, ?)",
+                (pdf_path, content_hash, int(product_id))
+            )
+            self._mark(product_id, CREATED)
+
+    def mark(self, product_id: int, stage: str):
+        with self._lock:
+            self._mark(product_id, stage)
+
+    def _mark(self, product_id: int, stage: str):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO stages (product_id, stage, completed_at) VALUES (?, ?, ?)",
+            (int(product_id), stage, time.time())
+        )
+        self._conn.commit()
+
+    def reset(self, product_id: int, stages: tuple):
+        # Makes those stages run again, e.g. after the PDF behind a product changed
+        with self._lock:
+            self._conn.execute(
+                f"DELETE FROM stages WHERE product_id = ? AND stage IN ({', '.join('?' * len(stages))})",
+                (int(product_id), *stages)
+            )
+            self._conn.commit()
+
+    def set_lifecycle(self, product_id: int, stage: str):
+        with self._lock:
+            others = [other for other in LIFECYCLE_STAGES if other != stage]
+            self._conn.execute(
+                f"DELETE FROM stages WHERE product_id = ? AND stage IN ({', '.join('?' * len(others))})",
+                (int(product_id), *others)
+            )
+            self._mark(product_id, stage)
+
+    def stages(self, product_id: int) -> set:
+        with self._lock:
+            cursor = self._conn.execute("SELECT stage FROM stages WHERE product_id = ?", (int(product_id),))
+            return {row[0] for row in cursor}
+
+    def completed(self, product_id: int, stage: str) -> bool:
+        return stage in self.stages(product_id)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_journal(source_folder: str, store_name: Optional[str] = None, read_only: bool = False) -> RunJournal:
+    # Each store gets its own journal; product IDs are only unique per store
+    journal = RunJournal(os.path.join(source_folder, store_filename(JOURNAL_FILENAME, store_name)), read_only)
+    logging.info(f"Using run journal: {journal.db_path}")
+    return journal
@@ -0,0 +1,191 @@
+import os
+import csv
+import sqlite3
+import logging
+import threading
+from typing import Optional
+from file_operations import store_filename, connect_db
+
+# Product ID -> PDF path / Drive URL, kept in SQLite so each product costs one
+# indexed upsert instead of reloading and rewriting product_pdf_data.csv.
+# The CSV is still produced for the lifecycle actions via export_csv().
+# Every insert, change and removal takes the next value of a ledger-wide
+# change counter, so the webhook can send only what changed since the last
+# delivery it saw acknowledged (its cursor, also kept here per webhook URL).
+# Rows are listed (and exported) by position, the order their PDFs were
+# discovered in, not the order concurrent workers happened to record them.
+
+CSV_FIELDNAMES = ['Product ID', 'PDF Path', 'Drive URL']
+LEDGER_FILENAME = 'product_ledger.db'
+CSV_FILENAME = 'product_pdf_data.csv'
+
+class ProductLedger:
+    def __init__(self, db_path: str, batch_size: int = 50, read_only: bool = False):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._conn = connect_db(db_path, read_only)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS products ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " product_id INTEGER NOT NULL UNIQUE,"
+            " pdf_path TEXT,"
+            " drive_url TEXT)"
+        )
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(products)")}
+        if 'changed' not in columns:
+            # Ledgers from before change tracking: every existing row counts as changed
+            self._conn.execute("ALTER TABLE products ADD COLUMN changed INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("UPDATE products SET changed = seq")
+        if 'position' not in columns:
+            # Ledgers from before positions were kept: insertion order
+            self._conn.execute("ALTER TABLE products ADD COLUMN position INTEGER")
+            self._conn.execute("UPDATE products SET position = seq")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS products_changed ON products (changed)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS products_position ON products (position, seq)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS removed (product_id INTEGER PRIMARY KEY, changed INTEGER NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS delivery_cursors (url TEXT PRIMARY KEY, changed INTEGER NOT NULL)")
+        self._conn.commit()
+        self._changed = self._conn.execute(
+            "SELECT MAX(changed) FROM (SELECT MAX(changed) AS changed FROM products UNION ALL SELECT MAX(changed) FROM removed)"
+        ).fetchone()[0] or 0
+        self._position = self._conn.execute("SELECT MAX(position) FROM products").fetchone()[0] or 0
+
+    def reserve_position(self) -> int:
+        # Taken when a PDF is discovered; a new row without one goes last
+        with self._lock:
+            self._position += 1
+            return self._position
+
+    def upsert(self, product_id: int, pdf_path: Optional[str] = None, drive_url: Optional[str] = None, position: Optional[int] = None):
+        # Fields left as None keep their stored value, an existing row keeps
+        # its position, and an upsert that changes nothing does not count as a change
+        if position is None:
+            position = self.reserve_position()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO products (product_id, pdf_path, drive_url, changed, position) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(product_id) DO UPDATE SET "
+                " pdf_path = COALESCE(excluded.pdf_path, pdf_path),"
+                " drive_url = COALESCE(excluded.drive_url, drive_url),"
+                " changed = excluded.changed "
+                "WHERE pdf_path IS NOT COALESCE(excluded.pdf_path, pdf_path) OR drive_url IS NOT COALESCE(excluded.drive_url, drive_url)",
+                (int(product_id), pdf_path, drive_url, self._changed + 1, position)
+            )
+            if cursor.rowcount:
+                self._changed += 1
+                self._conn.execute("DELETE FROM removed WHERE product_id = ?", (int(product_id),))
+            self._pending += 1
+            if self._pending >= self.batch_size:
+                self._commit()
+
+    def clear_drive_url(self, product_id: int):
+        # upsert() cannot unset a field; used when the PDF behind a product changed
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE products SET drive_url = NULL, changed = ? WHERE product_id = ? AND drive_url IS NOT NULL",
+                (self._changed + 1, int(product_id))
+            )
+            if cursor.rowcount:
+                self._changed += 1
+            self._commit()
+
+    def remove(self, product_ids: list):
+        # Leaves a tombstone so the webhook also learns about removals
+        with self._lock:
+            for product_id in product_ids:
+                if self._conn.execute("DELETE FROM products WHERE product_id = ?", (int(product_id),)).rowcount:
+                    self._changed += 1
+                    self._conn.execute("INSERT OR REPLACE INTO removed (product_id, changed) VALUES (?, ?)", (int(product_id), self._changed))
+            self._commit()
+
+    def get(self, product_id: int) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT product_id, pdf_path, drive_url FROM products WHERE product_id = ?", (int(product_id),)).fetchone()
+        return dict(row) if row else None
+
+    def rows(self) -> list:
+        with self._lock:
+            cursor = self._conn.execute("SELECT product_id, pdf_path, drive_url FROM products ORDER BY position, seq")
+            return [dict(row) for row in cursor]
+
+    def pending_uploads(self) -> list:
+        with self._lock:
+            cursor = self._conn.execute("SELECT product_id, pdf_path, drive_url FROM products WHERE drive_url IS NULL OR drive_url = '' ORDER BY position, seq")
+            return [dict(row) for row in cursor]
+
+    def changes_since(self, changed: int, limit: int) -> list:
+        # Rows and tombstones changed after the given counter value, oldest change first
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT product_id, pdf_path, drive_url, changed, 0 AS removed FROM products WHERE changed > ? "
+                "UNION ALL SELECT product_id, NULL, NULL, changed, 1 FROM removed WHERE changed > ? "
+                "ORDER BY changed LIMIT ?",
+                (changed, changed, limit)
+            )
+            return [dict(row) for row in cursor]
+
+    def delivery_cursor(self, url: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT changed FROM delivery_cursors WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else 0
+
+    def set_delivery_cursor(self, url: str, changed: int):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO delivery_cursors (url, changed) VALUES (?, ?)", (url, changed))
+            self._commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def _commit(self):
+        self._conn.commit()
+        self._pending = 0
+
+    def commit(self):
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def import_csv(self, csv_file_path: str):
+        with open(csv_file_path, newline='') as csvfile:
+            for row in csv.DictReader(csvfile):
+                if row.get('Product ID'):
+                    self.upsert(int(float(row['Product ID'])), row.get('PDF Path') or None, row.get('Drive URL') or None)
+        self.commit()
+        logging.info(f"Imported existing CSV into ledger: {csv_file_path}")
+
+    def export_csv(self, csv_file_path: str):
+        tmp_path = f"{csv_file_path}.tmp"
+        with open(tmp_path, 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDNAMES)
+            writer.writeheader()
+            for row in self.rows():
+                writer.writerow({'Product ID': row['product_id'], 'PDF Path': row['pdf_path'] or '', 'Drive URL': row['drive_url'] or ''})
+        os.replace(tmp_path, csv_file_path)
+        logging.info(f"Exported {len(self)} ledger rows to CSV: {csv_file_path}")
+
+def open_ledger(source_folder: str, store_name: Optional[str] = None, read_only: bool = False) -> ProductLedger:
+    # Picks up a product_pdf_data.csv left by earlier runs the first time the ledger is created
+    db_path = os.path.join(source_folder, store_filename(LEDGER_FILENAME, store_name))
+    csv_file_path = os.path.join(source_folder, store_filename(CSV_FILENAME, store_name))
+    is_new = not os.path.exists(db_path)
+    ledger = ProductLedger(db_path, read_only=read_only)
+    if is_new and os.path.exists(csv_file_path):
+        ledger.import_csv(csv_file_path)
+    return ledger
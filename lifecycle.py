@@ -0,0 +1,128 @@
+import os
+import csv
+import sys
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
+from journal import RunJournal, ACTIVATED, ARCHIVED, DELETED
+from shopify_client import get_client
+from file_operations import store_filename
+
+# Applies one lifecycle action to every product from a run, concurrently
+# under the store's shared rate limiter, with a live progress line and a
+# per-product summary CSV.
+
+SUMMARY_FIELDNAMES = ['Product ID', 'Action', 'Result', 'Status Code', 'Error']
+
+ACTIONS = {
+    'activate': {'stage': ACTIVATED, 'status': 'active', 'verb': 'Activating'},
+    'archive': {'stage': ARCHIVED, 'status': 'archived', 'verb': 'Archiving'},
+    'delete': {'stage': DELETED, 'status': None, 'verb': 'Deleting'},
+}
+
+class ProgressReporter:
+    def __init__(self, label: str, total: int, stream=sys.stderr, interval: float = 0.5):
+        self.label = label
+        self.total = total
+        self.stream = stream
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._last = 0.0
+        self._lock = threading.Lock()
+        self._tty = hasattr(stream, 'isatty') and stream.isatty()
+
+    def update(self, ok: bool):
+        with self._lock:
+            self.done += 1
+            if not ok:
+                self.failed += 1
+            now = time.monotonic()
+            if self.done == self.total or now - self._last >= self.interval:
+                self._last = now
+                self._render(now)
+
+    def _render(self, now: float):
+        elapsed = max(now - self.started, 1e-9)
+        rate = self.done / elapsed
+        eta = (self.total - self.done) / rate if rate else 0
+        line = (f"{self.label}: {self.done}/{self.total} ({self.done * 100 // max(self.total, 1)}%), "
+                f"{self.failed} failed, {rate:.1f}/s, ETA {int(eta // 60)}m{int(eta % 60):02d}s")
+        if self._tty:
+            self.stream.write(f"\r{line}")
+            if self.done == self.total:
+                self.stream.write("\n")
+            self.stream.flush()
+        else:
+            logging.info(line)
+
+def apply_action(client, action: str, product_id: int) -> dict:
+    result = {'Product ID': product_id, 'Action': action, 'Result': 'failed', 'Status Code': '', 'Error': ''}
+    try:
+        if action == 'delete':
+            response = client.delete(f"products/{product_id}.json")
+            # Already gone counts as deleted
+            ok = response.status_code in (200, 404)
+        else:
+            update_data = {"product": {"id": product_id, "status": ACTIONS[action]['status']}}
+            response = client.put(f"products/{product_id}.json", json=update_data)
+            ok = response.status_code == 200
+        result['Status Code'] = response.status_code
+        if ok:
+            result['Result'] = 'ok'
+        else:
+            result['Error'] = response.text[:200]
+    except Exception as e:
+        result['Error'] = str(e)
+    return result
+
+def write_summary(summary_path: str, results: list):
+    with open(summary_path, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=SUMMARY_FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(results)
+
+def run_lifecycle(action: str, store_url: str, access_token: str, product_ids: list, workers: int = 1, journal: Optional[RunJournal] = None, summary_path: Optional[str] = None) -> list:
+    stage = ACTIONS[action]['stage']
+    client = get_client(store_url, access_token)
+
+    results = []
+    todo = []
+    for product_id in product_ids:
+        if journal and journal.completed(product_id, stage):
+            results.append({'Product ID': product_id, 'Action': action, 'Result': 'skipped', 'Status Code': '', 'Error': f'already {stage}'})
+        else:
+            todo.append(product_id)
+    logging.info(f"{ACTIONS[action]['verb']} {len(todo)} products ({len(results)} already done) with {workers} worker(s)")
+
+    progress = ProgressReporter(ACTIONS[action]['verb'], len(todo))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(apply_action, client, action, product_id) for product_id in todo]
+        for future in as_completed(futures):
+            result = future.result()
+            ok = result['Result'] == 'ok'
+            if ok and journal:
+                journal.set_lifecycle(result['Product ID'], stage)
+            if not ok:
+                logging.error(f"Failed to {action} product {result['Product ID']}: {result['Status Code']} {result['Error']}")
+            progress.update(ok)
+            results.append(result)
+
+    order = {product_id: position for position, product_id in enumerate(product_ids)}
+    results.sort(key=lambda result: order[result['Product ID']])
+    if summary_path:
+        write_summary(summary_path, results)
+        logging.info(f"Wrote {action} summary to {summary_path}")
+    succeeded = sum(1 for result in results if result['Result'] != 'failed')
+    logging.info(f"{action.capitalize()} finished: {succeeded}/{len(results)} products ok")
+    return results
+
+def read_product_ids(csv_file_path: str) -> list:
+    with open(csv_file_path, newline='') as csvfile:
+        return [int(float(row['Product ID'])) for row in csv.DictReader(csvfile) if row.get('Product ID')]
+
+def summary_path_for(csv_file_path: str, action: str, store_name: Optional[str] = None) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(csv_file_path)), store_filename(f"{action}_summary.csv", store_name))
@@ -2,29 +2,71 @@ import logging
 import os
 import argparse
 from config import read_config
-from shopify import process_pdfs, activate_products, delete_products
-from google_drive import process_uploaded_files
-from file_operations import send_csv_to_webhook
+from shopify import apply_final_action
+from google_drive import process_uploaded_files, make_uploader
+from webhook import publish_ledger, DEFAULT_WEBHOOK_URL, DEFAULT_CHUNK_ROWS, WEBHOOK_FORMATS
+from http_session import configure_pool, close_sessions
+from ledger import open_ledger, CSV_FILENAME
+from journal import open_journal
+from metrics import metrics
+from asset_cache import open_asset_cache, DEFAULT_CACHE_PATH
+from discovery import open_manifest
+from stages import run_product_pipeline
+import planner
+from multistore import read_stores, run_stores
+from watcher import PdfWatcher, watch_folder, WATCH_ACTIONS, DEFAULT_POLL_INTERVAL, DEFAULT_QUEUE_SIZE
 
-def parse_arguments():
+def parse_arguments(argv=None):
     # Setting up command-line argument parsing
     parser = argparse.ArgumentParser(description="Shopify Product Management")
     parser.add_argument("--source_folder", help="Path to the source folder", required=True)
-    parser.add_argument("--store_url", help="Your Shopify store URL", required=True)
-    parser.add_argument("--access_token", help="Access token for Shopify", required=True)
+    parser.add_argument("--store_url", help="Your Shopify store URL")
+    parser.add_argument("--access_token", help="Access token for Shopify")
+    parser.add_argument("--stores", help="JSON file listing several stores to publish to instead of --store_url/--access_token")
     parser.add_argument("--credentials_path", help="Path to the Google Drive credentials JSON", required=True)
     parser.add_argument("--year", help="Enter the year (e.g., 2024)", required=True)
     parser.add_argument("--quarter", help="Enter the quarter (1-4)", required=True)
     parser.add_argument("--markets_to_process", type=int, help="Enter the number of markets to process", default=None)
+    parser.add_argument("--workers", type=int, help="Number of PDFs to process concurrently", default=1)
+    parser.add_argument("--bulk", action="store_true", help="Create products with a single Shopify bulk mutation")
+    parser.add_argument("--drive_chunk_mb", type=int, help="Chunk size in MiB for resumable Google Drive uploads", default=8)
+    parser.add_argument("--asset_cache", help="Path of the cache of already uploaded PDFs and images (empty to disable)", default=DEFAULT_CACHE_PATH)
+    parser.add_argument("--action", choices=['activate', 'archive', 'delete', 'skip'], help="Action to apply to the products without asking", default=None)
+    parser.add_argument("--watch", action="store_true", help="Keep running and process new PDFs as they appear in the source folder")
+    parser.add_argument("--poll_interval", type=float, help="Seconds between source folder scans in watch mode", default=DEFAULT_POLL_INTERVAL)
+    parser.add_argument("--queue_size", type=int, help="Maximum PDFs waiting for a worker in watch mode", default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument("--dry_run", action="store_true", help="Only write run_plan.csv: what would be created, updated, skipped or is orphaned")
+    parser.add_argument("--no_plan", action="store_true", help="Do not check the store for existing products before creating them")
+    parser.add_argument("--webhook_url", help="Webhook the product ledger is delivered to (default: $WEBHOOK_URL or the Make webhook)", default=DEFAULT_WEBHOOK_URL)
+    parser.add_argument("--webhook_format", choices=WEBHOOK_FORMATS, help="Send changed rows as gzipped NDJSON chunks, or the whole CSV", default='ndjson')
+    parser.add_argument("--webhook_chunk_rows", type=int, help="Ledger rows per NDJSON webhook chunk", default=DEFAULT_CHUNK_ROWS)
     
     # Parsing the arguments
-    return parser.parse_args()
+    args = parser.parse_args(argv)
+    if not args.stores and not (args.store_url and args.access_token):
+        parser.error("--store_url and --access_token are required unless --stores is given")
+    if args.stores and args.watch:
+        parser.error("--watch publishes to a single store")
+    if args.dry_run and (args.stores or args.watch or args.no_plan):
+        parser.error("--dry_run plans a single-store batch run")
+    if args.watch and args.action not in (None, *WATCH_ACTIONS):
+        parser.error(f"--watch supports --action {', '.join(WATCH_ACTIONS)}")
+    return args
 
-def main():
-    logging.info("Starting main program execution")
-    
-    # Parse command-line arguments
-    args = parse_arguments()
+def ask_action() -> str:
+    while True:
+        action = input("Do you want to Activate, Archive or Delete the products? (Activate/Archive/Delete/Skip): ").strip().lower()
+        logging.info(f"User selected action: {action}")
+        if action in ['activate', 'archive', 'delete', 'skip']:
+            return action
+        logging.warning(f"Invalid action entered: {action}")
+        print("Invalid input. Please enter 'Activate', 'Archive', 'Delete', or 'Skip'.")
+
+def run(args, action=None, service_factory=None, webhook_url=None):
+    # The whole pipeline for parsed arguments. benchmark.py calls this directly
+    # with a fixed action, a local Drive service and a local webhook.
+    metrics.reset()
+    webhook_url = webhook_url or args.webhook_url
 
     # Values from the command line arguments
     source_folder = args.source_folder
@@ -34,12 +76,14 @@ def main():
     year = args.year
     quarter = args.quarter
     markets_to_process = args.markets_to_process
+    workers = args.workers
 
     logging.info(f"Using source folder: {source_folder}")
-    logging.info(f"Using store URL: {store_url}")
+    logging.info(f"Using {'stores from ' + args.stores if args.stores else 'store URL: ' + store_url}")
     logging.info(f"Using Google credentials path: {credentials_path}")
     logging.info(f"Processing year: {year}, Quarter: {quarter}")
     logging.info(f"Markets to process: {'all' if markets_to_process is None else markets_to_process}")
+    logging.info(f"Workers: {workers}")
 
     # Read the config file (if required for additional settings)
     config_path = os.path.join(source_folder, 'config.json')
@@ -51,39 +95,94 @@ def main():
     else:
         logging.warning(f"Config file not found at {config_path}. Proceeding without it.")
 
-    # Process PDFs and create products
-    process_pdfs(source_folder, store_url, access_token, config, year, quarter, markets_to_process)
-    
-    # Process uploaded files and update with Google Drive links
-    csv_file_path = os.path.join(source_folder, 'product_pdf_data.csv')
-    if os.path.exists(csv_file_path):
-        print("\nUploading files to Google Drive...")
-        process_uploaded_files(csv_file_path, store_url, access_token, credentials_path)
+    # Size the keep-alive connection pools to the number of concurrent workers;
+    # create, image and metafield stages each talk to Shopify at the same time
+    configure_pool(workers * 3)
+
+    # Identical PDFs and images reuse what earlier markets and quarters already uploaded
+    asset_cache = open_asset_cache(args.asset_cache) if args.asset_cache else None
+
+    if args.stores:
+        # Every store keeps its own ledger and journal
+        run_stores(args, read_stores(args.stores), config, asset_cache, service_factory, webhook_url, ask_action, action or args.action)
+    elif args.dry_run:
+        # In-memory copies of the ledger and journal: the dry run leaves them as they are
+        with open_ledger(source_folder, read_only=True) as ledger, open_journal(source_folder, read_only=True) as journal:
+            # The asset cache ties store products found by title to this folder's PDFs
+            drive_link = make_uploader(args, asset_cache, service_factory).cached_link if asset_cache is not None else None
+            planner.dry_run(source_folder, store_url, access_token, ledger, journal, markets_to_process, drive_link)
     else:
-        logging.error("CSV file not found!")
-    
-    # Send CSV to the webhook
-    send_csv_to_webhook(csv_file_path, "https://hook.eu1.make.com/wdcdvyyfqli6rwhgj51jnu2d2yqrxpeg")
-    
-    # Handle final action (Activate/Delete/Skip)
-    while True:
-        action = input("Do you want to Activate or Delete the products? (Activate/Delete/Skip): ").strip().lower()
-        logging.info(f"User selected action: {action}")
-        
-        if action in ['activate', 'delete', 'skip']:
-            if action == 'activate':
-                activate_products(store_url, access_token, csv_file_path)
-            elif action == 'delete':
-                delete_products(store_url, access_token)
-            else:
-                logging.info("Skipping product activation/deletion")
-            break
+        # Product IDs, PDF paths and Drive URLs are tracked in the ledger for the whole run
+        ledger = open_ledger(source_folder)
+        # Stages completed per PDF, so a rerun after a crash resumes instead of duplicating products
+        journal = open_journal(source_folder)
+
+        csv_file_path = os.path.join(source_folder, CSV_FILENAME)
+        if args.watch:
+            run_watch(args, config, ledger, journal, asset_cache, csv_file_path, service_factory, webhook_url)
         else:
-            logging.warning(f"Invalid action entered: {action}")
-            print("Invalid input. Please enter 'Activate', 'Delete', or 'Skip'.")
+            run_batch(args, config, ledger, journal, asset_cache, csv_file_path, action or args.action, service_factory, webhook_url)
+        journal.close()
+
+    if asset_cache is not None:
+        asset_cache.close()
+    close_sessions()
 
+    # Per-stage timing and HTTP latency report for the run
+    metrics.log_summary()
+    metrics.write_report(os.path.join(source_folder, 'run_metrics.json'), os.path.join(source_folder, 'run_metrics.prom'))
     logging.info("Program execution completed")
 
+def run_watch(args, config, ledger, journal, asset_cache, csv_file_path, service_factory, webhook_url):
+    # Unattended service mode: each new PDF goes all the way to a linked (and
+    # optionally activated) product, and the changes are
+    # sent to the webhook after each burst.
+    def publish():
+        publish_ledger(ledger, csv_file_path, webhook_url, args.webhook_format, args.webhook_chunk_rows)
+
+    uploader = make_uploader(args, asset_cache, service_factory)
+    with open_manifest(args.source_folder) as manifest:
+        watcher = PdfWatcher(args.source_folder, args.store_url, args.access_token, config, ledger, journal, manifest, uploader,
+                             args.action or 'skip', args.workers, args.queue_size, args.poll_interval, asset_cache, publish)
+        watch_folder(watcher)
+    ledger.close()
+
+def run_batch(args, config, ledger, journal, asset_cache, csv_file_path, action, service_factory, webhook_url):
+    source_folder = args.source_folder
+    store_url = args.store_url
+    access_token = args.access_token
+    workers = args.workers
+
+    # Create products, attach images, upload to Google Drive and link the
+    # metafield as one pipeline, each PDF moving on as soon as a stage is done
+    # Existing store products, so reruns and products made elsewhere are not created twice
+    store_products = None if args.no_plan else planner.fetch_store_index(store_url, access_token)
+    uploader = make_uploader(args, asset_cache, service_factory)
+    run_product_pipeline(source_folder, store_url, access_token, config, ledger, journal, uploader, workers, args.markets_to_process, args.bulk, asset_cache,
+                         store_products)
+
+    # Picks up products from earlier runs that were never linked
+    if len(ledger):
+        process_uploaded_files(ledger, store_url, access_token, journal, uploader)
+    else:
+        logging.error("No products recorded in the ledger!")
+
+    # Export the ledger to CSV and send what changed to the webhook
+    publish_ledger(ledger, csv_file_path, webhook_url, args.webhook_format, args.webhook_chunk_rows)
+    ledger.close()
+    
+    # Handle final action (Activate/Archive/Delete/Skip)
+    if action is None:
+        action = ask_action()
+    apply_final_action(action, source_folder, store_url, access_token, csv_file_path, journal, workers)
+
+def main():
+    logging.info("Starting main program execution")
+    
+    # Parse command-line arguments
+    args = parse_arguments()
+    run(args)
+
 if __name__ == "__main__":
     logging.info("="*50)
     logging.info("Starting new program execution")
@@ -0,0 +1,131 @@
+import time
+import logging
+import threading
+from typing import Optional
+from shopify_client import get_client
+from shopify_bulk import gid_to_id
+
+# Collects pending metafield writes and sends them through the GraphQL
+# metafieldsSet mutation, up to METAFIELDS_SET_LIMIT per call, instead of one
+# product PUT per metafield. Entries are (product_id, namespace, key, value,
+# type); the metafield is set on the product's first variant, whose ID is
+# looked up for the whole batch with a single nodes query.
+
+METAFIELDS_SET_LIMIT = 25
+DOWNLOAD_NAMESPACE = 'custom'
+DOWNLOAD_KEY = 'digital_download'
+DEFAULT_TYPE = 'single_line_text_field'
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 1.0
+
+METAFIELDS_SET_MUTATION = """
+mutation metafieldsSet($metafields: [MetafieldsSetInput!]!) {
+  metafieldsSet(metafields: $metafields) {
+    metafields { id namespace key }
+    userErrors { field message code elementIndex }
+  }
+}
+"""
+
+FIRST_VARIANTS_QUERY = """
+query firstVariants($ids: [ID!]!) {
+  nodes(ids: $ids) { ... on Product { id variants(first: 1) { nodes { id } } } }
+}
+"""
+
+class MetafieldWriter:
+    def __init__(self, store_url: str, access_token: str, batch_size: int = METAFIELDS_SET_LIMIT, max_attempts: int = MAX_ATTEMPTS):
+        self.client = get_client(store_url, access_token)
+        self.batch_size = max(1, min(batch_size, METAFIELDS_SET_LIMIT))
+        self.max_attempts = max_attempts
+        self.written = 0
+        self.failed = 0
+        self._pending = []
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    def add(self, product_id: int, namespace: str, key: str, value: str, value_type: str = DEFAULT_TYPE):
+        with self._lock:
+            self._pending.append((product_id, namespace, key, value, value_type))
+
+    def add_variants(self, variants: dict):
+        # product ID -> variant GID already known (e.g. from the planner), saving the lookup
+        with self._lock:
+            self._variants.update(variants)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> list:
+        # Writes everything added so far and returns the entries Shopify confirmed
+        with self._lock:
+            pending, self._pending = self._pending, []
+        confirmed = []
+        for start in range(0, len(pending), self.batch_size):
+            confirmed += self._write(pending[start:start + self.batch_size])
+        with self._lock:
+            self.written += len(confirmed)
+            self.failed += len(pending) - len(confirmed)
+        return confirmed
+
+    def _variant_ids(self, product_ids: list) -> dict:
+        missing = sorted({product_id for product_id in product_ids if product_id not in self._variants})
+        if missing:
+            data = self.client.graphql(FIRST_VARIANTS_QUERY, {"ids": [f"gid://shopify/Product/{product_id}" for product_id in missing]})
+            for node in data["nodes"]:
+                variants = (node or {}).get("variants", {}).get("nodes") or []
+                if node and variants:
+                    self._variants[gid_to_id(node["id"])] = variants[0]["id"]
+        return {product_id: self._variants.get(product_id) for product_id in product_ids}
+
+    def _write(self, batch: list) -> list:
+        # metafieldsSet saves all of a call or none of it. Entries Shopify
+        # rejects (userErrors carry their elementIndex) are dropped and the
+        # rest are sent again; request failures retry the whole batch.
+        remaining = batch
+        attempt = 0
+        while remaining and attempt < self.max_attempts:
+            try:
+                owners = self._variant_ids([entry[0] for entry in remaining])
+                for entry in remaining:
+                    if not owners[entry[0]]:
+                        logging.error(f"No variant found for product {entry[0]}, cannot set {entry[1]}.{entry[2]}")
+                remaining = [entry for entry in remaining if owners[entry[0]]]
+                if not remaining:
+                    break
+                inputs = [{"ownerId": owners[product_id], "namespace": namespace, "key": key, "value": value, "type": value_type}
+                          for product_id, namespace, key, value, value_type in remaining]
+                data = self.client.graphql(METAFIELDS_SET_MUTATION, {"metafields": inputs})["metafieldsSet"]
+            except Exception as e:
+                attempt += 1
+                logging.warning(f"metafieldsSet failed for {len(remaining)} metafields (attempt {attempt}/{self.max_attempts}): {e}")
+                time.sleep(RETRY_DELAY * attempt)
+                continue
+
+            errors = data.get("userErrors") or []
+            if not errors:
+                logging.info(f"Set {len(remaining)} metafields")
+                return remaining
+            for error in errors:
+                index = error.get("elementIndex")
+                product = f"product {remaining[index][0]}" if index is not None and index < len(remaining) else "batch"
+                logging.error(f"metafieldsSet rejected {product}: {error.get('code')} {error.get('message')}")
+            rejected = {error["elementIndex"] for error in errors if error.get("elementIndex") is not None}
+            if rejected:
+                # Sending the others again does not use up an attempt
+                remaining = [entry for index, entry in enumerate(remaining) if index not in rejected]
+            else:
+                attempt += 1
+                time.sleep(RETRY_DELAY * attempt)
+        if remaining:
+            logging.error(f"Giving up on {len(remaining)} metafields after {self.max_attempts} attempts")
+        return []
+
+def set_download_links(store_url: str, access_token: str, links: dict, writer: Optional[MetafieldWriter] = None) -> set:
+    # links maps product ID -> Drive URL; returns the product IDs whose
+    # custom.digital_download metafield was confirmed
+    writer = writer or MetafieldWriter(store_url, access_token)
+    for product_id, file_url in links.items():
+        writer.add(product_id, DOWNLOAD_NAMESPACE, DOWNLOAD_KEY, file_url)
+    return {entry[0] for entry in writer.flush()}
@@ -0,0 +1,136 @@
+import re
+import json
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+# Per-stage timings, HTTP latencies and retry counts for a run, summarised as
+# JSON and Prometheus text at the end so slow stages are visible.
+
+STAGES = ['discovery', 'planning', 'title_cleaning', 'create', 'image_attach', 'drive_upload', 'metafield_update', 'csv_write']
+HTTP_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+QUANTILES = [0.5, 0.95, 0.99]
+ID_RE = re.compile(r'\b[0-9]+\b')
+
+def percentile(sorted_values: list, quantile: float) -> float:
+    # Nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(quantile * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def endpoint_name(method: str, path: str) -> str:
+    # products/123/images.json -> POST products/:id/images.json
+    return f"{method} {ID_RE.sub(':id', path.split('?', 1)[0])}"
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.stages = {}
+            self.http = {}
+            self.retries = {}
+            self.errors = {}
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe_http(self, endpoint: str, status, seconds: float):
+        with self._lock:
+            self.http.setdefault(endpoint, []).append(seconds)
+            if not isinstance(status, int) or status >= 400:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def count_retry(self, endpoint: str):
+        with self._lock:
+            self.retries[endpoint] = self.retries.get(endpoint, 0) + 1
+
+    @staticmethod
+    def _describe(samples: list) -> dict:
+        ordered = sorted(samples)
+        described = {'count': len(ordered), 'total': round(sum(ordered), 6)}
+        for quantile in QUANTILES:
+            described[f"p{int(quantile * 100)}"] = round(percentile(ordered, quantile), 6)
+        described['max'] = round(ordered[-1], 6) if ordered else 0.0
+        return described
+
+    def summary(self) -> dict:
+        with self._lock:
+            stages = {stage: list(samples) for stage, samples in self.stages.items()}
+            http = {endpoint: list(samples) for endpoint, samples in self.http.items()}
+            retries = dict(self.retries)
+            errors = dict(self.errors)
+            started = self.started
+        ordered_stages = [stage for stage in STAGES if stage in stages] + sorted(set(stages) - set(STAGES))
+        return {
+            'wall_time': round(time.time() - started, 3),
+            'stages': {stage: self._describe(stages[stage]) for stage in ordered_stages},
+            'http': {
+                endpoint: dict(self._describe(samples), retries=retries.get(endpoint, 0), errors=errors.get(endpoint, 0))
+                for endpoint, samples in sorted(http.items())
+            },
+        }
+
+    def prometheus(self) -> str:
+        summary = self.summary()
+        with self._lock:
+            http = {endpoint: list(samples) for endpoint, samples in self.http.items()}
+        lines = [
+            '# HELP pipeline_run_seconds Wall time of the run so far.',
+            '# TYPE pipeline_run_seconds gauge',
+            f"pipeline_run_seconds {summary['wall_time']}",
+            '# HELP pipeline_stage_seconds Time spent per product in each pipeline stage.',
+            '# TYPE pipeline_stage_seconds summary',
+        ]
+        for stage, described in summary['stages'].items():
+            for quantile in QUANTILES:
+                lines.append(f'pipeline_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {described[f"p{int(quantile * 100)}"]}')
+            lines.append(f'pipeline_stage_seconds_sum{{stage="{stage}"}} {described["total"]}')
+            lines.append(f'pipeline_stage_seconds_count{{stage="{stage}"}} {described["count"]}')
+
+        lines += ['# HELP http_request_seconds Latency of HTTP calls per endpoint.', '# TYPE http_request_seconds histogram']
+        for endpoint, samples in sorted(http.items()):
+            label = endpoint.replace('"', '\\"')
+            for bucket in HTTP_BUCKETS:
+                lines.append(f'http_request_seconds_bucket{{endpoint="{label}",le="{bucket}"}} {sum(1 for s in samples if s <= bucket)}')
+            lines.append(f'http_request_seconds_bucket{{endpoint="{label}",le="+Inf"}} {len(samples)}')
+            lines.append(f'http_request_seconds_sum{{endpoint="{label}"}} {round(sum(samples), 6)}')
+            lines.append(f'http_request_seconds_count{{endpoint="{label}"}} {len(samples)}')
+
+        lines += ['# HELP http_retries_total Retried HTTP calls per endpoint.', '# TYPE http_retries_total counter']
+        for endpoint, described in summary['http'].items():
+            label = endpoint.replace('"', '\\"')
+            lines.append(f'http_retries_total{{endpoint="{label}"}} {described["retries"]}')
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, json_path: str, prometheus_path: str):
+        with open(json_path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        with open(prometheus_path, 'w') as f:
+            f.write(self.prometheus())
+        logging.info(f"Wrote run metrics to {json_path} and {prometheus_path}")
+
+    def log_summary(self):
+        summary = self.summary()
+        logging.info(f"Run finished in {summary['wall_time']}s")
+        for stage, described in summary['stages'].items():
+            logging.info(f"  {stage}: n={described['count']} total={described['total']:.2f}s p50={described['p50']:.3f}s p95={described['p95']:.3f}s p99={described['p99']:.3f}s")
+        for endpoint, described in summary['http'].items():
+            logging.info(f"  {endpoint}: n={described['count']} p50={described['p50']:.3f}s p95={described['p95']:.3f}s p99={described['p99']:.3f}s retries={described['retries']} errors={described['errors']}")
+
+metrics = Metrics()
@@ -0,0 +1,126 @@
+import os
+import re
+import json
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from discovery import open_manifest, discover_pdfs
+from image_index import ImageIndex
+from ledger import open_ledger, CSV_FILENAME
+from journal import open_journal, UPLOADED
+from file_operations import store_filename
+from webhook import publish_ledger
+from shopify import process_pdfs, apply_final_action
+from google_drive import process_uploaded_files, make_uploader, DriveUploader
+from asset_cache import AssetCache
+from metrics import metrics
+
+# Publishes one PDF batch to several Shopify stores. Discovery, hashing, the
+# image index and the Drive uploads happen once; product creation, images and
+# metafields then run for every store at the same time, each through its own
+# rate-limited client and with its own ledger, journal and CSV
+# (product_ledger-<name>.db, run_journal-<name>.db, product_pdf_data-<name>.csv).
+#
+# stores.json:
+#   [{"name": "us", "store_url": "...", "access_token": "..."},
+#    {"name": "eu", "store_url": "...", "access_token": "...", "config": {"Price": "9.00"}}]
+# "config" entries override config.json for that store.
+
+STORE_NAME_RE = re.compile(r'^[A-Za-z0-9_.]+$')
+
+def read_stores(stores_path: str) -> list:
+    with open(stores_path) as f:
+        stores = json.load(f)
+    names = set()
+    for store in stores:
+        missing = [key for key in ('name', 'store_url', 'access_token') if not store.get(key)]
+        if missing:
+            raise ValueError(f"Store {store.get('name', '?')} in {stores_path} is missing {', '.join(missing)}")
+        if not STORE_NAME_RE.match(store['name']):
+            raise ValueError(f"Store name {store['name']!r} may only contain letters, digits, '_' and '.'")
+        if store['name'] in names:
+            raise ValueError(f"Store name {store['name']!r} appears twice in {stores_path}")
+        names.add(store['name'])
+    logging.info(f"Publishing to {len(stores)} stores: {', '.join(sorted(names))}")
+    return stores
+
+def upload_shared(uploader: DriveUploader, discovered: list) -> dict:
+    # content hash -> webViewLink, one upload per distinct PDF for all stores
+    files = {}
+    for pdf_file, content_hash in discovered:
+        files.setdefault(content_hash, str(pdf_file))
+    return uploader.upload_all(files, {content_hash: content_hash for content_hash in files})
+
+def publish_store(store: dict, args, config: dict, discovered: list, image_index: ImageIndex, drive_links, asset_cache: Optional[AssetCache],
+                  uploader: DriveUploader, webhook_url: str) -> str:
+    name = store['name']
+    store_config = dict(config, **store.get('config', {}))
+    ledger = open_ledger(args.source_folder, name)
+    journal = open_journal(args.source_folder, name)
+    csv_file_path = os.path.join(args.source_folder, store_filename(CSV_FILENAME, name))
+    try:
+        process_pdfs(args.source_folder, store['store_url'], store['access_token'], store_config, args.year, args.quarter, args.markets_to_process,
+                     args.workers, ledger, journal, args.bulk, asset_cache, discovered, image_index)
+
+        # Products pick up the shared Drive link for their PDF; anything the
+        # shared upload missed is uploaded by process_uploaded_files as usual.
+        # The ledger gets the link once the store confirms the metafield.
+        try:
+            links = drive_links.result()
+        except Exception as e:
+            logging.error(f"[{name}] Shared Drive upload failed: {e}")
+            links = {}
+        shared = {}
+        for row in ledger.rows():
+            link = links.get(journal.content_hash(row['product_id']))
+            if not row['drive_url'] and link:
+                shared[row['product_id']] = link
+                journal.mark(row['product_id'], UPLOADED)
+        if len(ledger):
+            process_uploaded_files(ledger, store['store_url'], store['access_token'], journal, uploader, shared)
+        else:
+            logging.error(f"[{name}] No products recorded in the ledger!")
+
+        # Each store's ledger keeps its own webhook cursor
+        publish_ledger(ledger, csv_file_path, webhook_url, args.webhook_format, args.webhook_chunk_rows, name)
+        logging.info(f"[{name}] {len(ledger)} products recorded in {csv_file_path}")
+    finally:
+        ledger.close()
+        journal.close()
+    return csv_file_path
+
+def finish_store(store: dict, args, action: str, csv_file_path: str):
+    with open_journal(args.source_folder, store['name']) as journal:
+        apply_final_action(action, args.source_folder, store['store_url'], store['access_token'], csv_file_path, journal, args.workers, store['name'])
+
+def run_stores(args, stores: list, config: dict, asset_cache: Optional[AssetCache], service_factory: Optional[Callable], webhook_url: str,
+               ask_action: Callable, action: Optional[str] = None):
+    with metrics.timer('discovery'):
+        image_index = ImageIndex(sorted((Path(args.source_folder) / 'images').glob('*.jp*g')))
+    with open_manifest(args.source_folder) as manifest:
+        discovered = list(discover_pdfs(args.source_folder, manifest, args.markets_to_process or None))
+
+    uploader = make_uploader(args, asset_cache, service_factory)
+    # Drive uploads run alongside product creation in every store
+    with ThreadPoolExecutor(max_workers=1) as drive_executor, ThreadPoolExecutor(max_workers=len(stores)) as store_executor:
+        drive_links = drive_executor.submit(upload_shared, uploader, discovered)
+        futures = {store['name']: store_executor.submit(publish_store, store, args, config, discovered, image_index, drive_links,
+                                                        asset_cache, uploader, webhook_url) for store in stores}
+        csv_files = {}
+        for name, future in futures.items():
+            try:
+                csv_files[name] = future.result()
+            except Exception as e:
+                logging.error(f"[{name}] Publishing failed: {e}")
+
+    if action is None:
+        action = ask_action()
+    with ThreadPoolExecutor(max_workers=len(stores)) as executor:
+        futures = {store['name']: executor.submit(finish_store, store, args, action, csv_files[store['name']])
+                   for store in stores if store['name'] in csv_files}
+        for name, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"[{name}] {action.capitalize()} failed: {e}")
@@ -0,0 +1,226 @@
+import os
+import csv
+import logging
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+from discovery import open_manifest, discover_pdfs
+from file_operations import pdf_title
+from image_index import ImageIndex, clean_string
+from journal import RunJournal, IMAGE_ATTACHED, UPLOADED, METAFIELD_SET, DELETED
+from ledger import ProductLedger
+from metafields import DOWNLOAD_NAMESPACE, DOWNLOAD_KEY
+from shopify_bulk import gid_to_id
+from shopify_client import get_client
+from metrics import metrics
+
+# Compares the source folder with what the store already has before anything
+# is written. The store's products are read once (paginated GraphQL, 250 per
+# page) into an in-memory index, and every discovered PDF is classified:
+#   create   - no matching product; the executor creates it
+#   update   - a matching product exists but is missing its image or download
+#              link, or the PDF behind it changed; the executor finishes it
+#              without creating a new product
+#   skip     - already in the store and linked; costs no API calls
+#   orphaned - in the ledger but no longer matched by a PDF (or gone from the
+#              store); reported only, never deleted
+# A PDF matches the product the journal recorded for it, else a non-archived
+# product with the same title - but only if that product has no download link
+# yet, or its link is the Drive file of this very PDF (journal or asset cache).
+# Titles carry no year or quarter, so a linked product whose link cannot be
+# tied to the PDF's content is another PDF's product and a new one is created.
+# The plan is written to run_plan.csv.
+
+PLAN_FILENAME = 'run_plan.csv'
+PLAN_FIELDNAMES = ['Action', 'PDF Path', 'Title', 'Product ID', 'Reason']
+PAGE_SIZE = 250
+
+CREATE = 'create'
+UPDATE = 'update'
+SKIP = 'skip'
+ORPHANED = 'orphaned'
+
+STORE_PRODUCTS_QUERY = """
+query storeProducts($first: Int!, $after: String) {
+  products(first: $first, after: $after) {
+    pageInfo { hasNextPage endCursor }
+    nodes {
+      id title handle status
+      featuredImage { url }
+      variants(first: 1) { nodes { id metafield(namespace: "%s", key: "%s") { value } } }
+    }
+  }
+}
+""" % (DOWNLOAD_NAMESPACE, DOWNLOAD_KEY)
+
+def title_key(title: str) -> str:
+    return ' '.join(title.split()).casefold()
+
+def fetch_store_index(store_url: str, access_token: str, page_size: int = PAGE_SIZE) -> dict:
+    # product ID -> {title, handle, status, variant_id, download_url, has_image}
+    client = get_client(store_url, access_token)
+    products = {}
+    cursor = None
+    pages = 0
+    with metrics.timer('planning'):
+        while True:
+            data = client.graphql(STORE_PRODUCTS_QUERY, {"first": page_size, "after": cursor})["products"]
+            pages += 1
+            for node in data["nodes"]:
+                variants = node.get("variants", {}).get("nodes") or []
+                variant = variants[0] if variants else {}
+                products[gid_to_id(node["id"])] = {
+                    'title': node["title"],
+                    'handle': node.get("handle"),
+                    'status': (node.get("status") or '').lower(),
+                    'variant_id': variant.get("id"),
+                    'download_url': (variant.get("metafield") or {}).get("value"),
+                    'has_image': bool(node.get("featuredImage")),
+                }
+            if not data["pageInfo"]["hasNextPage"]:
+                break
+            cursor = data["pageInfo"]["endCursor"]
+    logging.info(f"Indexed {len(products)} existing store products in {pages} page(s)")
+    return products
+
+class Planner:
+    def __init__(self, store_products: dict, journal: RunJournal, ledger: ProductLedger, image_index: Optional[ImageIndex] = None,
+                 drive_link: Optional[Callable] = None):
+        # drive_link maps a content hash to the Drive URL already uploaded for
+        # that content (DriveUploader.cached_link), or None
+        self.store_products = store_products
+        self.journal = journal
+        self.ledger = ledger
+        self.image_index = image_index
+        self.drive_link = drive_link
+        self.entries = []
+        self._claimed = set()
+        self._by_title = {}
+        for product_id in sorted(store_products):
+            product = store_products[product_id]
+            # Archived products are never reused
+            if product['status'] != 'archived':
+                self._by_title.setdefault(title_key(product['title']), []).append(product_id)
+
+    def variant_ids(self) -> dict:
+        return {product_id: product['variant_id'] for product_id, product in self.store_products.items() if product['variant_id']}
+
+    def _match_title(self, title: str) -> Optional[int]:
+        candidates = [product_id for product_id in self._by_title.get(title_key(title), []) if product_id not in self._claimed]
+        if len(candidates) > 1:
+            logging.warning(f"{len(candidates)} store products are titled {title!r}; using the oldest, {candidates[0]}")
+        return candidates[0] if candidates else None
+
+    def _links_content(self, product_id: int, content_hash: str) -> bool:
+        download_url = self.store_products[product_id]['download_url']
+        if self.journal.content_hash(product_id) == content_hash:
+            return True
+        return self.drive_link is not None and self.drive_link(content_hash) == download_url
+
+    def _needs_image(self, product_id: int, title: str) -> bool:
+        if self.store_products[product_id]['has_image'] or self.journal.completed(product_id, IMAGE_ATTACHED):
+            return False
+        return self.image_index is not None and self.image_index.find(clean_string(title)) is not None
+
+    def classify(self, pdf_file: Path, content_hash: str) -> dict:
+        path = str(pdf_file)
+        title = pdf_title(pdf_file)
+        entry = {'action': CREATE, 'pdf_file': pdf_file, 'content_hash': content_hash, 'title': title, 'product_id': None, 'reason': 'new PDF'}
+
+        product_id = self.journal.product_for(path, content_hash)
+        if product_id and product_id not in self.store_products:
+            entry.update(reason=f"product {product_id} no longer exists in the store", gone=product_id)
+            product_id = None
+        if not product_id:
+            previous = self.journal.latest_product_for_path(path)
+            if previous in self.store_products and previous not in self._claimed:
+                entry.update(action=UPDATE, product_id=previous, reason='PDF content changed', changed=True)
+            else:
+                product_id = self._match_title(title)
+                if product_id and self.store_products[product_id]['download_url'] and not self._links_content(product_id, content_hash):
+                    entry.update(reason=f"product {product_id} has the same title but links another PDF")
+                    product_id = None
+                if product_id:
+                    entry['adopted'] = True
+
+        if product_id:
+            product = self.store_products[product_id]
+            entry['product_id'] = product_id
+            linked = bool(product['download_url']) and (entry.get('adopted') or self.journal.completed(product_id, METAFIELD_SET))
+            entry['linked'] = linked
+            if linked and not self._needs_image(product_id, title):
+                entry.update(action=SKIP, reason='already in the store' if entry.get('adopted') else 'unchanged')
+            else:
+                entry.update(action=UPDATE, reason='missing image' if linked else 'missing download link')
+        if entry['product_id']:
+            self._claimed.add(entry['product_id'])
+        self.entries.append(entry)
+        return entry
+
+    def apply(self, entry: dict):
+        # Brings the journal and ledger in line with the store, so the executor
+        # neither recreates nor re-links what is already there
+        product_id, path = entry['product_id'], str(entry['pdf_file'])
+        if entry.get('gone'):
+            self.journal.set_lifecycle(entry['gone'], DELETED)
+        if not product_id:
+            return
+        product = self.store_products[product_id]
+        if entry.get('changed'):
+            self.journal.reset(product_id, (UPLOADED, METAFIELD_SET))
+            self.ledger.clear_drive_url(product_id)
+        if self.journal.product_for(path, entry['content_hash']) != product_id:
+            self.journal.record_created(path, entry['content_hash'], product_id)
+        if product['has_image']:
+            self.journal.mark(product_id, IMAGE_ATTACHED)
+        if entry.get('linked'):
+            # Only the image (if anything) is left to do
+            self.ledger.upsert(product_id, pdf_path=path, drive_url=product['download_url'])
+            self.journal.mark(product_id, UPLOADED)
+            self.journal.mark(product_id, METAFIELD_SET)
+
+    def execute(self, discovered: Iterable, dry_run: bool = False) -> Iterator[tuple]:
+        # Classifies PDFs as they are discovered and passes on only those with work to do
+        for pdf_file, content_hash in discovered:
+            with metrics.timer('planning'):
+                entry = self.classify(pdf_file, content_hash)
+                if not dry_run:
+                    self.apply(entry)
+            if entry['action'] in (CREATE, UPDATE):
+                yield pdf_file, content_hash
+
+    def orphaned(self) -> list:
+        entries = []
+        for row in self.ledger.rows():
+            if row['product_id'] in self._claimed:
+                continue
+            present = row['product_id'] in self.store_products
+            entries.append({'action': ORPHANED, 'pdf_file': row['pdf_path'] or '', 'title': self.store_products[row['product_id']]['title'] if present else '',
+                            'product_id': row['product_id'], 'reason': 'no PDF in the source folder' if present else 'no longer in the store'})
+        return entries
+
+    def write(self, plan_path: str, limited: bool = False) -> dict:
+        # Orphans are only meaningful when the whole folder was planned
+        entries = self.entries + ([] if limited else self.orphaned())
+        tmp_path = f"{plan_path}.tmp"
+        with open(tmp_path, 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=PLAN_FIELDNAMES)
+            writer.writeheader()
+            for entry in entries:
+                writer.writerow({'Action': entry['action'], 'PDF Path': str(entry['pdf_file']), 'Title': entry['title'],
+                                 'Product ID': entry['product_id'] or '', 'Reason': entry['reason']})
+        os.replace(tmp_path, plan_path)
+        counts = {action: sum(1 for entry in entries if entry['action'] == action) for action in (CREATE, UPDATE, SKIP, ORPHANED)}
+        logging.info(f"Plan: {counts[CREATE]} to create, {counts[UPDATE]} to update, {counts[SKIP]} unchanged, "
+                     f"{counts[ORPHANED]} orphaned - written to {plan_path}")
+        return counts
+
+def dry_run(source_folder: str, store_url: str, access_token: str, ledger: ProductLedger, journal: RunJournal,
+            markets_to_process: Optional[int] = None, drive_link: Optional[Callable] = None) -> dict:
+    # Plans the run without changing the store, the journal, the ledger or the
+    # manifest (ledger and journal are expected to be opened read_only)
+    image_index = ImageIndex(sorted((Path(source_folder) / 'images').glob('*.jp*g')))
+    planner = Planner(fetch_store_index(store_url, access_token), journal, ledger, image_index, drive_link)
+    with open_manifest(source_folder, read_only=True) as manifest:
+        for _ in planner.execute(discover_pdfs(source_folder, manifest, markets_to_process or None), dry_run=True):
+            pass
+    return planner.write(os.path.join(source_folder, PLAN_FILENAME), limited=bool(markets_to_process))
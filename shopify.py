@@ -1,20 +1,29 @@
-import json
-import requests
+import os
 import logging
+import requests
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
-from file_operations import generate_csv_header, insert_data_to_csv, update_csv_with_drive_url
-from google_drive import upload_to_drive
+from ledger import ProductLedger, open_ledger
+from journal import RunJournal, open_journal, IMAGE_ATTACHED
+from file_operations import file_sha256, pdf_title
+from image_index import ImageIndex, clean_string
+from image_upload import Base64ImageBody, prepare_image, DEFAULT_QUALITY
+from shopify_client import get_client
+from shopify_bulk import create_discovered_bulk
+from metafields import set_download_links
+from lifecycle import run_lifecycle, read_product_ids, summary_path_for
+from metrics import metrics
+from discovery import open_manifest, discover_pdfs
+from asset_cache import AssetCache, SHOPIFY_IMAGE
 
 def create_product(store_url: str, product_data: dict, access_token: str):
     logging.info(f"Attempting to create product: {product_data['product']['title']}")
-    shopify_url = f"https://{store_url}/admin/api/2024-01/products.json"
-    headers = {
-        "X-Shopify-Access-Token": access_token,
-        "Content-Type": "application/json"
-    }
+    client = get_client(store_url, access_token)
 
     try:
-        response = requests.post(shopify_url, json=product_data, headers=headers)
+        response = client.post("products.json", json=product_data)
         if response.status_code == 201:
             product_title = product_data['product']['title']
             product_id = response.json()['product']['id']
@@ -27,70 +36,198 @@ def create_product(store_url: str, product_data: dict, access_token: str):
         logging.error(f"Network error while creating product: {e}")
         raise
 
-def process_pdfs(source_folder: str, store_url: str, access_token: str, config: dict, year: str, quarter: str, markets_to_process: Optional[int] = None):
-    logging.info(f"Starting PDF processing in folder: {source_folder}")
-    pdf_files = [f for f in Path(source_folder).rglob('*.pdf')]
-    if markets_to_process:
-        pdf_files = pdf_files[:markets_to_process]
+def attach_image_to_product(store_url: str, product_id: int, image_path: str, access_token: str, filename: Optional[str] = None, asset_cache: Optional[AssetCache] = None):
+    logging.info(f"Attempting to attach image to product {product_id}")
+    client = get_client(store_url, access_token)
 
-    image_folder = Path(source_folder) / 'images'
-    image_files = list(image_folder.glob('*.jp*g'))
-    
-    csv_file_path = os.path.join(source_folder, 'product_pdf_data.csv')
-    generate_csv_header(csv_file_path)
-
-    for pdf_file in pdf_files:
-        title = pdf_file.stem.split('-', 2)[-1].strip()
-        cleaned_title = clean_string(title)
-        
-        product_data = {
-            "product": {
-                "title": title,
-                "body_html": config["Description"],
-                "vendor": "Your Vendor",
-                "product_type": "Digital Product",
-                "status": "draft",
-                "price": config["Price"],
-                "compare_at_price": config["CompareToPrice"],
-                "collections": config["Collections"],
-                "search_engine_description": config["SearchEngineDescription"]
-            }
+    try:
+        # An identical image already on the store is attached by its CDN URL
+        # instead of uploading the bytes again. If Shopify can no longer fetch
+        # it, the entry is dropped and the image is uploaded as usual.
+        content_hash = None
+        if asset_cache is not None:
+            content_hash = file_sha256(image_path)
+            cached = asset_cache.get(SHOPIFY_IMAGE, store_url, content_hash)
+            if cached:
+                image_data = {"image": {"src": cached['url'], "filename": filename or os.path.basename(image_path)}}
+                response = client.post(f"products/{product_id}/images.json", json=image_data)
+                if response.status_code == 201:
+                    if cached['stale']:
+                        asset_cache.validated(SHOPIFY_IMAGE, store_url, content_hash)
+                    logging.info(f"Attached cached image {cached['url']} to product {product_id}")
+                    return response.json()['image']
+                logging.warning(f"Cached image for product {product_id} was rejected: {response.status_code}, uploading instead")
+                asset_cache.invalidate(SHOPIFY_IMAGE, store_url, content_hash)
+
+        response = client.post(f"products/{product_id}/images.json", data=Base64ImageBody(image_path, filename))
+        if response.status_code == 201:
+            logging.info(f"Successfully uploaded image for product {product_id}")
+            image = response.json()['image']
+            if asset_cache is not None and image.get('src'):
+                asset_cache.put(SHOPIFY_IMAGE, store_url, content_hash, image['src'], str(image['id']), os.path.getsize(image_path))
+            return image
+        else:
+            logging.error(f"Failed to upload image for product {product_id}")
+            raise Exception(f"Failed to upload image: {response.status_code} {response.text}")
+    except Exception as e:
+        logging.error(f"Error during image upload for product {product_id}: {e}")
+        raise
+
+def update_product_with_file(store_url: str, product_id: int, file_url: str, access_token: str):
+    # Single-product form of metafields.set_download_links, for callers that link one product at a time
+    logging.info(f"Updating product {product_id} with file URL")
+    if product_id not in set_download_links(store_url, access_token, {product_id: file_url}):
+        raise Exception(f"Failed to set the download link on product {product_id}")
+    logging.info(f"Successfully updated product {product_id} with file URL")
+
+def build_product_data(title: str, config: dict) -> dict:
+    return {
+        "product": {
+            "title": title,
+            "body_html": config["Description"],
+            "vendor": "Your Vendor",
+            "product_type": "Digital Product",
+            "status": "draft",
+            "price": config["Price"],
+            "compare_at_price": config["CompareToPrice"],
+            "collections": config["Collections"],
+            "search_engine_description": config["SearchEngineDescription"]
         }
+    }
 
-        try:
-            product_response = create_product(store_url, product_data, access_token)
-            product_id = product_response.get('product', {}).get('id')
+def create_pdf_product(pdf_file: Path, title: str, store_url: str, access_token: str, config: dict, journal: RunJournal, content_hash: Optional[str] = None) -> Optional[int]:
+    # Returns the product for a PDF, creating it unless the journal already has
+    # one. content_hash comes from the discovery manifest when known, saving a
+    # read of the PDF.
+    try:
+        if content_hash is None:
+            content_hash = file_sha256(pdf_file)
+        product_id = journal.product_for(str(pdf_file), content_hash)
+        if product_id:
+            logging.info(f"Skipping create for {pdf_file.name} - already created as product {product_id}")
+            return product_id
+        with metrics.timer('create'):
+            product_response = create_product(store_url, build_product_data(title, config), access_token)
+        product_id = product_response.get('product', {}).get('id')
+        if not product_id:
+            return None
+        journal.record_created(str(pdf_file), content_hash, product_id)
+        return product_id
+    except Exception as e:
+        logging.error(f"Error processing {pdf_file.name}: {e}")
+        return None
+
+def attach_pdf_image(pdf_file: Path, product_id: int, cleaned_title: str, store_url: str, access_token: str, config: dict, image_index: ImageIndex, journal: RunJournal, asset_cache: Optional[AssetCache] = None):
+    # A failed image attach is logged and leaves the product in place
+    if journal.completed(product_id, IMAGE_ATTACHED):
+        return
+    matching_image = image_index.find(cleaned_title)
+    if not matching_image:
+        return
+    try:
+        with metrics.timer('image_attach'):
+            upload_path = str(matching_image)
+            if config.get("ImageMaxDimension"):
+                upload_path = prepare_image(upload_path, int(config["ImageMaxDimension"]), int(config.get("ImageQuality", DEFAULT_QUALITY)))
+            attach_image_to_product(store_url, product_id, upload_path, access_token, matching_image.name, asset_cache)
+        journal.mark(product_id, IMAGE_ATTACHED)
+    except Exception as e:
+        logging.error(f"Error processing {pdf_file.name}: {e}")
+
+def clean_pdf_title(pdf_file: Path) -> tuple:
+    with metrics.timer('title_cleaning'):
+        title = pdf_title(pdf_file)
+        return title, clean_string(title)
+
+def process_pdf(pdf_file: Path, store_url: str, access_token: str, config: dict, image_index: ImageIndex, journal: RunJournal, content_hash: Optional[str] = None, asset_cache: Optional[AssetCache] = None) -> Optional[int]:
+    # Runs create -> attach-image for a single PDF. Errors are isolated per PDF:
+    # a failed create yields None, a failed image attach still keeps the product.
+    # Stages already recorded in the journal are skipped.
+    title, cleaned_title = clean_pdf_title(pdf_file)
+    product_id = create_pdf_product(pdf_file, title, store_url, access_token, config, journal, content_hash)
+    if product_id:
+        attach_pdf_image(pdf_file, product_id, cleaned_title, store_url, access_token, config, image_index, journal, asset_cache)
+    return product_id
+
+def process_pdfs(source_folder: str, store_url: str, access_token: str, config: dict, year: str, quarter: str, markets_to_process: Optional[int] = None, workers: int = 1, ledger: Optional[ProductLedger] = None, journal: Optional[RunJournal] = None, bulk: bool = False, asset_cache: Optional[AssetCache] = None,
+                 discovered: Optional[list] = None, image_index: Optional[ImageIndex] = None):
+    # discovered ((pdf_file, content_hash) pairs) and image_index can be passed
+    # in when several stores share one discovery pass.
+    logging.info(f"Starting PDF processing in folder: {source_folder} with {workers} worker(s)")
+    if image_index is None:
+        with metrics.timer('discovery'):
+            image_folder = Path(source_folder) / 'images'
+            image_index = ImageIndex(sorted(image_folder.glob('*.jp*g')))
+        logging.info(f"Indexed {len(image_index)} images in {image_folder}")
+    
+    owns_ledger = ledger is None
+    if owns_ledger:
+        ledger = open_ledger(source_folder)
+    owns_journal = journal is None
+    if owns_journal:
+        journal = open_journal(source_folder)
+
+    manifest = None
+    if discovered is None:
+        manifest = open_manifest(source_folder)
+        discovered = discover_pdfs(source_folder, manifest, markets_to_process or None)
+
+    # In bulk mode products are created up front by one bulk mutation; the
+    # per-PDF workers below then find them in the journal and only attach images.
+    if bulk:
+        discovered = create_discovered_bulk(discovered, store_url, access_token, config, journal)
 
-            if product_id:
-                insert_data_to_csv(csv_file_path, product_id, str(pdf_file))
+    def record(pdf_file, future):
+        product_id = future.result()
+        if product_id:
+            with metrics.timer('csv_write'):
+                ledger.upsert(product_id, pdf_path=str(pdf_file))
+            logging.info(f"Recorded product {product_id} for {pdf_file.name} in ledger")
 
-                matching_image = None
-                for image_path in image_files:
-                    cleaned_image_name = clean_string(image_path.stem)
-                    if cleaned_title in cleaned_image_name or cleaned_image_name in cleaned_title:
-                        matching_image = image_path
-                        break
+    # PDFs are submitted as discovery finds them. Results are consumed in
+    # submission order, so ledger rows follow discovery order regardless of
+    # which worker finishes first, and at most `window` PDFs are in flight.
+    window = max(1, workers) * 4
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for pdf_file, content_hash in discovered:
+            in_flight.append((pdf_file, executor.submit(process_pdf, pdf_file, store_url, access_token, config, image_index, journal, content_hash, asset_cache)))
+            if len(in_flight) >= window:
+                record(*in_flight.popleft())
+        while in_flight:
+            record(*in_flight.popleft())
+    if manifest:
+        manifest.close()
 
-                if matching_image:
-                    attach_image_to_product(store_url, product_id, str(matching_image), access_token)
-        except Exception as e:
-            logging.error(f"Error processing {pdf_file.name}: {e}")
-            continue
+    if owns_ledger:
+        ledger.close()
+    else:
+        ledger.commit()
+    if owns_journal:
+        journal.close()
 
-def activate_products(store_url: str, access_token: str, csv_file_path: str):
+def activate_products(store_url: str, access_token: str, csv_file_path: str, journal: Optional[RunJournal] = None, workers: int = 1, store_name: Optional[str] = None):
     logging.info("Activating products...")
-    df = pd.read_csv(csv_file_path)
-    for _, row in df.iterrows():
-        product_id = row['Product ID']
-        update_url = f"https://{store_url}/admin/api/2024-01/products/{product_id}.json"
-        headers = {"X-Shopify-Access-Token": access_token, "Content-Type": "application/json"}
-        update_data = {"product": {"id": product_id, "status": "active"}}
-
-        try:
-            response = requests.put(update_url, json=update_data, headers=headers)
-            if response.status_code == 200:
-                logging.info(f"Successfully activated product {product_id}")
-            else:
-                logging.error(f"Failed to activate product {product_id}")
-        except Exception as e:
-            logging.error(f"Error activating product {product_id}: {e}")
+    return run_lifecycle('activate', store_url, access_token, read_product_ids(csv_file_path), workers, journal, summary_path_for(csv_file_path, 'activate', store_name))
+
+def archive_products(store_url: str, access_token: str, csv_file_path: str, journal: Optional[RunJournal] = None, workers: int = 1, store_name: Optional[str] = None):
+    logging.info("Archiving products...")
+    return run_lifecycle('archive', store_url, access_token, read_product_ids(csv_file_path), workers, journal, summary_path_for(csv_file_path, 'archive', store_name))
+
+def delete_products(store_url: str, access_token: str, csv_file_path: str, journal: Optional[RunJournal] = None, workers: int = 1, store_name: Optional[str] = None):
+    logging.info("Deleting products...")
+    return run_lifecycle('delete', store_url, access_token, read_product_ids(csv_file_path), workers, journal, summary_path_for(csv_file_path, 'delete', store_name))
+
+def apply_final_action(action: str, source_folder: str, store_url: str, access_token: str, csv_file_path: str, journal: RunJournal, workers: int = 1, store_name: Optional[str] = None):
+    if action == 'activate':
+        activate_products(store_url, access_token, csv_file_path, journal, workers, store_name)
+    elif action == 'archive':
+        archive_products(store_url, access_token, csv_file_path, journal, workers, store_name)
+    elif action == 'delete':
+        results = delete_products(store_url, access_token, csv_file_path, journal, workers, store_name)
+        # Deleted products are dropped from the ledger so later runs recreate them
+        with open_ledger(source_folder, store_name) as ledger:
+            ledger.remove([result['Product ID'] for result in results if result['Result'] == 'ok'])
+            ledger.export_csv(csv_file_path)
+    else:
+        logging.info("Skipping product activation/deletion")
@@ -0,0 +1,174 @@
+import json
+import time
+import logging
+from pathlib import Path
+from typing import Optional
+from file_operations import file_sha256, pdf_title
+from http_session import get_session
+from journal import RunJournal
+from shopify_client import get_client, ShopifyClient
+from metrics import metrics
+
+# Creates products for a whole PDF folder with one Shopify bulk mutation:
+# the productCreate inputs are staged as a JSONL file, run as a single bulk
+# operation, and the per-line results are mapped back to their PDFs.
+
+POLL_INTERVAL = 5.0
+BULK_TIMEOUT = 6 * 60 * 60
+
+STAGED_UPLOAD_MUTATION = """
+mutation stagedUploadsCreate($input: [StagedUploadInput!]!) {
+  stagedUploadsCreate(input: $input) {
+    stagedTargets { url resourceUrl parameters { name value } }
+    userErrors { field message }
+  }
+}
+"""
+
+BULK_RUN_MUTATION = """
+mutation bulkOperationRunMutation($mutation: String!, $stagedUploadPath: String!) {
+  bulkOperationRunMutation(mutation: $mutation, stagedUploadPath: $stagedUploadPath) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+"""
+
+CURRENT_BULK_OPERATION_QUERY = """
+query {
+  currentBulkOperation(type: MUTATION) { id status errorCode objectCount url partialDataUrl }
+}
+"""
+
+PRODUCT_CREATE_MUTATION = """
+mutation call($input: ProductInput!) {
+  productCreate(input: $input) {
+    product { id title }
+    userErrors { field message }
+  }
+}
+"""
+
+def build_product_input(title: str, config: dict) -> dict:
+    # GraphQL counterpart of shopify.build_product_data
+    product_input = {
+        "title": title,
+        "descriptionHtml": config["Description"],
+        "vendor": "Your Vendor",
+        "productType": "Digital Product",
+        "status": "DRAFT",
+        "variants": [{"price": str(config["Price"]), "compareAtPrice": str(config["CompareToPrice"])}],
+        "seo": {"description": config["SearchEngineDescription"]},
+    }
+    # productCreate only accepts collection IDs; names are left to the REST path
+    collection_ids = [c for c in config.get("Collections") or [] if isinstance(c, str) and c.startswith("gid://")]
+    if collection_ids:
+        product_input["collectionsToJoin"] = collection_ids
+    return product_input
+
+def build_bulk_jsonl(pdf_files: list, config: dict) -> bytes:
+    lines = [json.dumps({"input": build_product_input(pdf_title(pdf_file), config)}) for pdf_file in pdf_files]
+    return ("\n".join(lines) + "\n").encode()
+
+def gid_to_id(gid: str) -> int:
+    return int(gid.rsplit('/', 1)[-1])
+
+def stage_upload(client: ShopifyClient, jsonl: bytes) -> str:
+    data = client.graphql(STAGED_UPLOAD_MUTATION, {"input": [{
+        "resource": "BULK_MUTATION_VARIABLES",
+        "filename": "products.jsonl",
+        "mimeType": "text/jsonl",
+        "httpMethod": "POST",
+    }]})["stagedUploadsCreate"]
+    if data["userErrors"]:
+        raise Exception(f"Failed to stage bulk upload: {data['userErrors']}")
+
+    target = data["stagedTargets"][0]
+    form = {parameter["name"]: parameter["value"] for parameter in target["parameters"]}
+    response = get_session(target["url"]).post(target["url"], data=form, files={"file": ("products.jsonl", jsonl, "text/jsonl")})
+    if response.status_code not in (200, 201, 204):
+        raise Exception(f"Failed to upload bulk variables: {response.status_code} {response.text}")
+    logging.info(f"Staged {len(jsonl)} bytes of bulk variables")
+    return form["key"]
+
+def run_bulk_mutation(client: ShopifyClient, staged_path: str, mutation: str = PRODUCT_CREATE_MUTATION) -> str:
+    data = client.graphql(BULK_RUN_MUTATION, {"mutation": mutation, "stagedUploadPath": staged_path})["bulkOperationRunMutation"]
+    if data["userErrors"]:
+        raise Exception(f"Failed to start bulk operation: {data['userErrors']}")
+    operation = data["bulkOperation"]
+    logging.info(f"Started bulk operation {operation['id']} ({operation['status']})")
+    return operation["id"]
+
+def wait_for_bulk_operation(client: ShopifyClient, operation_id: str, poll_interval: float = POLL_INTERVAL, timeout: float = BULK_TIMEOUT) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        operation = client.graphql(CURRENT_BULK_OPERATION_QUERY)["currentBulkOperation"]
+        if operation and operation["id"] == operation_id:
+            if operation["status"] not in ("CREATED", "RUNNING"):
+                logging.info(f"Bulk operation {operation_id} finished: {operation['status']} ({operation['objectCount']} objects)")
+                return operation
+            logging.info(f"Bulk operation {operation_id} {operation['status']}: {operation['objectCount']} objects so far")
+        if time.monotonic() > deadline:
+            raise Exception(f"Bulk operation {operation_id} did not finish within {timeout}s")
+        time.sleep(poll_interval)
+
+def fetch_bulk_results(url: str) -> list:
+    response = get_session(url).get(url)
+    if response.status_code != 200:
+        raise Exception(f"Failed to download bulk results: {response.status_code}")
+    return [json.loads(line) for line in response.text.splitlines() if line.strip()]
+
+def create_products_bulk(pdf_files: list, store_url: str, access_token: str, config: dict, journal: RunJournal, poll_interval: float = POLL_INTERVAL, hashes: Optional[dict] = None) -> dict:
+    # Returns {pdf_file: product_id} for the products the bulk operation
+    # created. PDFs already in the journal are left out of the payload, and
+    # every created product is journalled so the per-PDF stages pick it up.
+    client = get_client(store_url, access_token)
+    if hashes is None:
+        hashes = {pdf_file: file_sha256(pdf_file) for pdf_file in pdf_files}
+    created = {}
+    to_create = []
+    for pdf_file in pdf_files:
+        product_id = journal.product_for(str(pdf_file), hashes[pdf_file])
+        if product_id:
+            created[pdf_file] = product_id
+        else:
+            to_create.append(pdf_file)
+    if not to_create:
+        logging.info("All PDFs already have products, skipping bulk creation")
+        return created
+
+    logging.info(f"Creating {len(to_create)} products with a bulk mutation")
+    staged_path = stage_upload(client, build_bulk_jsonl(to_create, config))
+    operation_id = run_bulk_mutation(client, staged_path)
+    operation = wait_for_bulk_operation(client, operation_id, poll_interval)
+    results_url = operation.get("url") or operation.get("partialDataUrl")
+    if not results_url:
+        logging.error(f"Bulk operation {operation_id} returned no results: {operation.get('errorCode')}")
+        return created
+
+    for result in fetch_bulk_results(results_url):
+        pdf_file = to_create[result["__lineNumber"]]
+        payload = (result.get("data") or {}).get("productCreate") or {}
+        product = payload.get("product")
+        if not product:
+            logging.error(f"Bulk create failed for {Path(pdf_file).name}: {payload.get('userErrors') or result.get('errors')}")
+            continue
+        product_id = gid_to_id(product["id"])
+        journal.record_created(str(pdf_file), hashes[pdf_file], product_id)
+        created[pdf_file] = product_id
+    logging.info(f"{len(created)}/{len(pdf_files)} PDFs have products after bulk operation {operation_id}")
+    return created
+
+def create_discovered_bulk(discovered, store_url: str, access_token: str, config: dict, journal: RunJournal) -> list:
+    # Bulk mode for a discovery stream of (pdf_file, content_hash) pairs. The
+    # mutation needs the whole list, so discovery is not streamed; products it
+    # creates are journalled and the per-PDF create step then only finds them.
+    # If the bulk run fails, that step creates the products individually.
+    discovered = list(discovered)
+    if discovered:
+        try:
+            with metrics.timer('create'):
+                create_products_bulk([pdf_file for pdf_file, _ in discovered], store_url, access_token, config, journal, hashes=dict(discovered))
+        except Exception as e:
+            logging.error(f"Bulk product creation failed, creating products individually: {e}")
+    return discovered
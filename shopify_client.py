@@ -0,0 +1,181 @@
+import time
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from http_session import get_session
+from metrics import metrics, endpoint_name
+
+API_VERSION = "2024-01"
+CALL_LIMIT_HEADER = "X-Shopify-Shop-Api-Call-Limit"
+
+# Standard Shopify REST bucket: 40 calls, leaking 2 per second. Plus stores
+# get 80/4, which is picked up from the call limit header on the first response.
+DEFAULT_BUCKET_SIZE = 40
+DEFAULT_LEAK_RATE = 2.0
+GRAPHQL_RETRY_SECONDS = 1.0
+DEFAULT_RETRY_AFTER = 2.0
+
+def parse_retry_after(value: Optional[str]) -> float:
+    # Retry-After is either a number of seconds or an HTTP-date
+    if not value:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        logging.warning(f"Unreadable Retry-After header {value!r}, retrying in {DEFAULT_RETRY_AFTER}s")
+        return DEFAULT_RETRY_AFTER
+
+class LeakyBucket:
+    def __init__(self, capacity: int = DEFAULT_BUCKET_SIZE, leak_rate: float = DEFAULT_LEAK_RATE):
+        self.capacity = capacity
+        self.leak_rate = leak_rate
+        self.level = 0.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _leak(self, now: float):
+        self.level = max(0.0, self.level - (now - self.updated) * self.leak_rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._leak(now)
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if self.level + 1 <= self.capacity:
+                        self.level += 1
+                        return
+                    wait = (self.level + 1 - self.capacity) / self.leak_rate
+            time.sleep(wait)
+
+    def sync(self, used: int, capacity: int):
+        # The store's view of the bucket is authoritative, but it lags behind
+        # requests still in flight, so never lower our own estimate.
+        with self._lock:
+            self._leak(time.monotonic())
+            if capacity != self.capacity:
+                self.leak_rate = self.leak_rate * capacity / self.capacity
+                self.capacity = capacity
+            self.level = max(self.level, float(used))
+
+    def pause(self, seconds: float):
+        with self._lock:
+            now = time.monotonic()
+            self._leak(now)
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.level = float(self.capacity)
+
+class ShopifyClient:
+    def __init__(self, store_url: str, access_token: str, api_version: str = API_VERSION, max_retries: int = 5, bucket: LeakyBucket = None):
+        self.store_url = store_url
+        self.access_token = access_token
+        self.api_version = api_version
+        self.max_retries = max_retries
+        self.bucket = bucket or LeakyBucket()
+        self.headers = {
+            "X-Shopify-Access-Token": access_token,
+            "Content-Type": "application/json"
+        }
+
+    def url(self, path: str) -> str:
+        # store_url may carry its own scheme, e.g. a local stand-in server
+        base = self.store_url if "://" in self.store_url else f"https://{self.store_url}"
+        return f"{base}/admin/api/{self.api_version}/{path}"
+
+    def _sync_call_limit(self, response):
+        call_limit = response.headers.get(CALL_LIMIT_HEADER)
+        if not call_limit:
+            return
+        try:
+            used, capacity = (int(part) for part in call_limit.split('/'))
+        except ValueError:
+            logging.warning(f"Unexpected {CALL_LIMIT_HEADER} header: {call_limit}")
+            return
+        self.bucket.sync(used, capacity)
+
+    def request(self, method: str, path: str, rate_limited: bool = True, **kwargs):
+        # rate_limited=False skips the REST bucket (GraphQL has its own cost budget)
+        url = self.url(path)
+        endpoint = endpoint_name(method, path)
+        for attempt in range(self.max_retries + 1):
+            if rate_limited:
+                self.bucket.acquire()
+            start = time.perf_counter()
+            try:
+                response = get_session(url).request(method, url, headers=self.headers, **kwargs)
+            except Exception:
+                metrics.observe_http(endpoint, 'error', time.perf_counter() - start)
+                raise
+            metrics.observe_http(endpoint, response.status_code, time.perf_counter() - start)
+            self._sync_call_limit(response)
+            if response.status_code != 429:
+                return response
+            if attempt == self.max_retries:
+                break
+
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            logging.warning(f"Throttled by Shopify on {method} {path}, retrying in {retry_after}s (attempt {attempt + 1}/{self.max_retries})")
+            metrics.count_retry(endpoint)
+            if rate_limited:
+                self.bucket.pause(retry_after)
+            else:
+                time.sleep(retry_after)
+        logging.error(f"Giving up on {method} {path} after {self.max_retries} throttled retries")
+        return response
+
+    def get(self, path: str, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path: str, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path: str, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def graphql(self, query: str, variables: Optional[dict] = None) -> dict:
+        # GraphQL is rate-limited by query cost rather than the REST bucket, so
+        # it does not queue behind REST calls; a THROTTLED error is retried
+        # after the restore time the store reports.
+        for attempt in range(self.max_retries + 1):
+            response = self.request("POST", "graphql.json", rate_limited=False, json={"query": query, "variables": variables or {}})
+            if response.status_code != 200:
+                raise Exception(f"GraphQL request failed: {response.status_code} {response.text}")
+            payload = response.json()
+            errors = payload.get("errors") or []
+            throttled = any(error.get("extensions", {}).get("code") == "THROTTLED" for error in errors)
+            if throttled and attempt < self.max_retries:
+                status = payload.get("extensions", {}).get("cost", {}).get("throttleStatus", {})
+                wait = GRAPHQL_RETRY_SECONDS
+                if status.get("restoreRate"):
+                    requested = payload["extensions"]["cost"].get("requestedQueryCost", 0)
+                    wait = max(wait, (requested - status.get("currentlyAvailable", 0)) / status["restoreRate"])
+                logging.warning(f"GraphQL query throttled, retrying in {wait:.1f}s")
+                metrics.count_retry(endpoint_name("POST", "graphql.json"))
+                time.sleep(wait)
+                continue
+            if errors:
+                raise Exception(f"GraphQL errors: {errors}")
+            return payload["data"]
+        raise Exception("GraphQL query still throttled after retries")
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(store_url: str, access_token: str) -> ShopifyClient:
+    # One client (and so one rate-limit budget) per store for the whole process
+    with _clients_lock:
+        key = (store_url, access_token)
+        if key not in _clients:
+            _clients[key] = ShopifyClient(store_url, access_token)
+        return _clients[key]
@@ -0,0 +1,613 @@
+import re
+import gzip
+import json
+import time
+import random
+import httplib2
+import itertools
+import threading
+from email.parser import BytesParser
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local stand-ins for the remote services the pipeline talks to, used by
+# benchmark.py so throughput can be measured without a live store.
+
+PRODUCTS_RE = re.compile(r"^/admin/api/[^/]+/products\.json$")
+PRODUCT_RE = re.compile(r"^/admin/api/[^/]+/products/(\d+)\.json$")
+PRODUCT_IMAGES_RE = re.compile(r"^/admin/api/[^/]+/products/(\d+)/images\.json$")
+GRAPHQL_RE = re.compile(r"^/admin/api/[^/]+/graphql\.json$")
+STAGED_UPLOADS_PATH = "/staged-uploads"
+BULK_RESULTS_RE = re.compile(r"^/bulk-results/(\d+)\.jsonl$")
+
+class LocalServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+class ServerBucket:
+    # Mirrors the bucket Shopify enforces per store: requests over capacity get a 429
+    def __init__(self, capacity: int, leak_rate: float):
+        self.capacity = capacity
+        self.leak_rate = leak_rate
+        self.level = 0.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            now = time.monotonic()
+            self.level = max(0.0, self.level - (now - self.updated) * self.leak_rate)
+            self.updated = now
+            if self.level + 1 > self.capacity:
+                return False, int(self.level)
+            self.level += 1
+            return True, int(self.level)
+
+class FakeShopifyServer:
+    # error_rate makes that share of admitted REST calls fail with a 503
+    def __init__(self, capacity: int = 40, leak_rate: float = 2.0, retry_after: float = 1.0, bulk_delay: float = 0.2, latency: float = 0.0, port: int = 0,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.bucket = ServerBucket(capacity, leak_rate)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.retry_after = retry_after
+        self.bulk_delay = bulk_delay
+        self.products = {}
+        self.staged_files = {}
+        self.bulk_operations = {}
+        self.current_bulk_operation = None
+        self.stats = {"requests": 0, "throttled": 0, "graphql": 0, "errors": 0, "bytes": 0}
+        self.image_srcs = set()
+        # variant ID -> product ID, and (owner GID, namespace, key) -> value
+        self.variants = {}
+        self.metafields = {}
+        self._ids = itertools.count(1000)
+        self._lock = threading.Lock()
+        self.httpd = LocalServer(("127.0.0.1", port), self._make_handler())
+        self._thread = None
+
+    @property
+    def store_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, method: str, path: str, body: dict):
+        if method == "POST" and PRODUCTS_RE.match(path):
+            with self._lock:
+                product = dict(body.get("product", {}), id=next(self._ids))
+                product["variants"] = [{"id": next(self._ids), "product_id": product["id"]}]
+                self.products[product["id"]] = product
+                self.variants[product["variants"][0]["id"]] = product["id"]
+            return 201, {"product": product}
+
+        match = PRODUCT_IMAGES_RE.match(path)
+        if method == "POST" and match:
+            product_id = int(match.group(1))
+            if product_id not in self.products:
+                return 404, {"errors": "Not Found"}
+            image_body = body.get("image", {})
+            if "attachment" not in image_body:
+                # Shopify downloads src itself; here only URLs it handed out resolve
+                if image_body.get("src") not in self.image_srcs:
+                    return 422, {"errors": {"image": ["Could not download image"]}}
+            image = {"id": next(self._ids), "product_id": product_id, "filename": image_body.get("filename")}
+            image["src"] = image_body.get("src") or f"{self.store_url}/cdn/images/{image['id']}/{image['filename']}"
+            with self._lock:
+                self.image_srcs.add(image["src"])
+                self.products[product_id].setdefault("image", image)
+            return 201, {"image": image}
+
+        match = PRODUCT_RE.match(path)
+        if match:
+            product_id = int(match.group(1))
+            if product_id not in self.products:
+                return 404, {"errors": "Not Found"}
+            if method == "GET":
+                return 200, {"product": self.products[product_id]}
+            if method == "PUT":
+                with self._lock:
+                    self.products[product_id].update(body.get("product", {}))
+                return 200, {"product": self.products[product_id]}
+            if method == "DELETE":
+                with self._lock:
+                    del self.products[product_id]
+                return 200, {}
+
+        return 404, {"errors": "Not Found"}
+
+    def fail(self) -> bool:
+        with self._lock:
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.stats["errors"] += 1
+        return failed
+
+    def create_product_graphql(self, product_input: dict) -> dict:
+        if not product_input.get("title"):
+            return {"product": None, "userErrors": [{"field": ["title"], "message": "Title can't be blank"}]}
+        with self._lock:
+            product_id = next(self._ids)
+            variant_id = next(self._ids)
+            self.products[product_id] = {"id": product_id, "title": product_input["title"], "status": product_input.get("status", "DRAFT").lower(),
+                                         "variants": [{"id": variant_id, "product_id": product_id}], "input": product_input}
+            self.variants[variant_id] = product_id
+        return {"product": {"id": f"gid://shopify/Product/{product_id}", "title": product_input["title"]}, "userErrors": []}
+
+    def product_page(self, first: int, after: str = None) -> dict:
+        # Products in ID order; the cursor is the last ID of the previous page
+        with self._lock:
+            product_ids = sorted(product_id for product_id in self.products if after is None or product_id > int(after))
+            page = []
+            for product_id in product_ids[:first]:
+                product = self.products[product_id]
+                variants = []
+                for variant in product.get("variants", [])[:1]:
+                    gid = f"gid://shopify/ProductVariant/{variant['id']}"
+                    value = self.metafields.get((gid, "custom", "digital_download"))
+                    variants.append({"id": gid, "metafield": {"value": value} if value else None})
+                page.append({"id": f"gid://shopify/Product/{product_id}", "title": product.get("title"),
+                             "handle": "-".join((product.get("title") or "").lower().split()), "status": (product.get("status") or "draft").upper(),
+                             "featuredImage": {"url": product["image"]["src"]} if product.get("image") else None,
+                             "variants": {"nodes": variants}})
+        has_next = len(product_ids) > first
+        return {"pageInfo": {"hasNextPage": has_next, "endCursor": page[-1]["id"].rsplit("/", 1)[-1] if page else after}, "nodes": page}
+
+    def set_metafields(self, inputs: list) -> dict:
+        # Like Shopify, at most 25 per call and nothing is saved if any input is invalid
+        if len(inputs) > 25:
+            return {"metafields": [], "userErrors": [{"field": ["metafields"], "message": "Exceeded the maximum metafields input limit of 25.",
+                                                      "code": "LESS_THAN_OR_EQUAL_TO", "elementIndex": None}]}
+        errors = []
+        for index, metafield in enumerate(inputs):
+            owner = metafield.get("ownerId", "")
+            if not (owner.startswith("gid://shopify/ProductVariant/") and int(owner.rsplit("/", 1)[-1]) in self.variants):
+                errors.append({"field": ["metafields", str(index), "ownerId"], "message": "Owner does not exist.", "code": "INVALID", "elementIndex": index})
+            elif not metafield.get("value"):
+                errors.append({"field": ["metafields", str(index), "value"], "message": "Value can't be blank.", "code": "BLANK", "elementIndex": index})
+        if errors:
+            return {"metafields": [], "userErrors": errors}
+        with self._lock:
+            for metafield in inputs:
+                self.metafields[(metafield["ownerId"], metafield["namespace"], metafield["key"])] = metafield["value"]
+        return {"metafields": [{"id": f"gid://shopify/Metafield/{next(self._ids)}", "namespace": metafield["namespace"], "key": metafield["key"]}
+                               for metafield in inputs], "userErrors": []}
+
+    def _run_bulk_operation(self, operation: dict, lines: list):
+        # Runs in the background so clients see RUNNING while polling
+        time.sleep(self.bulk_delay)
+        results = []
+        for line_number, line in enumerate(lines):
+            variables = json.loads(line)
+            payload = self.create_product_graphql(variables.get("input", {}))
+            results.append(json.dumps({"data": {"productCreate": payload}, "__lineNumber": line_number}))
+            operation["objectCount"] = str(line_number + 1)
+        operation["results"] = ("\n".join(results) + "\n").encode()
+        operation["url"] = f"{self.store_url}/bulk-results/{operation['number']}.jsonl"
+        operation["status"] = "COMPLETED"
+
+    def graphql(self, body: dict):
+        query = body.get("query", "")
+        variables = body.get("variables") or {}
+        with self._lock:
+            self.stats["graphql"] += 1
+
+        if "stagedUploadsCreate" in query:
+            with self._lock:
+                key = f"tmp/bulk/{next(self._ids)}/products.jsonl"
+            target = {"url": f"{self.store_url}{STAGED_UPLOADS_PATH}", "resourceUrl": None,
+                      "parameters": [{"name": "key", "value": key}]}
+            return 200, {"data": {"stagedUploadsCreate": {"stagedTargets": [target], "userErrors": []}}}
+
+        if "bulkOperationRunMutation" in query:
+            staged = self.staged_files.get(variables.get("stagedUploadPath"))
+            if staged is None:
+                errors = [{"field": ["stagedUploadPath"], "message": "Staged upload not found"}]
+                return 200, {"data": {"bulkOperationRunMutation": {"bulkOperation": None, "userErrors": errors}}}
+            if self.current_bulk_operation and self.current_bulk_operation["status"] in ("CREATED", "RUNNING"):
+                errors = [{"field": None, "message": "A bulk mutation operation for this app and shop is already in progress."}]
+                return 200, {"data": {"bulkOperationRunMutation": {"bulkOperation": None, "userErrors": errors}}}
+            with self._lock:
+                number = next(self._ids)
+                operation = {"id": f"gid://shopify/BulkOperation/{number}", "number": number, "status": "RUNNING",
+                             "errorCode": None, "objectCount": "0", "url": None, "partialDataUrl": None}
+                self.bulk_operations[number] = operation
+                self.current_bulk_operation = operation
+            lines = [line for line in staged.decode().splitlines() if line.strip()]
+            threading.Thread(target=self._run_bulk_operation, args=(operation, lines), daemon=True).start()
+            return 200, {"data": {"bulkOperationRunMutation": {"bulkOperation": {"id": operation["id"], "status": "CREATED"}, "userErrors": []}}}
+
+        if "currentBulkOperation" in query:
+            operation = self.current_bulk_operation
+            public = {k: v for k, v in operation.items() if k not in ("number", "results")} if operation else None
+            return 200, {"data": {"currentBulkOperation": public}}
+
+        if "productCreate" in query:
+            return 200, {"data": {"productCreate": self.create_product_graphql(variables.get("input", {}))}}
+
+        if "metafieldsSet" in query:
+            if self.fail():
+                return 503, {"errors": "Service Unavailable"}
+            return 200, {"data": {"metafieldsSet": self.set_metafields(variables.get("metafields", []))}}
+
+        if "products(" in query:
+            return 200, {"data": {"products": self.product_page(variables.get("first", 50), variables.get("after"))}}
+
+        if "nodes(" in query:
+            nodes = []
+            for gid in variables.get("ids", []):
+                product = self.products.get(int(gid.rsplit("/", 1)[-1])) if gid.startswith("gid://shopify/Product/") else None
+                nodes.append({"id": gid, "variants": {"nodes": [{"id": f"gid://shopify/ProductVariant/{variant['id']}"} for variant in product["variants"][:1]]}}
+                             if product else None)
+            return 200, {"data": {"nodes": nodes}}
+
+        return 200, {"errors": [{"message": "Unsupported query in fake server"}]}
+
+    def handle_external(self, method: str, path: str, headers, raw: bytes):
+        # Stand-ins for the storage URLs Shopify hands out for staged uploads and bulk results
+        if method == "POST" and path == STAGED_UPLOADS_PATH:
+            message = BytesParser().parsebytes(f"Content-Type: {headers['Content-Type']}\r\n\r\n".encode() + raw)
+            fields = {part.get_param("name", header="content-disposition"): part.get_payload(decode=True) for part in message.get_payload()}
+            self.staged_files[fields["key"].decode()] = fields["file"]
+            return 201, {}, {}
+        match = BULK_RESULTS_RE.match(path)
+        if method == "GET" and match and int(match.group(1)) in self.bulk_operations:
+            return 200, self.bulk_operations[int(match.group(1))].get("results", b""), {"Content-Type": "application/jsonl"}
+        return 404, {"errors": "Not Found"}, {}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, payload, headers):
+                data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+                self.send_response(status)
+                if "Content-Type" not in headers:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _dispatch(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                with server._lock:
+                    server.stats["requests"] += 1
+                    server.stats["bytes"] += len(raw)
+                if server.latency:
+                    time.sleep(server.latency)
+
+                if not self.path.startswith("/admin/"):
+                    return self._send(*server.handle_external(self.command, self.path, self.headers, raw))
+                if GRAPHQL_RE.match(self.path):
+                    status, payload = server.graphql(json.loads(raw or b"{}"))
+                    return self._send(status, payload, {})
+
+                allowed, used = server.bucket.take()
+                headers = {"X-Shopify-Shop-Api-Call-Limit": f"{used}/{server.bucket.capacity}"}
+                if not allowed:
+                    with server._lock:
+                        server.stats["throttled"] += 1
+                    status, payload = 429, {"errors": "Exceeded 2 calls per second for api client. Reduce request rates to resume uninterrupted service."}
+                    headers["Retry-After"] = str(server.retry_after)
+                elif server.fail():
+                    status, payload = 503, {"errors": "Service Unavailable"}
+                else:
+                    try:
+                        body = json.loads(raw) if raw else {}
+                    except ValueError:
+                        body = {}
+                    status, payload = server.handle(self.command, self.path, body)
+                self._send(status, payload, headers)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+        return Handler
+
+DRIVE_UPLOAD_RE = re.compile(r"^/upload/drive/v3/files$")
+DRIVE_PERMISSIONS_RE = re.compile(r"^/drive/v3/files/([^/]+)/permissions$")
+DRIVE_FILE_RE = re.compile(r"^/drive/v3/files/([^/]+)$")
+DRIVE_BATCH_PATH = "/batch/drive/v3"
+CONTENT_RANGE_RE = re.compile(r"bytes (\*|(\d+)-(\d+))/(\d+|\*)")
+
+class RedirectingHttp(httplib2.Http):
+    # Sends every request a googleapiclient service makes to a local server,
+    # whatever Google host the discovery document points at.
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+        # Same as googleapiclient.http.build_http: 308 means "resume incomplete", not a redirect
+        self.redirect_codes = self.redirect_codes - {308}
+
+    def request(self, uri, method="GET", *args, **kwargs):
+        parts = urlsplit(uri)
+        local_uri = f"{self.base_url}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+        return super().request(local_uri, method, *args, **kwargs)
+
+class FakeDriveServer:
+    # Implements the parts of Drive v3 the uploader uses: resumable uploads
+    # (with 308 / Range progress and status queries), permission creation and
+    # multipart batch requests. chunk_error_rate makes chunk PUTs fail with a
+    # 503 after the bytes were stored, like a response lost in transit.
+    def __init__(self, chunk_error_rate: float = 0.0, latency: float = 0.0, seed: int = 0, port: int = 0):
+        self.chunk_error_rate = chunk_error_rate
+        self.latency = latency
+        self.random = random.Random(seed)
+        self.sessions = {}
+        self.files = {}
+        self.permissions = {}
+        self.stats = {"requests": 0, "chunks": 0, "chunk_errors": 0, "status_queries": 0, "batches": 0, "bytes": 0}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.httpd = LocalServer(("127.0.0.1", port), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def http(self) -> RedirectingHttp:
+        return RedirectingHttp(self.url)
+
+    def service(self):
+        from google_drive import build_drive_service
+        return build_drive_service(http=self.http())
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def start_upload(self, query: dict, headers, body: bytes):
+        metadata = json.loads(body) if body else {}
+        with self._lock:
+            upload_id = str(next(self._ids))
+            self.sessions[upload_id] = {"metadata": metadata, "data": bytearray(),
+                                        "total": int(headers.get("X-Upload-Content-Length") or 0)}
+        return 200, {}, {"Location": f"{self.url}/upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"}
+
+    def _finish(self, session: dict) -> dict:
+        with self._lock:
+            if "file" not in session:
+                file_id = f"file{next(self._ids)}"
+                session["file"] = {"id": file_id, "name": session["metadata"].get("name"), "trashed": False,
+                                   "webViewLink": f"https://drive.google.com/file/d/{file_id}/view"}
+                self.files[file_id] = {"file": session["file"], "size": len(session["data"])}
+        return session["file"]
+
+    def _progress(self, session: dict):
+        received = len(session["data"])
+        return 308, b"", ({"Range": f"bytes=0-{received - 1}"} if received else {})
+
+    def put_chunk(self, upload_id: str, headers, body: bytes):
+        session = self.sessions.get(upload_id)
+        if session is None:
+            return 404, {"error": {"code": 404, "message": "Upload session not found"}}, {}
+        match = CONTENT_RANGE_RE.match(headers.get("Content-Range") or f"bytes */{len(body)}")
+        if not match:
+            return 400, {"error": {"code": 400, "message": "Bad Content-Range"}}, {}
+        if match.group(4) != "*":
+            session["total"] = int(match.group(4))
+
+        if match.group(1) == "*":
+            self._count("status_queries")
+            if len(session["data"]) >= session["total"]:
+                return 200, self._finish(session), {}
+            return self._progress(session)
+
+        start = int(match.group(2))
+        if start > len(session["data"]):
+            return self._progress(session)
+        self._count("chunks")
+        self._count("bytes", len(body))
+        del session["data"][start:]
+        session["data"].extend(body)
+        with self._lock:
+            fail = self.random.random() < self.chunk_error_rate
+        if fail:
+            self._count("chunk_errors")
+            return 503, {"error": {"code": 503, "message": "Backend Error"}}, {}
+        if len(session["data"]) >= session["total"]:
+            return 200, self._finish(session), {}
+        return self._progress(session)
+
+    def create_permission(self, file_id: str, body: dict):
+        if file_id not in self.files:
+            return 404, {"error": {"code": 404, "message": f"File not found: {file_id}"}}
+        with self._lock:
+            self.permissions.setdefault(file_id, []).append(body)
+        return 200, {"id": "anyoneWithLink"}
+
+    def batch(self, headers, body: bytes):
+        # Each part is an embedded HTTP request; answer each in a multipart/mixed response
+        self._count("batches")
+        message = BytesParser().parsebytes(f"Content-Type: {headers['Content-Type']}\r\n\r\n".encode() + body)
+        boundary = "batch_response_boundary"
+        parts = []
+        for part in message.get_payload():
+            request_line, _, rest = part.get_payload().partition("\n")
+            _, path, _ = request_line.split(" ", 2)
+            request_body = rest.split("\r\n\r\n", 1)[1] if "\r\n\r\n" in rest else ""
+            match = DRIVE_PERMISSIONS_RE.match(urlsplit(path).path)
+            if match:
+                status, payload = self.create_permission(match.group(1), json.loads(request_body or "{}"))
+            else:
+                status, payload = 404, {"error": {"code": 404, "message": "Not Found"}}
+            content_id = part["Content-ID"][1:-1]
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\nContent-Type: application/json\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        data = ("".join(parts) + f"--{boundary}--\r\n").encode()
+        return 200, data, {"Content-Type": f"multipart/mixed; boundary={boundary}"}
+
+    def handle(self, method: str, path: str, headers, body: bytes):
+        parts = urlsplit(path)
+        query = parse_qs(parts.query)
+        if DRIVE_UPLOAD_RE.match(parts.path):
+            if method == "POST":
+                return self.start_upload(query, headers, body)
+            if method == "PUT" and "upload_id" in query:
+                return self.put_chunk(query["upload_id"][0], headers, body)
+        match = DRIVE_PERMISSIONS_RE.match(parts.path)
+        if method == "POST" and match:
+            status, payload = self.create_permission(match.group(1), json.loads(body or b"{}"))
+            return status, payload, {}
+        match = DRIVE_FILE_RE.match(parts.path)
+        if method == "GET" and match:
+            if match.group(1) not in self.files:
+                return 404, {"error": {"code": 404, "message": f"File not found: {match.group(1)}"}}, {}
+            return 200, self.files[match.group(1)]["file"], {}
+        if method == "POST" and parts.path == DRIVE_BATCH_PATH:
+            return self.batch(headers, body)
+        return 404, {"error": {"code": 404, "message": "Not Found"}}, {}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _dispatch(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                server._count("requests")
+                if server.latency:
+                    time.sleep(server.latency)
+                status, payload, headers = server.handle(self.command, self.path, self.headers, body)
+                data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+                self.send_response(status)
+                if "Content-Type" not in headers:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = _dispatch
+
+        return Handler
+
+class FakeWebhookServer:
+    # Stand-in for the Make webhook the ledger is delivered to. Every delivery
+    # is kept so callers can check what arrived; error_rate answers that share
+    # of them with a 500. Gzipped bodies are decompressed, and a repeated
+    # Idempotency-Key is acknowledged without being recorded again.
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0, port: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.deliveries = []
+        self.idempotency_keys = set()
+        self.stats = {"requests": 0, "errors": 0, "bytes": 0, "rows": 0, "duplicates": 0}
+        self._lock = threading.Lock()
+        self.httpd = LocalServer(("127.0.0.1", port), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/hook"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, headers, body: bytes):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes"] += len(body)
+            if self.random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return 500, b"Internal Server Error"
+            key = headers.get("Idempotency-Key")
+            if key and key in self.idempotency_keys:
+                self.stats["duplicates"] += 1
+                return 200, b"Already accepted"
+            if headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            if headers.get("Content-Type") == "application/x-ndjson":
+                self.stats["rows"] += body.count(b"\n")
+            if key:
+                self.idempotency_keys.add(key)
+            self.deliveries.append({"headers": dict(headers), "body": body})
+        return 200, b"Accepted"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                if server.latency:
+                    time.sleep(server.latency)
+                status, data = server.handle(self.headers, body)
+                self.send_response(status)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
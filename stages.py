@@ -0,0 +1,240 @@
+import os
+import time
+import queue
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+from discovery import open_manifest, discover_pdfs
+from image_index import ImageIndex
+from ledger import ProductLedger
+from journal import RunJournal, UPLOADED, METAFIELD_SET
+from shopify import clean_pdf_title, create_pdf_product, attach_pdf_image
+from metafields import MetafieldWriter, set_download_links, METAFIELDS_SET_LIMIT
+from shopify_bulk import create_discovered_bulk
+from google_drive import DriveUploader, PERMISSION_BATCH_SIZE
+from asset_cache import AssetCache
+from planner import Planner, PLAN_FILENAME
+from metrics import metrics
+
+# Producer/consumer pipeline for the batch run. Every PDF moves on to the
+# next stage (create -> ledger -> image -> Drive upload -> share -> metafield)
+# as soon as its previous stage finishes, handed over in memory through
+# bounded queues, so Drive uploads overlap with product creation and wall time
+# approaches the slowest stage rather than the sum of all of them. No stage
+# waits for an earlier PDF: the ledger keeps CSV rows in discovery order by
+# the position each PDF is given when it is discovered.
+
+_DONE = object()
+# How long a batch stage waits for a full batch before sending what it has
+BATCH_WAIT = 0.5
+
+class Stage:
+    # func takes an item and returns it (possibly updated) or None to drop it.
+    # Batch stages get lists of up to batch_size items and return a list of
+    # the same length.
+    def __init__(self, name: str, func: Callable, workers: int = 1, batch_size: int = 1, batch_wait: float = 0.0):
+        self.name = name
+        self.func = func
+        self.workers = 1 if batch_size > 1 else max(1, workers)
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+
+class Pipeline:
+    def __init__(self, stages: list, queue_size: int = 64):
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in stages] + [queue.Queue()]
+        self.results = []
+        self.dropped = {stage.name: 0 for stage in stages}
+        self._lock = threading.Lock()
+
+    def _apply(self, stage: Stage, entry: tuple) -> Optional[tuple]:
+        index, item = entry
+        try:
+            result = stage.func(item)
+        except Exception as e:
+            logging.error(f"{stage.name} failed for item {index}: {e}")
+            result = None
+        if result is None:
+            with self._lock:
+                self.dropped[stage.name] += 1
+            return None
+        return index, result
+
+    def _work(self, position: int, stage: Stage, remaining: list):
+        inbox, outbox = self.queues[position], self.queues[position + 1]
+        while True:
+            entry = inbox.get()
+            if entry is _DONE:
+                # Passed back for the stage's other workers; the last one closes the stage
+                inbox.put(_DONE)
+                with self._lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    outbox.put(_DONE)
+                return
+            result = self._apply(stage, entry)
+            if result is not None:
+                outbox.put(result)
+
+    def _work_batches(self, position: int, stage: Stage):
+        inbox, outbox = self.queues[position], self.queues[position + 1]
+        done = False
+        while not done:
+            entry = inbox.get()
+            if entry is _DONE:
+                break
+            batch = [entry]
+            deadline = time.monotonic() + stage.batch_wait
+            while len(batch) < stage.batch_size:
+                try:
+                    entry = inbox.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if entry is _DONE:
+                    done = True
+                    break
+                batch.append(entry)
+
+            try:
+                results = stage.func([item for _, item in batch])
+            except Exception as e:
+                logging.error(f"{stage.name} failed for a batch of {len(batch)}: {e}")
+                results = [None] * len(batch)
+            with self._lock:
+                self.dropped[stage.name] += sum(1 for result in results if result is None)
+            for (index, _), result in zip(batch, results):
+                if result is not None:
+                    outbox.put((index, result))
+        outbox.put(_DONE)
+
+    def _collect(self):
+        outbox = self.queues[-1]
+        while True:
+            entry = outbox.get()
+            if entry is _DONE:
+                return
+            self.results.append(entry)
+
+    def run(self, items: Iterable) -> list:
+        # Feeding blocks while the first queue is full, which throttles discovery
+        threads = [threading.Thread(target=self._collect, daemon=True)]
+        for position, stage in enumerate(self.stages):
+            if stage.batch_size > 1:
+                threads.append(threading.Thread(target=self._work_batches, args=(position, stage), daemon=True))
+            else:
+                remaining = [stage.workers]
+                threads += [threading.Thread(target=self._work, args=(position, stage, remaining), daemon=True) for _ in range(stage.workers)]
+        for thread in threads:
+            thread.start()
+        for index, item in enumerate(items):
+            self.queues[0].put((index, item))
+        self.queues[0].put(_DONE)
+        for thread in threads:
+            thread.join()
+        return [item for _, item in sorted(self.results, key=lambda entry: entry[0])]
+
+def run_product_pipeline(source_folder: str, store_url: str, access_token: str, config: dict, ledger: ProductLedger, journal: RunJournal,
+                         uploader: DriveUploader, workers: int = 1, markets_to_process: Optional[int] = None, bulk: bool = False,
+                         asset_cache: Optional[AssetCache] = None, store_products: Optional[dict] = None) -> list:
+    # store_products (planner.fetch_store_index) enables the plan: only PDFs
+    # it marks create or update enter the pipeline.
+    workers = max(1, workers)
+    with metrics.timer('discovery'):
+        image_index = ImageIndex(sorted((Path(source_folder) / 'images').glob('*.jp*g')))
+    logging.info(f"Indexed {len(image_index)} images")
+
+    writer = MetafieldWriter(store_url, access_token)
+    manifest = open_manifest(source_folder)
+    discovered = discover_pdfs(source_folder, manifest, markets_to_process or None)
+    planner = None
+    if store_products is not None:
+        planner = Planner(store_products, journal, ledger, image_index, uploader.cached_link if uploader.cache is not None else None)
+        writer.add_variants(planner.variant_ids())
+        discovered = planner.execute(discovered)
+    if bulk:
+        # The create stage then only finds journalled products
+        discovered = create_discovered_bulk(discovered, store_url, access_token, config, journal)
+
+    def create(item):
+        item['title'], item['cleaned_title'] = clean_pdf_title(item['pdf_file'])
+        item['product_id'] = create_pdf_product(item['pdf_file'], item['title'], store_url, access_token, config, journal, item['content_hash'])
+        return item if item['product_id'] else None
+
+    def record(item):
+        # The position taken at discovery keeps ledger rows in discovery order whatever finishes first
+        with metrics.timer('csv_write'):
+            ledger.upsert(item['product_id'], pdf_path=str(item['pdf_file']), position=item['position'])
+        return item
+
+    def attach(item):
+        attach_pdf_image(item['pdf_file'], item['product_id'], item['cleaned_title'], store_url, access_token, config, image_index, journal, asset_cache)
+        return item
+
+    def upload(item):
+        product_id = item['product_id']
+        if journal.completed(product_id, METAFIELD_SET):
+            item['linked'] = True
+            return item
+        row = ledger.get(product_id)
+        item['drive_url'] = (row or {}).get('drive_url') or (uploader.cached_link(item['content_hash']) if uploader.cache is not None else None)
+        if not item['drive_url']:
+            item['drive_file'] = uploader.upload_once(str(item['pdf_file']), item['content_hash'])
+            if not item['drive_file']:
+                return None
+        return item
+
+    def share(items):
+        file_ids = sorted({item['drive_file']['id'] for item in items if item.get('drive_file')})
+        shared = uploader.share(file_ids) if file_ids else set()
+        results = []
+        for item in items:
+            file = item.pop('drive_file', None)
+            if file:
+                if file['id'] not in shared:
+                    results.append(None)
+                    continue
+                item['drive_url'] = file['webViewLink']
+                uploader.remember(item['content_hash'], file, str(item['pdf_file']))
+            if not item.get('linked'):
+                journal.mark(item['product_id'], UPLOADED)
+            results.append(item)
+        return results
+
+    def link(items):
+        # One metafieldsSet call per batch; only confirmed writes are journalled
+        # and only then does the Drive link go into the ledger
+        links = {item['product_id']: item['drive_url'] for item in items if not item.get('linked')}
+        with metrics.timer('metafield_update'):
+            written = set_download_links(store_url, access_token, links, writer) if links else set()
+        results = []
+        for item in items:
+            if not item.get('linked'):
+                if item['product_id'] not in written:
+                    results.append(None)
+                    continue
+                ledger.upsert(item['product_id'], drive_url=item['drive_url'])
+                journal.mark(item['product_id'], METAFIELD_SET)
+            results.append(item)
+        return results
+
+    pipeline = Pipeline([
+        Stage('create', create, workers),
+        Stage('record', record, workers),
+        Stage('image_attach', attach, workers),
+        Stage('drive_upload', upload, workers),
+        Stage('share', share, batch_size=PERMISSION_BATCH_SIZE, batch_wait=BATCH_WAIT),
+        Stage('metafield_update', link, batch_size=METAFIELDS_SET_LIMIT, batch_wait=BATCH_WAIT),
+    ], queue_size=workers * 4)
+    logging.info(f"Running create -> image -> Drive -> metafield pipeline with {workers} worker(s) per stage")
+    linked = pipeline.run({'pdf_file': pdf_file, 'content_hash': content_hash, 'position': ledger.reserve_position()}
+                          for pdf_file, content_hash in discovered)
+    manifest.close()
+    ledger.commit()
+    if planner:
+        planner.write(os.path.join(source_folder, PLAN_FILENAME), limited=bool(markets_to_process))
+
+    failed = {name: count for name, count in pipeline.dropped.items() if count}
+    logging.info(f"Pipeline finished: {len(linked)} products linked" + (f", dropped at {failed}" if failed else ""))
+    return linked
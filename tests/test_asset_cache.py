@@ -0,0 +1,66 @@
+import pytest
+import asset_cache
+from asset_cache import AssetCache, DRIVE_FILE, SHOPIFY_IMAGE, VALIDATE_AFTER
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(asset_cache, "time", clock)
+    return clock
+
+def test_entries_are_keyed_by_kind_scope_and_hash(tmp_path, clock):
+    cache = AssetCache(str(tmp_path / "asset_cache.db"))
+    cache.put(DRIVE_FILE, "/creds/a.json", "hash-1", "https://drive/1", "file1", 100)
+    cache.put(SHOPIFY_IMAGE, "https://a.myshopify.com", "hash-1", "https://cdn/1")
+
+    assert cache.get(DRIVE_FILE, "/creds/a.json", "hash-1") == {"remote_id": "file1", "url": "https://drive/1", "size": 100, "stale": False}
+    assert cache.get(SHOPIFY_IMAGE, "https://a.myshopify.com", "hash-1")["url"] == "https://cdn/1"
+    assert cache.get(DRIVE_FILE, "/creds/b.json", "hash-1") is None
+    assert cache.get(SHOPIFY_IMAGE, "https://b.myshopify.com", "hash-1") is None
+    assert cache.get(DRIVE_FILE, "/creds/a.json", "hash-2") is None
+    assert (cache.hits, cache.misses) == (2, 3)
+
+    cache.invalidate(DRIVE_FILE, "/creds/a.json", "hash-1")
+    assert cache.get(DRIVE_FILE, "/creds/a.json", "hash-1") is None
+    assert len(cache) == 1
+    cache.close()
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = AssetCache(str(tmp_path / "asset_cache.db"), max_entries=2)
+    cache.put(DRIVE_FILE, "", "hash-1", "https://drive/1")
+    clock.now += 1
+    cache.put(DRIVE_FILE, "", "hash-2", "https://drive/2")
+    clock.now += 1
+    # Using hash-1 makes hash-2 the least recently used
+    assert cache.get(DRIVE_FILE, "", "hash-1")
+    clock.now += 1
+    cache.put(DRIVE_FILE, "", "hash-3", "https://drive/3")
+
+    assert len(cache) == 2
+    assert cache.get(DRIVE_FILE, "", "hash-2") is None
+    assert cache.get(DRIVE_FILE, "", "hash-1") and cache.get(DRIVE_FILE, "", "hash-3")
+    cache.close()
+
+def test_entries_are_stale_after_seven_days_until_validated(tmp_path, clock):
+    db_path = str(tmp_path / "asset_cache.db")
+    cache = AssetCache(db_path)
+    cache.put(DRIVE_FILE, "", "hash-1", "https://drive/1", "file1")
+    clock.now += VALIDATE_AFTER - 60
+    assert not cache.get(DRIVE_FILE, "", "hash-1")["stale"]
+    # Being used does not count as being validated
+    clock.now += 120
+    assert cache.get(DRIVE_FILE, "", "hash-1")["stale"]
+
+    cache.validated(DRIVE_FILE, "", "hash-1")
+    cache.close()
+    # The cache outlives the run
+    cache = AssetCache(db_path)
+    assert cache.get(DRIVE_FILE, "", "hash-1") == {"remote_id": "file1", "url": "https://drive/1", "size": None, "stale": False}
+    cache.close()
@@ -0,0 +1,51 @@
+import os
+from discovery import FileManifest, discover_pdfs
+from file_operations import file_sha256
+
+def discover(folder, manifest, limit=None):
+    return [(os.path.relpath(path, folder), content_hash) for path, content_hash in discover_pdfs(str(folder), manifest, limit)]
+
+def test_pdfs_are_found_recursively_in_sorted_order(tmp_path):
+    for name in ["b.pdf", "a/z.pdf", "a/c/y.pdf", "c.PDF", "notes.txt", "a.pdf"]:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(name.encode())
+    manifest = FileManifest(str(tmp_path / "file_manifest.db"))
+
+    found = discover(tmp_path, manifest)
+    assert [path for path, _ in found] == ["a/c/y.pdf", "a/z.pdf", "a.pdf", "b.pdf"]
+    assert all(content_hash == file_sha256(tmp_path / path) for path, content_hash in found)
+    # A limit takes the first PDFs in that order
+    assert [path for path, _ in discover(tmp_path, manifest, 2)] == ["a/c/y.pdf", "a/z.pdf"]
+    manifest.close()
+
+def test_manifest_only_rehashes_files_whose_size_or_mtime_changed(tmp_path):
+    db_path = str(tmp_path / "file_manifest.db")
+    pdf_file = tmp_path / "2024-3-Austin.pdf"
+    pdf_file.write_bytes(b"%PDF Austin v1")
+    with FileManifest(db_path) as manifest:
+        (first,) = discover(tmp_path, manifest)
+        assert (manifest.hashed, manifest.unchanged) == (1, 0)
+
+    # Unchanged since the last run: a stat, no read
+    with FileManifest(db_path) as manifest:
+        assert discover(tmp_path, manifest) == [first]
+        assert (manifest.hashed, manifest.unchanged) == (0, 1)
+
+        # Touched with the same content: read again, same hash
+        stat = pdf_file.stat()
+        os.utime(pdf_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert discover(tmp_path, manifest) == [first]
+        assert manifest.hashed == 1
+
+        # New content of the same size
+        pdf_file.write_bytes(b"%PDF Austin v2")
+        os.utime(pdf_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+        (changed,) = discover(tmp_path, manifest)
+        assert changed[0] == first[0] and changed[1] != first[1]
+        assert changed[1] == file_sha256(pdf_file)
+
+        # Renamed: hashed again under its new path, to the same content hash
+        os.rename(pdf_file, tmp_path / "2024-3-Austin TX.pdf")
+        assert discover(tmp_path, manifest) == [("2024-3-Austin TX.pdf", changed[1])]
+        assert manifest.hashed == 3
@@ -0,0 +1,61 @@
+import time
+import threading
+from types import SimpleNamespace
+import pytest
+import google_drive
+from google_drive import DriveUploader, upload_file, CHUNK_ALIGNMENT, PERMISSION_BATCH_SIZE
+from simulator import FakeDriveServer
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(google_drive, "time", SimpleNamespace(perf_counter=time.perf_counter, sleep=lambda seconds: None))
+
+def write_pdf(path, size):
+    path.write_bytes(bytes(n % 251 for n in range(size)))
+    return str(path)
+
+def test_upload_is_sent_in_aligned_chunks(tmp_path):
+    pdf = write_pdf(tmp_path / "a.pdf", 3 * CHUNK_ALIGNMENT + 100)
+    with FakeDriveServer() as drive:
+        # Rounded down to a multiple of 256 KiB
+        file = upload_file(drive.service(), pdf, chunk_size=CHUNK_ALIGNMENT + 1000)
+        assert drive.stats["chunks"] == 4
+        assert drive.files[file["id"]]["size"] == 3 * CHUNK_ALIGNMENT + 100
+        assert file["webViewLink"].endswith(f"/{file['id']}/view")
+
+def test_upload_resumes_from_acknowledged_bytes_after_transient_errors(tmp_path, no_backoff):
+    size = 8 * CHUNK_ALIGNMENT
+    pdf = write_pdf(tmp_path / "a.pdf", size)
+    with FakeDriveServer(chunk_error_rate=0.3, seed=1) as drive:
+        file = upload_file(drive.service(), pdf, chunk_size=CHUNK_ALIGNMENT, max_retries=10)
+        assert drive.stats["chunk_errors"] > 0
+        assert drive.stats["status_queries"] == drive.stats["chunk_errors"]
+        # Each failed chunk had been stored, so nothing is sent twice
+        assert drive.stats["bytes"] == size
+        assert drive.files[file["id"]]["size"] == size
+
+def test_share_sends_one_batch_per_hundred_files():
+    with FakeDriveServer() as drive:
+        file_ids = [f"file{n}" for n in range(PERMISSION_BATCH_SIZE + 50)]
+        for file_id in file_ids:
+            drive.files[file_id] = {"file": {"id": file_id}, "size": 0}
+        shared = DriveUploader(drive.service).share(file_ids + ["missing"])
+        assert shared == set(file_ids)
+        assert drive.stats["batches"] == 2
+        assert set(drive.permissions) == set(file_ids)
+
+def test_upload_once_shares_one_upload_per_content(tmp_path):
+    pdf = write_pdf(tmp_path / "a.pdf", 1000)
+    with FakeDriveServer(latency=0.05) as drive:
+        uploader = DriveUploader(drive.service)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(uploader.upload_once(pdf, "hash-a"))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(drive.files) == 1
+        assert len({file["id"] for file in results}) == 1
+        assert uploader.upload_once(pdf, "hash-a") == results[0]
+        assert uploader.upload_once(pdf, "hash-b")["id"] != results[0]["id"]
+        assert len(drive.files) == 2
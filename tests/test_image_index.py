@@ -0,0 +1,32 @@
+import random
+from pathlib import Path
+from image_index import ImageIndex, clean_string
+
+WORDS = ["austin", "boston", "new", "york", "san", "jose", "diego", "la", "port", "land", "market", "report", "east", "west", "st", "louis"]
+
+def linear_scan(image_files, cleaned_title):
+    # The matching loop the index replaced: first image either way round
+    for image_path in image_files:
+        cleaned_image_name = clean_string(image_path.stem)
+        if cleaned_title in cleaned_image_name or cleaned_image_name in cleaned_title:
+            return image_path
+    return None
+
+def random_name(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+
+def test_find_matches_linear_scan():
+    rng = random.Random(3)
+    image_files = [Path(f"{random_name(rng).title()}.jpg") for _ in range(300)]
+    index = ImageIndex(image_files)
+    titles = [random_name(rng) for _ in range(500)] + ["", "a", "la", "zzz", "St. Louis - East"]
+    for title in titles:
+        cleaned_title = clean_string(title)
+        assert index.find(cleaned_title) == linear_scan(image_files, cleaned_title), title
+
+def test_find_prefers_earliest_image():
+    image_files = [Path("Boston Market.jpg"), Path("Boston.jpg"), Path("Austin.jpeg")]
+    index = ImageIndex(image_files)
+    assert index.find("boston") == Path("Boston Market.jpg")
+    assert index.find("austin market report") == Path("Austin.jpeg")
+    assert index.find("denver") is None
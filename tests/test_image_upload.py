@@ -0,0 +1,42 @@
+import base64
+import json
+import sys
+from pathlib import Path
+import pytest
+from image_upload import Base64ImageBody, prepare_image, READ_CHUNK_SIZE, CACHE_DIRNAME
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 4, READ_CHUNK_SIZE - 1, READ_CHUNK_SIZE, READ_CHUNK_SIZE + 1, 2 * READ_CHUNK_SIZE + 2])
+def test_streamed_body_matches_its_length_and_the_plain_encoding(tmp_path, size):
+    image = tmp_path / "austin.jpg"
+    data = bytes(n % 256 for n in range(size))
+    image.write_bytes(data)
+    body = Base64ImageBody(str(image), "Austin.jpg")
+    raw = b''.join(body)
+    assert len(raw) == len(body)
+    assert json.loads(raw) == {"image": {"filename": "Austin.jpg", "attachment": base64.b64encode(data).decode()}}
+    # The body can be sent again, e.g. after a throttled request
+    assert b''.join(body) == raw
+
+def test_resized_images_are_cached_by_content_and_settings(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    image = tmp_path / "austin.jpg"
+    Image.new("RGB", (2000, 1000), "white").save(image)
+
+    resized = prepare_image(str(image), 500)
+    assert resized.startswith(str(tmp_path / CACHE_DIRNAME))
+    with Image.open(resized) as result:
+        assert result.size == (500, 250)
+    mtime = Path(resized).stat().st_mtime_ns
+
+    # A second call reuses the file; other settings get their own entry
+    assert prepare_image(str(image), 500) == resized
+    assert Path(resized).stat().st_mtime_ns == mtime
+    assert prepare_image(str(image), 250) != resized
+    assert len(list((tmp_path / CACHE_DIRNAME).glob("*.jpg"))) == 2
+
+def test_images_are_sent_as_they_are_without_pillow(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "PIL", None)
+    image = tmp_path / "austin.jpg"
+    image.write_bytes(b"jpeg")
+    assert prepare_image(str(image), 500) == str(image)
+    assert not (tmp_path / CACHE_DIRNAME).exists()
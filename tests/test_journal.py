@@ -0,0 +1,33 @@
+from journal import RunJournal, CREATED, IMAGE_ATTACHED, UPLOADED, METAFIELD_SET, DELETED
+
+def test_rerun_resumes_from_recorded_stages(tmp_path):
+    db_path = str(tmp_path / "run_journal.db")
+    journal = RunJournal(db_path)
+    journal.record_created("/pdfs/2024-3-Austin.pdf", "hash-1", 101)
+    journal.mark(101, IMAGE_ATTACHED)
+    journal.close()
+
+    # A crash after the image: the next run finds the product and only the later stages
+    journal = RunJournal(db_path)
+    assert journal.product_for("/pdfs/2024-3-Austin.pdf", "hash-1") == 101
+    assert journal.completed(101, CREATED)
+    assert journal.completed(101, IMAGE_ATTACHED)
+    assert not journal.completed(101, UPLOADED)
+    assert journal.content_hash(101) == "hash-1"
+    journal.close()
+
+def test_changed_or_deleted_pdf_is_not_resumed(tmp_path):
+    journal = RunJournal(str(tmp_path / "run_journal.db"))
+    journal.record_created("/pdfs/2024-3-Austin.pdf", "hash-1", 101)
+    journal.mark(101, METAFIELD_SET)
+
+    assert journal.product_for("/pdfs/2024-3-Austin.pdf", "hash-2") is None
+    assert journal.latest_product_for_path("/pdfs/2024-3-Austin.pdf") == 101
+
+    journal.reset(101, (UPLOADED, METAFIELD_SET))
+    assert not journal.completed(101, METAFIELD_SET)
+
+    journal.set_lifecycle(101, DELETED)
+    assert journal.product_for("/pdfs/2024-3-Austin.pdf", "hash-1") is None
+    assert journal.latest_product_for_path("/pdfs/2024-3-Austin.pdf") is None
+    journal.close()
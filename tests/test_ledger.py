@@ -0,0 +1,68 @@
+from ledger import ProductLedger, open_ledger, CSV_FILENAME
+
+def test_upsert_keeps_fields_and_counts_only_real_changes(tmp_path):
+    ledger = ProductLedger(str(tmp_path / "ledger.db"))
+    ledger.upsert(1, pdf_path="a.pdf")
+    ledger.upsert(2, pdf_path="b.pdf")
+    ledger.upsert(1, drive_url="https://drive/a")
+    assert ledger.get(1) == {"product_id": 1, "pdf_path": "a.pdf", "drive_url": "https://drive/a"}
+
+    changes = ledger.changes_since(0, 10)
+    assert [(row["product_id"], row["changed"]) for row in changes] == [(2, 2), (1, 3)]
+    # Writing what is already stored is not a change
+    ledger.upsert(1, pdf_path="a.pdf", drive_url="https://drive/a")
+    assert ledger.changes_since(3, 10) == []
+    ledger.close()
+
+def test_existing_csv_is_imported_once(tmp_path):
+    csv_path = tmp_path / CSV_FILENAME
+    csv_path.write_text("Product ID,PDF Path,Drive URL\n1,a.pdf,https://drive/a\n2.0,b.pdf,\n")
+    with open_ledger(str(tmp_path)) as ledger:
+        assert ledger.rows() == [{"product_id": 1, "pdf_path": "a.pdf", "drive_url": "https://drive/a"},
+                                 {"product_id": 2, "pdf_path": "b.pdf", "drive_url": None}]
+        assert [row["product_id"] for row in ledger.pending_uploads()] == [2]
+        ledger.upsert(2, drive_url="https://drive/b")
+        ledger.export_csv(str(csv_path))
+    assert csv_path.read_text().splitlines() == ["Product ID,PDF Path,Drive URL", "1,a.pdf,https://drive/a", "2,b.pdf,https://drive/b"]
+
+    # Once the ledger exists the CSV is only its export
+    csv_path.write_text("Product ID,PDF Path,Drive URL\n3,c.pdf,\n")
+    with open_ledger(str(tmp_path)) as ledger:
+        assert [row["product_id"] for row in ledger.rows()] == [1, 2]
+
+def test_removal_leaves_tombstone_until_reinserted(tmp_path):
+    ledger = ProductLedger(str(tmp_path / "ledger.db"))
+    ledger.upsert(1, pdf_path="a.pdf")
+    ledger.remove([1])
+    assert ledger.get(1) is None
+    assert [(row["product_id"], row["removed"]) for row in ledger.changes_since(1, 10)] == [(1, 1)]
+    ledger.upsert(1, pdf_path="a.pdf")
+    assert [(row["product_id"], row["removed"]) for row in ledger.changes_since(2, 10)] == [(1, 0)]
+    ledger.close()
+
+def test_change_counter_and_cursor_survive_reopen(tmp_path):
+    db_path = str(tmp_path / "ledger.db")
+    with ProductLedger(db_path) as ledger:
+        ledger.upsert(1, pdf_path="a.pdf")
+        ledger.upsert(2, pdf_path="b.pdf")
+        ledger.set_delivery_cursor("https://hook", 2)
+    with ProductLedger(db_path) as ledger:
+        assert ledger.delivery_cursor("https://hook") == 2
+        assert ledger.delivery_cursor("https://other") == 0
+        ledger.upsert(3, pdf_path="c.pdf")
+        assert [row["changed"] for row in ledger.changes_since(2, 10)] == [3]
+
+def test_rows_follow_discovery_position(tmp_path):
+    ledger = ProductLedger(str(tmp_path / "ledger.db"))
+    positions = {path: ledger.reserve_position() for path in ("a.pdf", "b.pdf", "c.pdf")}
+    # Recorded in the order concurrent workers finished
+    for product_id, path in ((3, "c.pdf"), (1, "a.pdf"), (2, "b.pdf")):
+        ledger.upsert(product_id, pdf_path=path, position=positions[path])
+    ledger.upsert(4, pdf_path="d.pdf")
+    ledger.upsert(1, drive_url="https://drive/a", position=ledger.reserve_position())
+    assert [row["pdf_path"] for row in ledger.rows()] == ["a.pdf", "b.pdf", "c.pdf", "d.pdf"]
+
+    csv_path = tmp_path / "product_pdf_data.csv"
+    ledger.export_csv(str(csv_path))
+    assert csv_path.read_text().splitlines() == ["Product ID,PDF Path,Drive URL", "1,a.pdf,https://drive/a", "2,b.pdf,", "3,c.pdf,", "4,d.pdf,"]
+    ledger.close()
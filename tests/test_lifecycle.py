@@ -0,0 +1,50 @@
+import csv
+from journal import RunJournal, ACTIVATED, DELETED
+from lifecycle import run_lifecycle, summary_path_for, SUMMARY_FIELDNAMES
+from simulator import FakeShopifyServer
+
+def read_summary(summary_path):
+    with open(summary_path, newline='') as csvfile:
+        reader = csv.DictReader(csvfile)
+        assert reader.fieldnames == SUMMARY_FIELDNAMES
+        return list(reader)
+
+def test_failures_are_reported_per_product_and_retried_on_the_next_run(tmp_path):
+    journal = RunJournal(str(tmp_path / "run_journal.db"))
+    summary_path = summary_path_for(str(tmp_path / "product_pdf_data.csv"), "activate")
+    assert summary_path == str(tmp_path / "activate_summary.csv")
+
+    with FakeShopifyServer(error_rate=0.3, seed=3) as shop:
+        product_ids = [int(shop.create_product_graphql({"title": f"Market {n}"})["product"]["id"].rsplit("/", 1)[-1]) for n in range(20)]
+        results = run_lifecycle("activate", shop.store_url, "token", product_ids, workers=4, journal=journal, summary_path=summary_path)
+
+        # One result per product, in the order given, whatever order they finished in
+        assert [result["Product ID"] for result in results] == product_ids
+        failed = [result["Product ID"] for result in results if result["Result"] == "failed"]
+        assert 0 < len(failed) < len(product_ids)
+        assert all(result["Status Code"] == 503 for result in results if result["Result"] == "failed")
+        for product_id in product_ids:
+            active = shop.products[product_id]["status"] == "active"
+            assert active == (product_id not in failed) == journal.completed(product_id, ACTIVATED)
+
+        summary = read_summary(summary_path)
+        assert [(int(row["Product ID"]), row["Result"]) for row in summary] == [(result["Product ID"], result["Result"]) for result in results]
+
+        # The rerun only touches the products that failed
+        shop.error_rate = 0.0
+        results = run_lifecycle("activate", shop.store_url, "token", product_ids, workers=4, journal=journal, summary_path=summary_path)
+        assert [result["Product ID"] for result in results if result["Result"] == "ok"] == failed
+        assert all(result["Result"] == "skipped" for result in results if result["Product ID"] not in failed)
+        assert all(product["status"] == "active" for product in shop.products.values())
+        assert len(read_summary(summary_path)) == len(product_ids)
+    journal.close()
+
+def test_deleting_a_product_already_gone_counts_as_done(tmp_path):
+    journal = RunJournal(str(tmp_path / "run_journal.db"))
+    with FakeShopifyServer() as shop:
+        product_id = int(shop.create_product_graphql({"title": "Austin"})["product"]["id"].rsplit("/", 1)[-1])
+        results = run_lifecycle("delete", shop.store_url, "token", [product_id, 999999], journal=journal)
+        assert [(result["Result"], result["Status Code"]) for result in results] == [("ok", 200), ("ok", 404)]
+        assert shop.products == {}
+        assert journal.completed(product_id, DELETED) and journal.completed(999999, DELETED)
+    journal.close()
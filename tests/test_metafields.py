@@ -0,0 +1,61 @@
+import pytest
+from metafields import MetafieldWriter, set_download_links, DOWNLOAD_NAMESPACE, DOWNLOAD_KEY
+from google_drive import DriveUploader, process_uploaded_files
+from journal import RunJournal, METAFIELD_SET
+from ledger import ProductLedger
+from simulator import FakeShopifyServer, FakeDriveServer
+
+@pytest.fixture
+def shop():
+    with FakeShopifyServer() as server:
+        yield server
+
+def create_products(shop, count):
+    return [int(shop.create_product_graphql({"title": f"Market {n}"})["product"]["id"].rsplit("/", 1)[-1]) for n in range(count)]
+
+def stored_link(shop, product_id):
+    variant_id = shop.products[product_id]["variants"][0]["id"]
+    return shop.metafields.get((f"gid://shopify/ProductVariant/{variant_id}", DOWNLOAD_NAMESPACE, DOWNLOAD_KEY))
+
+def test_links_are_set_on_first_variant_in_one_call(shop):
+    product_ids = create_products(shop, 3)
+    links = {product_id: f"https://drive/{product_id}" for product_id in product_ids}
+    assert set_download_links(shop.store_url, "token", links) == set(product_ids)
+    assert {product_id: stored_link(shop, product_id) for product_id in product_ids} == links
+    # One nodes query for the variants, one metafieldsSet
+    assert shop.stats["graphql"] == 2
+
+def test_rejected_entries_are_dropped_and_the_rest_resent(shop):
+    first, second, third = create_products(shop, 3)
+    writer = MetafieldWriter(shop.store_url, "token")
+    writer.add(first, DOWNLOAD_NAMESPACE, DOWNLOAD_KEY, "https://drive/1")
+    writer.add(second, DOWNLOAD_NAMESPACE, DOWNLOAD_KEY, "")
+    writer.add(third, DOWNLOAD_NAMESPACE, DOWNLOAD_KEY, "https://drive/3")
+
+    confirmed = writer.flush()
+    assert [entry[0] for entry in confirmed] == [first, third]
+    assert (writer.written, writer.failed) == (2, 1)
+    assert stored_link(shop, first) == "https://drive/1"
+    assert stored_link(shop, second) is None
+    assert stored_link(shop, third) == "https://drive/3"
+    # Variants, the rejected call, then the resend
+    assert shop.stats["graphql"] == 3
+
+def test_products_without_variant_are_not_confirmed(shop):
+    (product_id,) = create_products(shop, 1)
+    assert set_download_links(shop.store_url, "token", {product_id: "https://drive/1", 999999: "https://drive/missing"}) == {product_id}
+
+def test_ledger_gets_drive_url_only_once_the_metafield_is_confirmed(shop, tmp_path):
+    (product_id,) = create_products(shop, 1)
+    missing = 999999
+    ledger, journal = ProductLedger(str(tmp_path / "ledger.db")), RunJournal(str(tmp_path / "journal.db"))
+    for pid in (product_id, missing):
+        (tmp_path / f"{pid}.pdf").write_bytes(b"%PDF " + str(pid).encode())
+        ledger.upsert(pid, pdf_path=str(tmp_path / f"{pid}.pdf"))
+    with FakeDriveServer() as drive:
+        process_uploaded_files(ledger, shop.store_url, "token", journal, DriveUploader(drive.service))
+    assert ledger.get(product_id)["drive_url"] == stored_link(shop, product_id)
+    assert journal.completed(product_id, METAFIELD_SET)
+    # The store has no such product, so the link never reached it
+    assert ledger.get(missing)["drive_url"] is None
+    assert not journal.completed(missing, METAFIELD_SET)
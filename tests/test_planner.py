@@ -0,0 +1,34 @@
+from pathlib import Path
+from journal import RunJournal
+from ledger import ProductLedger
+from planner import Planner, CREATE, UPDATE, SKIP
+
+AUSTIN = Path("/pdfs/2024-4-Austin.pdf")
+
+def store_product(title, download_url=None, status="active"):
+    return {"title": title, "handle": title.lower(), "status": status, "variant_id": "gid://shopify/ProductVariant/1",
+            "download_url": download_url, "has_image": True}
+
+def planner_for(tmp_path, store_products, drive_link=None):
+    return Planner(store_products, RunJournal(str(tmp_path / "journal.db")), ProductLedger(str(tmp_path / "ledger.db")), drive_link=drive_link)
+
+def test_same_title_linked_to_other_content_is_not_reused(tmp_path):
+    # Last quarter's Austin is live and linked; this quarter's PDF has new content
+    planner = planner_for(tmp_path, {7: store_product("Austin", "https://drive/q3")}, drive_link=lambda content_hash: None)
+    entry = planner.classify(AUSTIN, "hash-q4")
+    assert (entry["action"], entry["product_id"]) == (CREATE, None)
+
+def test_same_title_linked_to_this_content_is_skipped(tmp_path):
+    links = {"hash-q4": "https://drive/q4"}
+    planner = planner_for(tmp_path, {7: store_product("Austin", "https://drive/q4")}, drive_link=links.get)
+    entry = planner.classify(AUSTIN, "hash-q4")
+    assert (entry["action"], entry["product_id"]) == (SKIP, 7)
+
+def test_same_title_without_link_is_finished(tmp_path):
+    planner = planner_for(tmp_path, {7: store_product("Austin")})
+    entry = planner.classify(AUSTIN, "hash-q4")
+    assert (entry["action"], entry["product_id"]) == (UPDATE, 7)
+
+def test_archived_products_are_never_reused(tmp_path):
+    planner = planner_for(tmp_path, {7: store_product("Austin", status="archived")})
+    assert planner.classify(AUSTIN, "hash-q4")["action"] == CREATE
@@ -0,0 +1,60 @@
+import time
+from types import SimpleNamespace
+import pytest
+import shopify_bulk
+from file_operations import file_sha256
+from journal import RunJournal
+from ledger import ProductLedger
+from shopify import process_pdfs
+from shopify_bulk import create_products_bulk
+from simulator import FakeShopifyServer
+
+CONFIG = {"Description": "Report", "Price": "10.00", "CompareToPrice": "20.00", "Collections": [], "SearchEngineDescription": "Report"}
+
+@pytest.fixture
+def shop():
+    with FakeShopifyServer(bulk_delay=0.05) as server:
+        yield server
+
+def write_pdfs(folder, titles):
+    pdf_files = []
+    for title in titles:
+        pdf_file = folder / f"2024-3-{title}.pdf"
+        pdf_file.write_bytes(f"%PDF {title}".encode())
+        pdf_files.append(pdf_file)
+    return pdf_files
+
+def test_bulk_results_are_mapped_to_their_pdfs_by_line_number(shop, tmp_path):
+    pdf_files = write_pdfs(tmp_path, ["Austin", "Boston", "Chicago"])
+    journal = RunJournal(str(tmp_path / "run_journal.db"))
+    created = create_products_bulk(pdf_files, shop.store_url, "token", CONFIG, journal, poll_interval=0.02)
+
+    assert len(shop.staged_files) == 1 and len(shop.bulk_operations) == 1
+    assert {pdf_file.stem: shop.products[product_id]["title"] for pdf_file, product_id in created.items()} == {
+        "2024-3-Austin": "Austin", "2024-3-Boston": "Boston", "2024-3-Chicago": "Chicago"}
+    for pdf_file, product_id in created.items():
+        assert journal.product_for(str(pdf_file), file_sha256(pdf_file)) == product_id
+
+    # Journalled PDFs are left out, so a rerun starts no bulk operation
+    assert create_products_bulk(pdf_files, shop.store_url, "token", CONFIG, journal, poll_interval=0.02) == created
+    assert len(shop.bulk_operations) == 1
+    journal.close()
+
+def test_pdfs_the_bulk_operation_rejects_are_created_individually(shop, tmp_path, monkeypatch):
+    # process_pdfs polls at the default interval
+    monkeypatch.setattr(shopify_bulk, "time", SimpleNamespace(monotonic=time.monotonic, sleep=lambda seconds: time.sleep(0.02)))
+    # An empty title fails productCreate in the bulk run
+    write_pdfs(tmp_path, ["Austin", "", "Chicago"])
+    ledger = ProductLedger(str(tmp_path / "product_ledger.db"))
+    journal = RunJournal(str(tmp_path / "run_journal.db"))
+    process_pdfs(str(tmp_path), shop.store_url, "token", CONFIG, "2024", "3", ledger=ledger, journal=journal, bulk=True)
+
+    assert len(shop.bulk_operations) == 1
+    assert len(ledger) == 3
+    by_title = {product["title"]: product for product in shop.products.values()}
+    assert set(by_title) == {"Austin", "", "Chicago"}
+    # Only the rejected PDF went through the REST create
+    assert "input" in by_title["Austin"] and "input" in by_title["Chicago"]
+    assert "input" not in by_title[""]
+    ledger.close()
+    journal.close()
@@ -0,0 +1,40 @@
+import time
+from email.utils import formatdate
+from shopify_client import ShopifyClient, LeakyBucket, parse_retry_after, DEFAULT_RETRY_AFTER
+from simulator import FakeShopifyServer
+
+def test_throttled_request_is_retried_after_retry_after():
+    with FakeShopifyServer(capacity=2, leak_rate=5.0, retry_after=0.2) as shop:
+        client = ShopifyClient(shop.store_url, "token", bucket=LeakyBucket(40, 20.0))
+        # Another client has just used up the store's bucket
+        shop.bucket.level, shop.bucket.updated = shop.bucket.capacity, time.monotonic()
+        start = time.monotonic()
+        response = client.post("products.json", json={"product": {"title": "Austin"}})
+        assert response.status_code == 201
+        assert shop.stats["throttled"] == 1
+        assert len(shop.products) == 1
+        assert time.monotonic() - start >= 0.2
+
+def test_gives_up_after_max_retries():
+    with FakeShopifyServer(capacity=1, leak_rate=0.001, retry_after=0.01) as shop:
+        client = ShopifyClient(shop.store_url, "token", max_retries=2, bucket=LeakyBucket(40, 1000.0))
+        shop.bucket.level, shop.bucket.updated = shop.bucket.capacity, time.monotonic()
+        response = client.get("products/1.json")
+        assert response.status_code == 429
+        assert shop.stats["throttled"] == 3
+
+def test_graphql_does_not_wait_for_rest_bucket():
+    with FakeShopifyServer() as shop:
+        client = ShopifyClient(shop.store_url, "token")
+        client.bucket.pause(5.0)
+        start = time.monotonic()
+        data = client.graphql("query { products(first: $first) { nodes { id } } }", {"first": 10})
+        assert data["products"]["nodes"] == []
+        assert time.monotonic() - start < 1.0
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    assert parse_retry_after("1.5") == 1.5
+    assert 8 <= parse_retry_after(formatdate(time.time() + 10, usegmt=True)) <= 10
+    assert parse_retry_after(formatdate(time.time() - 60, usegmt=True)) == 0.0
+    assert parse_retry_after(None) == DEFAULT_RETRY_AFTER
+    assert parse_retry_after("soon") == DEFAULT_RETRY_AFTER
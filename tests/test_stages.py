@@ -0,0 +1,60 @@
+import time
+import threading
+from stages import Pipeline, Stage
+
+def run_with_timeout(pipeline, items, timeout=5.0):
+    # A pipeline that never closes a stage would hang the test run
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(items=pipeline.run(items)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "pipeline did not shut down"
+    return result["items"]
+
+def test_results_keep_discovery_order_when_stages_finish_out_of_order():
+    def slow_first(item):
+        # Earlier items take longest, so workers finish them last
+        time.sleep(0.05 * (5 - item) / 5)
+        return item
+
+    pipeline = Pipeline([Stage('slow', slow_first, workers=5), Stage('double', lambda item: item * 2, workers=3)])
+    assert run_with_timeout(pipeline, range(5)) == [0, 2, 4, 6, 8]
+
+def test_dropped_items_are_counted_per_stage():
+    def fail_on_three(item):
+        if item == 3:
+            raise ValueError("bad item")
+        return item
+
+    pipeline = Pipeline([
+        Stage('odd', lambda item: item if item % 2 else None, workers=2),
+        Stage('three', fail_on_three, workers=2),
+        Stage('batch', lambda items: [None if item == 5 else item for item in items], batch_size=4),
+    ])
+    assert run_with_timeout(pipeline, range(10)) == [1, 7, 9]
+    assert pipeline.dropped == {'odd': 5, 'three': 1, 'batch': 1}
+
+def test_multi_worker_stages_shut_down():
+    for items in ([], [1], list(range(50))):
+        pipeline = Pipeline([Stage('a', lambda item: item, workers=8), Stage('b', lambda item: item, workers=3),
+                             Stage('c', lambda items: items, batch_size=10)], queue_size=2)
+        assert run_with_timeout(pipeline, items) == items
+
+def test_batch_stage_sends_a_partial_batch_after_batch_wait():
+    batches = []
+
+    def record(items):
+        batches.append((len(items), time.monotonic()))
+        return items
+
+    def slow_discovery():
+        yield from range(3)
+        time.sleep(0.5)
+        yield from range(3, 5)
+
+    pipeline = Pipeline([Stage('batch', record, batch_size=100, batch_wait=0.1)])
+    start = time.monotonic()
+    assert run_with_timeout(pipeline, slow_discovery()) == list(range(5))
+    assert [size for size, _ in batches] == [3, 2]
+    # The first three went out without waiting for the rest of discovery
+    assert batches[0][1] - start < 0.4
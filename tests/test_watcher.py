@@ -0,0 +1,57 @@
+import os
+import time
+import threading
+from discovery import FileManifest
+from file_operations import send_csv_to_webhook
+from google_drive import DriveUploader
+from journal import RunJournal, METAFIELD_SET, ACTIVATED
+from ledger import ProductLedger
+from watcher import PdfWatcher, SETTLE_SECONDS
+from simulator import FakeShopifyServer, FakeDriveServer, FakeWebhookServer
+
+CONFIG = {"Description": "Report", "Price": "10.00", "CompareToPrice": "20.00", "Collections": [], "SearchEngineDescription": "Report"}
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+def test_dropped_pdf_goes_live_and_is_published_before_the_watcher_stops(tmp_path):
+    source_folder = tmp_path / "pdfs"
+    source_folder.mkdir()
+    csv_file_path = str(tmp_path / "product_pdf_data.csv")
+    ledger = ProductLedger(str(tmp_path / "product_ledger.db"))
+    journal = RunJournal(str(tmp_path / "run_journal.db"))
+    manifest = FileManifest(str(tmp_path / "file_manifest.db"))
+
+    with FakeShopifyServer() as shop, FakeDriveServer() as drive, FakeWebhookServer() as hook:
+        def publish():
+            ledger.export_csv(csv_file_path)
+            send_csv_to_webhook(csv_file_path, hook.url)
+
+        watcher = PdfWatcher(str(source_folder), shop.store_url, "token", CONFIG, ledger, journal, manifest, DriveUploader(drive.service),
+                             action='activate', poll_interval=0.05, publish=publish)
+        thread = threading.Thread(target=watcher.run, daemon=True)
+        thread.start()
+
+        pdf_file = source_folder / "2024-3-Austin.pdf"
+        pdf_file.write_bytes(b"%PDF Austin")
+        # Backdated so the watcher does not wait for the copy to settle
+        settled = time.time() - 2 * SETTLE_SECONDS
+        os.utime(pdf_file, (settled, settled))
+        wait_for(lambda: watcher.processed == 1)
+
+        watcher.stop()
+        thread.join(10.0)
+        assert not thread.is_alive()
+
+        (product,) = shop.products.values()
+        assert (product["title"], product["status"]) == ("Austin", "active")
+        assert journal.completed(product["id"], METAFIELD_SET) and journal.completed(product["id"], ACTIVATED)
+        assert ledger.get(product["id"])["drive_url"]
+        assert hook.deliveries and b"2024-3-Austin.pdf" in hook.deliveries[-1]["body"]
+
+    ledger.close()
+    journal.close()
+    manifest.close()
@@ -0,0 +1,55 @@
+import gzip
+import json
+import pytest
+import webhook
+from ledger import ProductLedger
+from simulator import FakeWebhookServer
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = ProductLedger(str(tmp_path / "ledger.db"))
+    for product_id in range(1, 6):
+        ledger.upsert(product_id, pdf_path=f"{product_id}.pdf", drive_url=f"https://drive/{product_id}")
+    yield ledger
+    ledger.close()
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(webhook, "BACKOFF_SECONDS", 0.01)
+
+def test_cursor_only_advances_on_acknowledgement(ledger):
+    with FakeWebhookServer(error_rate=1.0) as hook:
+        assert webhook.deliver_changes(ledger, hook.url, chunk_rows=2, max_retries=1) == 0
+        assert ledger.delivery_cursor(hook.url) == 0
+        assert hook.deliveries == []
+
+        hook.error_rate = 0.0
+        assert webhook.deliver_changes(ledger, hook.url, chunk_rows=2, max_retries=1) == 5
+        assert ledger.delivery_cursor(hook.url) == 5
+        assert [len(delivery["body"].splitlines()) for delivery in hook.deliveries] == [2, 2, 1]
+
+        # Nothing new, nothing sent; then only the changed row
+        assert webhook.deliver_changes(ledger, hook.url) == 0
+        ledger.upsert(3, drive_url="https://drive/3-v2")
+        assert webhook.deliver_changes(ledger, hook.url) == 1
+        record = json.loads(hook.deliveries[-1]["body"])
+        assert (record["product_id"], record["drive_url"], record["change"]) == (3, "https://drive/3-v2", 6)
+
+def test_cursor_stops_at_last_acknowledged_chunk(ledger, monkeypatch):
+    sent = []
+
+    def post_chunk(url, body, headers, max_retries):
+        sent.append(gzip.decompress(body))
+        return len(sent) == 1
+
+    monkeypatch.setattr(webhook, "post_chunk", post_chunk)
+    assert webhook.deliver_changes(ledger, "https://hook", chunk_rows=2) == 2
+    assert ledger.delivery_cursor("https://hook") == 2
+    assert len(sent) == 2
+
+def test_store_name_is_sent_with_every_record(ledger):
+    with FakeWebhookServer() as hook:
+        webhook.deliver_changes(ledger, hook.url, store_name="eu")
+        delivery = hook.deliveries[0]
+        assert delivery["headers"]["X-Store"] == "eu"
+        assert {json.loads(line)["store"] for line in delivery["body"].splitlines()} == {"eu"}
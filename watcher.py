@@ -0,0 +1,230 @@
+import time
+import queue
+import signal
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+from discovery import FileManifest, iter_files
+from image_index import ImageIndex
+from journal import RunJournal, UPLOADED, METAFIELD_SET
+from ledger import ProductLedger
+from lifecycle import ACTIONS, apply_action
+from shopify import process_pdf, update_product_with_file
+from shopify_client import get_client
+from google_drive import DriveUploader
+from asset_cache import AssetCache
+from metrics import metrics
+
+# Service mode: watches the source folder and pushes every new or changed PDF
+# through create -> image -> Drive upload -> metafield -> lifecycle action as
+# soon as it lands. A bounded queue sits between the scanner and the workers,
+# so a large drop stalls the scanner instead of piling up in memory. Stopping
+# (SIGINT/SIGTERM) finishes everything already queued before returning.
+
+DEFAULT_POLL_INTERVAL = 2.0
+DEFAULT_QUEUE_SIZE = 100
+# Files modified more recently than this may still be being copied in
+SETTLE_SECONDS = 2.0
+RETRY_DELAY = 60.0
+WATCH_ACTIONS = ('activate', 'archive', 'skip')
+
+class PdfWatcher:
+    def __init__(self, source_folder: str, store_url: str, access_token: str, config: dict, ledger: ProductLedger, journal: RunJournal,
+                 manifest: FileManifest, uploader: DriveUploader, action: str = 'skip', workers: int = 1, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, asset_cache: Optional[AssetCache] = None, publish: Optional[Callable] = None):
+        if action not in WATCH_ACTIONS:
+            raise ValueError(f"Watch mode supports {', '.join(WATCH_ACTIONS)}, not {action}")
+        self.source_folder = source_folder
+        self.store_url = store_url
+        self.access_token = access_token
+        self.config = config
+        self.ledger = ledger
+        self.journal = journal
+        self.manifest = manifest
+        self.uploader = uploader
+        self.action = action
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.asset_cache = asset_cache
+        self.publish = publish
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.image_index = ImageIndex([])
+        self.processed = 0
+        self.failed = 0
+        self._images = None
+        # path -> (size, mtime_ns) of files queued or finished, so unchanged files cost one stat per scan
+        self._known = {}
+        self._retry_at = {}
+        self._changed_since_publish = False
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def stop(self, *args):
+        if not self._stop.is_set():
+            logging.info("Stopping watcher, finishing queued PDFs...")
+        self._stop.set()
+        self._wake.set()
+
+    def _refresh_images(self):
+        image_files = sorted((Path(self.source_folder) / 'images').glob('*.jp*g'))
+        if image_files != self._images:
+            self._images = image_files
+            self.image_index = ImageIndex(image_files)
+            logging.info(f"Indexed {len(self.image_index)} images")
+
+    def scan(self) -> int:
+        # Queues PDFs that are new, changed or not yet fully processed.
+        # Blocks while the queue is full, which is the backpressure on discovery.
+        self._refresh_images()
+        queued = 0
+        now = time.time()
+        for entry in iter_files(self.source_folder, '.pdf'):
+            if self._stop.is_set():
+                break
+            stat = entry.stat()
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self._known.get(entry.path) == signature or self._retry_at.get(entry.path, 0) > time.monotonic():
+                continue
+            if now - stat.st_mtime < SETTLE_SECONDS:
+                continue
+            with metrics.timer('discovery'):
+                content_hash = self.manifest.content_hash(entry.path, stat)
+            self._known[entry.path] = signature
+            product_id = self.journal.product_for(entry.path, content_hash)
+            if product_id and self._finished(product_id):
+                continue
+            while not self._stop.is_set():
+                try:
+                    self.queue.put((Path(entry.path), content_hash), timeout=0.5)
+                    queued += 1
+                    break
+                except queue.Full:
+                    continue
+        self.manifest.commit()
+        return queued
+
+    def _finished(self, product_id: int) -> bool:
+        stages = self.journal.stages(product_id)
+        return METAFIELD_SET in stages and (self.action == 'skip' or ACTIONS[self.action]['stage'] in stages)
+
+    def handle(self, pdf_file: Path, content_hash: str) -> bool:
+        product_id = process_pdf(pdf_file, self.store_url, self.access_token, self.config, self.image_index, self.journal, content_hash, self.asset_cache)
+        if not product_id:
+            return False
+        self.ledger.upsert(product_id, pdf_path=str(pdf_file))
+
+        if not self.journal.completed(product_id, METAFIELD_SET):
+            file_url = (self.ledger.get(product_id) or {}).get('drive_url')
+            if not file_url:
+                file_url = self.uploader.upload_all({product_id: str(pdf_file)}, {product_id: content_hash}).get(product_id)
+                if not file_url:
+                    return False
+                self.journal.mark(product_id, UPLOADED)
+            with metrics.timer('metafield_update'):
+                update_product_with_file(self.store_url, product_id, file_url, self.access_token)
+            # The ledger only lists links the store has confirmed
+            self.ledger.upsert(product_id, drive_url=file_url)
+            self.journal.mark(product_id, METAFIELD_SET)
+
+        if self.action != 'skip' and not self.journal.completed(product_id, ACTIONS[self.action]['stage']):
+            result = apply_action(get_client(self.store_url, self.access_token), self.action, product_id)
+            if result['Result'] != 'ok':
+                logging.error(f"Failed to {self.action} product {product_id}: {result['Status Code']} {result['Error']}")
+                return False
+            self.journal.set_lifecycle(product_id, ACTIONS[self.action]['stage'])
+        self.ledger.commit()
+        logging.info(f"{pdf_file.name} is live as product {product_id}")
+        return True
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            pdf_file, content_hash = item
+            try:
+                ok = self.handle(pdf_file, content_hash)
+            except Exception as e:
+                logging.error(f"Error processing {pdf_file.name}: {e}")
+                ok = False
+            with self._lock:
+                if ok:
+                    self.processed += 1
+                    self._changed_since_publish = True
+                else:
+                    # Picked up again by a later scan
+                    self.failed += 1
+                    self._known.pop(str(pdf_file), None)
+                    self._retry_at[str(pdf_file)] = time.monotonic() + RETRY_DELAY
+            self.queue.task_done()
+            if self.queue.unfinished_tasks == 0:
+                # Lets the main loop publish the CSV without waiting for the next poll
+                self._wake.set()
+
+    def _publish_if_idle(self):
+        # Sends the CSV once a burst of new products has been fully processed
+        with self._lock:
+            due = self._changed_since_publish and self.queue.unfinished_tasks == 0
+            if due:
+                self._changed_since_publish = False
+        if due and self.publish:
+            self.publish()
+
+    def _start_observer(self):
+        # inotify/FSEvents through watchdog when installed, otherwise plain polling
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            logging.info(f"watchdog is not installed; polling {self.source_folder} every {self.poll_interval}s")
+            return None
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if str(getattr(event, 'dest_path', '') or event.src_path).lower().endswith(('.pdf', '.jpg', '.jpeg')):
+                    watcher._wake.set()
+
+        observer = Observer()
+        observer.schedule(Handler(), self.source_folder, recursive=True)
+        observer.start()
+        logging.info(f"Watching {self.source_folder} for new PDFs")
+        return observer
+
+    def run(self):
+        threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        observer = self._start_observer()
+        try:
+            while not self._stop.is_set():
+                self._publish_if_idle()
+                queued = self.scan()
+                if queued:
+                    logging.info(f"Queued {queued} PDFs ({self.queue.qsize()} waiting)")
+                # Files still settling are picked up on the next pass
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+        finally:
+            if observer:
+                observer.stop()
+                observer.join()
+            for _ in threads:
+                self.queue.put(None)
+            for thread in threads:
+                thread.join()
+            self._publish_if_idle()
+            logging.info(f"Watcher stopped: {self.processed} PDFs processed, {self.failed} failed attempts")
+
+def watch_folder(watcher: PdfWatcher):
+    # Runs until SIGINT/SIGTERM, then drains the queue
+    previous = {sig: signal.signal(sig, watcher.stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        watcher.run()
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
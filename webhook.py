@@ -0,0 +1,117 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+from typing import Optional
+from file_operations import send_csv_to_webhook
+from http_session import get_session
+from ledger import ProductLedger
+from metrics import metrics
+
+# Incremental delivery of the product ledger to the webhook. Only rows changed
+# (or removed) since the last acknowledged delivery are sent, as
+# gzip-compressed NDJSON chunks of up to DEFAULT_CHUNK_ROWS rows. Each chunk
+# carries an Idempotency-Key derived from its content, so a chunk resent after
+# a lost acknowledgement can be recognised by the receiver. The cursor of the
+# last acknowledged chunk is kept in the ledger per webhook URL; after a
+# failure the next delivery starts from there instead of from the beginning.
+# With --stores every store's ledger goes to the same URL, so each record and
+# chunk then names its store ("store" field, X-Store header).
+
+DEFAULT_WEBHOOK_URL = os.environ.get('WEBHOOK_URL', "https://hook.eu1.make.com/wdcdvyyfqli6rwhgj51jnu2d2yqrxpeg")
+WEBHOOK_FORMATS = ('ndjson', 'csv')
+DEFAULT_CHUNK_ROWS = 5000
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+TIMEOUT = 60
+
+def encode_chunk(rows: list, store_name: Optional[str] = None) -> bytes:
+    lines = []
+    for row in rows:
+        record = {'product_id': row['product_id'], 'change': row['changed']}
+        if store_name:
+            record['store'] = store_name
+        if row['removed']:
+            record['removed'] = True
+        else:
+            record.update(pdf_path=row['pdf_path'], drive_url=row['drive_url'])
+        lines.append(json.dumps(record, separators=(',', ':')))
+    return ("\n".join(lines) + "\n").encode()
+
+def is_retryable(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+def post_chunk(webhook_url: str, body: bytes, headers: dict, max_retries: int = MAX_RETRIES) -> bool:
+    # Retries connection errors, 429 and 5xx with exponential backoff, honouring Retry-After
+    session = get_session(webhook_url)
+    for attempt in range(max_retries + 1):
+        start = time.perf_counter()
+        try:
+            response = session.post(webhook_url, data=body, headers=headers, timeout=TIMEOUT)
+            status, retry_after = response.status_code, response.headers.get('Retry-After')
+        except Exception as e:
+            logging.warning(f"Error sending chunk to webhook: {e}")
+            status, retry_after = 'error', None
+        metrics.observe_http("POST webhook", status, time.perf_counter() - start)
+        if status != 'error' and 200 <= status < 300:
+            return True
+        if status != 'error' and not is_retryable(status):
+            logging.error(f"Webhook rejected chunk {headers['Idempotency-Key'][:12]}: {status}")
+            return False
+        if attempt == max_retries:
+            break
+        try:
+            wait = float(retry_after) if retry_after else BACKOFF_SECONDS * 2 ** attempt
+        except ValueError:
+            wait = BACKOFF_SECONDS * 2 ** attempt
+        wait = min(wait, MAX_BACKOFF_SECONDS)
+        logging.warning(f"Webhook answered {status}, retrying in {wait:.1f}s (attempt {attempt + 1}/{max_retries})")
+        metrics.count_retry("POST webhook")
+        time.sleep(wait)
+    logging.error(f"Giving up on webhook chunk {headers['Idempotency-Key'][:12]} after {max_retries} retries")
+    return False
+
+def deliver_changes(ledger: ProductLedger, webhook_url: str, chunk_rows: int = DEFAULT_CHUNK_ROWS, max_retries: int = MAX_RETRIES,
+                    store_name: Optional[str] = None) -> int:
+    # Returns the number of rows acknowledged by the webhook
+    cursor = ledger.delivery_cursor(webhook_url)
+    delivered = 0
+    while True:
+        rows = ledger.changes_since(cursor, chunk_rows)
+        if not rows:
+            break
+        last = rows[-1]['changed']
+        body = encode_chunk(rows, store_name)
+        headers = {
+            'Content-Type': 'application/x-ndjson',
+            'Content-Encoding': 'gzip',
+            'Idempotency-Key': hashlib.sha256(webhook_url.encode() + b'\n' + body).hexdigest(),
+            'X-Ledger-Changes': f"{cursor + 1}-{last}",
+        }
+        if store_name:
+            headers['X-Store'] = store_name
+        # mtime=0 keeps the compressed bytes identical when a chunk is resent
+        if not post_chunk(webhook_url, gzip.compress(body, mtime=0), headers, max_retries):
+            logging.error(f"Webhook delivery stopped after {delivered} rows; the next delivery resumes after change {cursor}")
+            return delivered
+        ledger.set_delivery_cursor(webhook_url, last)
+        cursor = last
+        delivered += len(rows)
+    logging.info(f"Delivered {delivered} changed ledger rows to webhook: {webhook_url}")
+    return delivered
+
+def publish_ledger(ledger: ProductLedger, csv_file_path: str, webhook_url: str, webhook_format: str = 'ndjson',
+                   chunk_rows: int = DEFAULT_CHUNK_ROWS, store_name: Optional[str] = None):
+    # Writes product_pdf_data.csv (used by the lifecycle actions) and delivers the ledger to the webhook
+    with metrics.timer('csv_write'):
+        ledger.export_csv(csv_file_path)
+    if webhook_format == 'csv':
+        send_csv_to_webhook(csv_file_path, webhook_url)
+        return
+    try:
+        deliver_changes(ledger, webhook_url, chunk_rows, store_name=store_name)
+    except Exception as e:
+        logging.error(f"Error delivering ledger changes to webhook: {e}")